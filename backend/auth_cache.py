@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import case, inspect, update
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from models import User, APIKey
+
+@dataclass
+class Principal:
+    user_id: int
+    values: dict # Column values of the User row
+    expires_at: float
+    api_key_id: Optional[int] = None
+    api_key_tier: Optional[str] = None
+
+class PrincipalCache:
+    def __init__(self, ttl_seconds: int = 60, max_entries: int = 10000):
+        """
+        Short-TTL cache of authenticated users, keyed by JWT or API key hash.
+
+        Entries are invalidated explicitly when a key is revoked or a user is
+        changed/deleted in this process; other workers pick changes up within the TTL.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[str, Principal] = {}
+        self._keys_by_user = defaultdict(set)
+        self._lock = threading.Lock()
+        self._columns = [attr.key for attr in inspect(User).column_attrs]
+
+    def get(self, cache_key: str) -> Optional[Principal]:
+        principal = self._entries.get(cache_key)
+        if principal is None:
+            return None
+        if principal.expires_at <= time.time():
+            self.invalidate(cache_key)
+            return None
+        return principal
+
+    def put(self, cache_key: str, user: User, api_key: Optional[APIKey] = None, expires_at: Optional[float] = None) -> Principal:
+        ttl_expiry = time.time() + self.ttl_seconds
+        principal = Principal(
+            user_id=user.id,
+            values={c: getattr(user, c) for c in self._columns},
+            expires_at=min(ttl_expiry, expires_at) if expires_at else ttl_expiry,
+            api_key_id=api_key.id if api_key else None,
+            api_key_tier=api_key.tier if api_key else None
+        )
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._evict_expired()
+            self._entries[cache_key] = principal
+            self._keys_by_user[user.id].add(cache_key)
+        return principal
+
+    def attach(self, db: Session, principal: Principal) -> User:
+        """Rebuild the cached user inside ``db`` without querying, so endpoints can still modify and commit it."""
+        user = User(**principal.values)
+        make_transient_to_detached(user)
+        db.add(user)
+        return user
+
+    def invalidate(self, cache_key: str):
+        with self._lock:
+            principal = self._entries.pop(cache_key, None)
+            if principal:
+                self._forget_key(principal.user_id, cache_key)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for cache_key in self._keys_by_user.pop(user_id, set()):
+                self._entries.pop(cache_key, None)
+
+    def _evict_expired(self):
+        now = time.time()
+        expired = [k for k, p in self._entries.items() if p.expires_at <= now]
+        if not expired:
+            # Still full: drop the entries closest to expiry
+            expired = sorted(self._entries, key=lambda k: self._entries[k].expires_at)[:len(self._entries) // 10 or 1]
+        for cache_key in expired:
+            principal = self._entries.pop(cache_key)
+            self._forget_key(principal.user_id, cache_key)
+
+    def _forget_key(self, user_id: int, cache_key: str):
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(cache_key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+class APIKeyUsageBuffer:
+    def __init__(self):
+        """Collects API key usage in memory so last_used_at is written in one bulk UPDATE per flush."""
+        self._pending: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+
+    def touch(self, api_key_id: int):
+        with self._lock:
+            self._pending[api_key_id] = datetime.now()
+
+    def flush(self, db: Session) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            db.execute(
+                update(APIKey)
+                .where(APIKey.id.in_(list(pending)))
+                .values(last_used_at=case(pending, value=APIKey.id))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the timestamps back unless a newer touch already replaced them
+            with self._lock:
+                for key_id, used_at in pending.items():
+                    self._pending.setdefault(key_id, used_at)
+            raise
+        return len(pending)
+
+principal_cache = PrincipalCache(ttl_seconds=60)
+api_key_usage = APIKeyUsageBuffer()
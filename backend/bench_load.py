@@ -0,0 +1,91 @@
+"""
+Concurrency benchmark for the read endpoints.
+
+Fires requests at a running backend with increasing numbers of concurrent
+clients and reports throughput and latency percentiles per endpoint. Run it
+against two builds (e.g. before / after the async read path) to compare.
+
+Prefer a JWT for --token: API keys are rate limited. Requires httpx (pip install httpx).
+Usage: python bench_load.py --base http://127.0.0.1:8111 --token <JWT or API key>
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+ENDPOINTS = [
+    "/api/items?limit=50",
+    "/api/items/{goods_id}/listings",
+    "/api/items/{goods_id}/history",
+    "/api/stats",
+    "/api/favorites/ids",
+    "/api/tasks/active",
+]
+
+async def worker(client, path, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+async def run_level(base, headers, path, concurrency, duration):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, headers=headers, limits=limits, timeout=60) as client:
+        latencies, errors = [], []
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(worker(client, path, deadline, latencies, errors) for _ in range(concurrency)))
+
+    if not latencies:
+        return None
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+    return {
+        "rps": len(latencies) / duration,
+        "p50": statistics.median(latencies),
+        "p95": p(0.95),
+        "p99": p(0.99),
+        "errors": len(errors),
+    }
+
+async def main(args):
+    headers = {}
+    if args.token:
+        if args.token.startswith("sk-"):
+            headers["X-API-Key"] = args.token
+        else:
+            headers["Authorization"] = f"Bearer {args.token}"
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    for template in ENDPOINTS:
+        path = template.format(goods_id=args.goods_id)
+        print(f"== GET {path}")
+        for concurrency in levels:
+            stats = await run_level(args.base, headers, path, concurrency, args.duration)
+            if stats is None:
+                print(f"  c={concurrency:<4} no completed requests")
+                continue
+            print(f"  c={concurrency:<4} {stats['rps']:8.1f} req/s  p50={stats['p50']:7.1f}ms  "
+                  f"p95={stats['p95']:7.1f}ms  p99={stats['p99']:7.1f}ms  errors={stats['errors']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency benchmark for the read endpoints.")
+    parser.add_argument("--base", default="http://127.0.0.1:8111")
+    parser.add_argument("--token", help="JWT access token or API key (sk-...)")
+    parser.add_argument("--goods-id", type=int, default=1)
+    parser.add_argument("--concurrency", default="1,10,50,100,200")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    args = parser.parse_args()
+
+    if httpx is None:
+        raise SystemExit("bench_load.py requires httpx: pip install httpx")
+    asyncio.run(main(args))
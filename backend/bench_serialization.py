@@ -0,0 +1,90 @@
+"""
+Micro-benchmark: serializing one 500-item /api/items page.
+
+Compares the paths a page can take, all in memory (no database or server):
+  stdlib    ORM objects -> Pydantic -> jsonable_encoder -> json.dumps (the old path)
+  pydantic  ORM objects -> Pydantic -> model_dump_json (what FastAPI does with a response_model)
+  fast      Core tuples -> dicts -> orjson (serialization.py, used by the hot list endpoints)
+and then the cost and size of gzip / brotli on the result.
+
+Usage: python bench_serialization.py [--items 500] [--rounds 200]
+"""
+import argparse
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from models import Product
+from schemas import ProductListResponse
+from serialization import rows_as_dicts
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COLUMNS = [
+    Product.goods_id, Product.name, Product.img, Product.market_price, Product.category, Product.min_price,
+    Product.historical_low_price, Product.is_out_of_stock, Product.link, Product.update_time,
+]
+
+def make_rows(n):
+    now = datetime.now()
+    return [
+        (
+            100000 + i, f"手办 Figure No.{i} 限定版", f"https://i0.hdslb.com/bfs/mall/{i:08x}.png",
+            1299.0 + i, "2312", 899.5 + i, 799.0 + i, False,
+            f"https://mall.bilibili.com/neul-next/index.html?page=magic-market_detail&noTitleBar=1&itemsId={i}&from=market_index",
+            now - timedelta(minutes=i),
+        )
+        for i in range(n)
+    ]
+
+def bench(label, fn, rounds):
+    fn() # warm up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        body = fn()
+    elapsed = (time.perf_counter() - start) / rounds * 1000
+    print(f"  {label:<10} {elapsed:8.3f} ms/page  {len(body):>8} bytes")
+    return body
+
+def main(args):
+    import orjson
+
+    rows = make_rows(args.items)
+    keys = [c.key for c in COLUMNS]
+
+    def orm_page():
+        return [Product(**dict(zip(keys, row))) for row in rows]
+
+    def stdlib():
+        page = ProductListResponse(items=orm_page(), total=len(rows))
+        return json.dumps(jsonable_encoder(page)).encode()
+
+    def pydantic():
+        return ProductListResponse(items=orm_page(), total=len(rows)).model_dump_json().encode()
+
+    def fast():
+        return orjson.dumps({"items": rows_as_dicts(COLUMNS, rows), "total": len(rows)})
+
+    print(f"Serializing a {args.items}-item page ({args.rounds} rounds)")
+    bench("stdlib", stdlib, args.rounds)
+    bench("pydantic", pydantic, args.rounds)
+    body = bench("fast", fast, args.rounds)
+
+    print("Compressing the page")
+    bench("gzip-6", lambda: gzip.compress(body, compresslevel=6), args.rounds)
+    if brotli is not None:
+        bench("br-4", lambda: brotli.compress(body, quality=4), args.rounds)
+    else:
+        print("  br         skipped (pip install brotli)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serialization micro-benchmark for a /api/items page.")
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=200)
+    main(parser.parse_args())
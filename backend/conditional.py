@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import time
+from datetime import date, datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Product, ChangeEvent
+
+class DataVersion:
+    def __init__(self, ttl_seconds: float = 1.0):
+        """
+        Watermark of the catalog data: newest products.update_time and newest change_events row.
+
+        Every crawl write moves at least one of them, so while the watermark stays the
+        same every catalog response stays the same. It is cached briefly so a burst of
+        conditional requests costs one (index-only) query.
+        """
+        self.ttl_seconds = ttl_seconds
+        self._value: Optional[Tuple[str, Optional[datetime]]] = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, db: AsyncSession) -> Tuple[str, Optional[datetime]]:
+        """(version token, last modified time)"""
+        if time.monotonic() < self._expires_at:
+            return self._value
+        async with self._lock:
+            if time.monotonic() < self._expires_at:
+                return self._value
+
+            row = (await db.execute(select(
+                select(func.max(Product.update_time)).scalar_subquery(),
+                select(func.max(ChangeEvent.id)).scalar_subquery(),
+                select(ChangeEvent.created_at).order_by(ChangeEvent.id.desc()).limit(1).scalar_subquery(),
+            ))).one()
+            products_updated, last_change_id, last_change_at = row
+            last_modified = max((t for t in (products_updated, last_change_at) if t), default=None)
+
+            self._value = (f"{products_updated}|{last_change_id}", last_modified)
+            self._expires_at = time.monotonic() + self.ttl_seconds
+        return self._value
+
+    def invalidate(self):
+        self._expires_at = 0.0
+
+def http_date(value: datetime) -> str:
+    # Stored times are naive local time
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Weak comparison, as required for If-None-Match
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+def _not_modified_since(header: str, last_modified: Optional[datetime]) -> bool:
+    if last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have whole-second precision
+    return last_modified.astimezone(timezone.utc).replace(microsecond=0) <= since
+
+async def not_modified(request: Request, response: Response, db: AsyncSession, *scope, private: bool = False) -> Optional[Response]:
+    """
+    Validate a conditional GET against the data watermark before the endpoint runs its query.
+
+    Returns a 304 response when the client's copy is current; otherwise sets ETag /
+    Last-Modified on ``response`` and returns None. ``scope`` adds anything else the
+    body depends on (e.g. the user for per-user filters).
+    """
+    version, last_modified = await data_version.get(db)
+    # The date is part of the key because "today" counts roll over at midnight
+    key = f"{version}|{date.today()}|{request.url.path}?{request.url.query}|{scope}"
+    etag = f'W/"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache" if private else "no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        current = _etag_matches(if_none_match, etag)
+    else:
+        current = _not_modified_since(request.headers.get("if-modified-since", ""), last_modified)
+    if current:
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
+
+data_version = DataVersion(ttl_seconds=1.0)
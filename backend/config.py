@@ -12,10 +12,23 @@ class Settings(BaseSettings):
     # App
     API_PREFIX: str = "/api"
 
+    # API rate limiting
+    RATE_LIMIT_BACKEND: str = "memory" # memory (single worker) / sqlite / redis (shared by all workers)
+    RATE_LIMIT_SQLITE_PATH: str = "ratelimit.db"
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    RATE_LIMIT_TIERS: dict[str, int] = {"standard": 60, "pro": 600, "unlimited": 0} # requests per minute per API key
+
+    # Reverse proxies (addresses or CIDR ranges) whose X-Real-IP header is believed; nobody's by default
+    TRUSTED_PROXIES: list[str] = []
+
     @property
     def DATABASE_URL(self):
         return f"mysql+pymysql://{self.BMM_MYSQL_USER}:{self.BMM_MYSQL_PASSWORD}@{self.BMM_MYSQL_HOST}:{self.BMM_MYSQL_PORT}/{self.BMM_MYSQL_DATABASE}"
 
+    @property
+    def ASYNC_DATABASE_URL(self):
+        return f"mysql+aiomysql://{self.BMM_MYSQL_USER}:{self.BMM_MYSQL_PASSWORD}@{self.BMM_MYSQL_HOST}:{self.BMM_MYSQL_PORT}/{self.BMM_MYSQL_DATABASE}"
+
     model_config = SettingsConfigDict(env_file=["../.env"], extra="ignore")
 
 settings = Settings()
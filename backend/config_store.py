@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import SystemConfig
+
+# Reserved row whose value changes on every write, so other workers notice the change
+VERSION_KEY = "config_version"
+
+class ConfigStore:
+    def __init__(self, check_interval: float = 5.0):
+        """
+        In-process cache of the whole system_config table.
+
+        All keys are loaded in one query and served from memory. Writes go through
+        ``set``, which also replaces the version row; every worker compares that row
+        at most once per ``check_interval`` and reloads when it has changed, so a
+        write is visible everywhere within that interval (immediately in the writer).
+        """
+        self.check_interval = check_interval
+        self._values: Optional[Dict[str, str]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        return self._snapshot().get(VERSION_KEY) or ""
+
+    def _snapshot(self) -> Dict[str, str]:
+        if self._values is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._values
+        with self._lock:
+            if self._values is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._values
+            db = SessionLocal()
+            try:
+                if self._values is not None:
+                    version = db.execute(select(SystemConfig.value).where(SystemConfig.key == VERSION_KEY)).scalar()
+                    if version == self._values.get(VERSION_KEY):
+                        self._checked_at = time.monotonic()
+                        return self._values
+                self._values = dict(db.execute(select(SystemConfig.key, SystemConfig.value)).all())
+                self._checked_at = time.monotonic()
+            finally:
+                db.close()
+        return self._values
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        value = self._snapshot().get(key)
+        return default if value is None else value
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Optional[str]]:
+        values = self._snapshot()
+        return {key: values.get(key) for key in keys}
+
+    def get_int(self, key: str, default: int) -> int:
+        try:
+            return int(self._snapshot()[key])
+        except (KeyError, TypeError, ValueError):
+            return default
+
+    def get_float(self, key: str, default: float) -> float:
+        try:
+            return float(self._snapshot()[key])
+        except (KeyError, TypeError, ValueError):
+            return default
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        value = self._snapshot().get(key)
+        if value is None:
+            return default
+        return value.lower() == "true"
+
+    def get_json(self, key: str, default=None):
+        try:
+            return json.loads(self._snapshot()[key])
+        except (KeyError, TypeError, ValueError):
+            return default
+
+    def set(self, db: Session, key: str, value: str, description: Optional[str] = None):
+        """Write one key and the new version in ``db`` and commit."""
+        for row_key, row_value in ((key, value), (VERSION_KEY, uuid.uuid4().hex)):
+            config = db.get(SystemConfig, row_key)
+            if config is None:
+                db.add(SystemConfig(key=row_key, value=row_value, description=description if row_key == key else None))
+            else:
+                config.value = row_value
+        db.commit()
+        self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._values = None
+
+system_config = ConfigStore(check_interval=5.0)
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Callable, List, Optional
+
+class Subscription:
+    def __init__(self, hub: "EventHub", maxsize: int, last_seq: int = 0, predicate: Optional[Callable[[dict], bool]] = None):
+        self.hub = hub
+        self.maxsize = maxsize
+        self.predicate = predicate
+        # One extra slot so the close marker always fits behind a full buffer
+        self.queue = asyncio.Queue(maxsize=maxsize + 1)
+        self.last_seq = last_seq
+        self.closed = False
+        self._dropped = False
+
+    def _offer(self, event: dict):
+        # Replay and live dispatch can overlap right after subscribing; skip anything already seen
+        if self._dropped or event["seq"] <= self.last_seq:
+            return
+        if self.predicate is not None and not self.predicate(event):
+            # Not counted against the queue, so unrelated traffic cannot drop this subscriber
+            self.last_seq = event["seq"]
+            return
+        if self.queue.qsize() >= self.maxsize:
+            # Slow consumer: drop it rather than buffer without bound. Everything already
+            # queued is still delivered, so it can resume after the last seq it received.
+            self.hub.unsubscribe(self)
+            self._dropped = True
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(event)
+        self.last_seq = event["seq"]
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Next event, or None on timeout. Check ``closed`` afterwards to tell the two apart."""
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event is None:
+            self.closed = True
+        return event
+
+    def close(self):
+        self.hub.unsubscribe(self)
+        self.closed = True
+
+class EventHub:
+    def __init__(self, history_size: int = 1000, queue_size: int = 256):
+        """
+        In-process pub/sub for pushing events to WebSocket / SSE clients.
+
+        Every event gets a monotonically increasing ``seq`` and is kept in a bounded
+        replay buffer, so a reconnecting client can resume after the last seq it saw.
+        ``publish`` may be called from any thread; delivery happens on the event loop
+        bound with ``bind_loop``. Each subscriber has a bounded queue and is dropped
+        when it falls behind, so publishers never block.
+        """
+        self.queue_size = queue_size
+        self._history = deque(maxlen=history_size)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def publish(self, event: dict) -> dict:
+        with self._lock:
+            self._seq += 1
+            event["seq"] = self._seq
+            self._history.append(event)
+
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                self._dispatch(event)
+            else:
+                loop.call_soon_threadsafe(self._dispatch, event)
+        return event
+
+    def _dispatch(self, event: dict):
+        for subscription in list(self._subscribers):
+            subscription._offer(event)
+
+    def since(self, seq: int = 0, limit: Optional[int] = None) -> List[dict]:
+        """Buffered events with seq greater than ``seq``, oldest first."""
+        with self._lock:
+            newer = []
+            for event in reversed(self._history):
+                if event["seq"] <= seq:
+                    break
+                newer.append(event)
+        newer.reverse()
+        if limit is not None:
+            newer = newer[-limit:]
+        return newer
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def history(self) -> List[dict]:
+        with self._lock:
+            return list(self._history)
+
+    def subscribe(self, since: Optional[int] = None, queue_size: Optional[int] = None,
+                  predicate: Optional[Callable[[dict], bool]] = None) -> Subscription:
+        """
+        Subscribe on the event loop thread.
+
+        :param since: Replay buffered events after this seq first (e.g. from Last-Event-ID).
+        :param predicate: Only deliver events it returns True for.
+        """
+        maxsize = queue_size or self.queue_size
+        subscription = Subscription(self, maxsize, predicate=predicate)
+        self._subscribers.add(subscription)
+        if since is not None:
+            # Leave headroom in the queue for live events arriving during the replay
+            for event in self.since(since, limit=maxsize // 2):
+                subscription._offer(event)
+        else:
+            subscription.last_seq = self._seq
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+def format_sse(event: dict, event_type: str) -> str:
+    data = json.dumps(event, ensure_ascii=False, default=_json_default)
+    return f"id: {event['seq']}\nevent: {event_type}\ndata: {data}\n\n"
+
+async def sse_stream(subscription: Subscription, event_type: str, keepalive: float = 15.0,
+                     until: Optional[Callable[[dict], bool]] = None):
+    """
+    Render a subscription as a text/event-stream body, with comment pings to keep proxies from timing out.
+
+    :param until: End the stream after the first event it returns True for.
+    """
+    try:
+        while True:
+            event = await subscription.get(timeout=keepalive)
+            if event is None:
+                if subscription.closed:
+                    break
+                yield ": ping\n\n"
+                continue
+            yield format_sse(event, event_type)
+            if until is not None and until(event):
+                break
+    finally:
+        subscription.close()
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no", # Tell nginx not to buffer the stream
+}
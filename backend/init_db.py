@@ -1,10 +1,9 @@
-from database import engine, Base
-# Imports are required to register models with Base.metadata
-from models import Product, PriceHistory, SystemConfig, Listing, User, Favorite  # noqa: F401
+from database import engine
+from migrations import run_migrations
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created.")
+    version = run_migrations(engine)
+    print(f"Database tables ready (schema version {version}).")
 
 if __name__ == "__main__":
     init_db()
@@ -1,53 +1,167 @@
+import sqlite3
+import threading
 import time
-from collections import defaultdict, deque
+from typing import NamedTuple, Optional, Tuple
 import logging
 
+from config import settings
+
 logger = logging.getLogger(__name__)
 
-class InMemoryRateLimiter:
-    def __init__(self, max_requests: int = 60, window_seconds: int = 60):
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float # Seconds until the bucket is full again
+    retry_after: float # Seconds until the next request is allowed (0 if allowed)
+
+def gcra_step(stored_tat: Optional[float], now: float, emission_interval: float, period: float) -> Tuple[bool, float]:
+    """
+    One step of the Generic Cell Rate Algorithm (a token bucket stored as a single timestamp).
+
+    :param stored_tat: Theoretical arrival time saved for the key, or None.
+    :return: (allowed, tat) where tat is the new value to store if allowed, else the unchanged one.
+    """
+    tat = max(stored_tat or now, now)
+    new_tat = tat + emission_interval
+    if new_tat - period > now:
+        return False, tat
+    return True, new_tat
+
+class MemoryBackend:
+    """Per-process state. Fine for a single uvicorn worker."""
+
+    def __init__(self):
+        self._tats = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, emission_interval: float, period: float, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            allowed, tat = gcra_step(self._tats.get(key), now, emission_interval, period)
+            if allowed:
+                self._tats[key] = tat
+            return allowed, tat
+
+    def cleanup(self, now: float) -> int:
+        # A key whose TAT is in the past has a full bucket: same as having no state at all
+        with self._lock:
+            expired = [key for key, tat in self._tats.items() if tat <= now]
+            for key in expired:
+                del self._tats[key]
+        return len(expired)
+
+class SQLiteBackend:
+    """State in a local SQLite file, shared by every worker process on the host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, key: str, emission_interval: float, period: float, now: float) -> Tuple[bool, float]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            allowed, tat = gcra_step(row[0] if row else None, now, emission_interval, period)
+            if allowed:
+                conn.execute(
+                    "INSERT INTO rate_limits (key, tat) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET tat = excluded.tat",
+                    (key, tat)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, tat
+
+    def cleanup(self, now: float) -> int:
+        return self._conn().execute("DELETE FROM rate_limits WHERE tat <= ?", (now,)).rowcount
+
+class RedisBackend:
+    """State in Redis (or any server speaking its protocol). Keys expire on their own."""
+
+    GCRA_SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local emission_interval = tonumber(ARGV[2])
+    local period = tonumber(ARGV[3])
+    local tat = tonumber(redis.call('GET', KEYS[1]))
+    if not tat or tat < now then tat = now end
+    local new_tat = tat + emission_interval
+    if new_tat - period > now then
+        return {0, tostring(tat)}
+    end
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+    return {1, tostring(new_tat)}
+    """
+
+    def __init__(self, url: str):
+        import redis # Optional dependency, only needed for this backend
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.GCRA_SCRIPT)
+
+    def acquire(self, key: str, emission_interval: float, period: float, now: float) -> Tuple[bool, float]:
+        allowed, tat = self._script(keys=[f"bmm:ratelimit:{key}"], args=[now, emission_interval, period])
+        return bool(allowed), float(tat)
+
+    def cleanup(self, now: float) -> int:
+        return 0
+
+class RateLimiter:
+    def __init__(self, backend, period_seconds: int = 60):
         """
-        Simple in-memory rate limiter using sliding window.
-        
-        :param max_requests: Max requests allowed in the window.
-        :param window_seconds: Time window in seconds.
+        Token-bucket rate limiter (GCRA): constant memory per key, any storage backend.
+
+        :param backend: MemoryBackend, SQLiteBackend or RedisBackend.
+        :param period_seconds: Window the per-key limit applies to; also the maximum burst.
         """
-        self.max_requests = max_requests
-        self.window_seconds = window_seconds
-        # Mapping: key -> deque of timestamps
-        self.requests = defaultdict(deque)
+        self.backend = backend
+        self.period_seconds = period_seconds
 
-    def is_allowed(self, key: str) -> bool:
+    def check(self, key: str, limit: int) -> RateLimitResult:
+        """Consume one request for ``key`` allowed ``limit`` times per period."""
+        period = self.period_seconds
+        emission_interval = period / limit
         now = time.time()
-        timestamps = self.requests[key]
 
-        # Remove timestamps older than the window
-        while timestamps and timestamps[0] < now - self.window_seconds:
-            timestamps.popleft()
+        allowed, tat = self.backend.acquire(key, emission_interval, period, now)
+        if allowed:
+            remaining = int((period - (tat - now)) / emission_interval + 1e-9)
+            return RateLimitResult(True, limit, max(remaining, 0), tat - now, 0.0)
 
-        # Check count
-        if len(timestamps) >= self.max_requests:
-            return False
+        retry_after = tat + emission_interval - period - now
+        return RateLimitResult(False, limit, 0, tat - now, max(retry_after, 0.0))
 
-        # Add current timestamp
-        timestamps.append(now)
-        return True
+    def is_allowed(self, key: str, limit: int = 60) -> bool:
+        return self.check(key, limit).allowed
 
     def cleanup(self):
-        """Periodically cleanup unused keys to prevent memory leak."""
-        now = time.time()
-        keys_to_remove = []
-        for key, timestamps in self.requests.items():
-            if not timestamps:
-                keys_to_remove.append(key)
-                continue
-            # If the newest timestamp is too old, remove the key
-            if timestamps[-1] < now - self.window_seconds:
-                keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            del self.requests[key]
+        """Drop state of keys that are back to a full bucket. Scheduled periodically."""
+        removed = self.backend.cleanup(time.time())
+        if removed:
+            logger.debug(f"Rate limiter evicted {removed} idle keys")
+
+def create_backend():
+    backend = settings.RATE_LIMIT_BACKEND.lower()
+    if backend == "sqlite":
+        return SQLiteBackend(settings.RATE_LIMIT_SQLITE_PATH)
+    if backend == "redis":
+        return RedisBackend(settings.RATE_LIMIT_REDIS_URL)
+    return MemoryBackend()
+
+def tier_limit(tier: Optional[str]) -> int:
+    """Requests per minute for an API key tier; 0 means unlimited."""
+    tiers = settings.RATE_LIMIT_TIERS
+    return tiers.get(tier or "standard", tiers.get("standard", 60))
 
 # Global limiter instance
-# Default: 60 requests per minute per key
-api_limiter = InMemoryRateLimiter(max_requests=60, window_seconds=60)
+# Per-key limits come from settings.RATE_LIMIT_TIERS (requests per minute)
+api_limiter = RateLimiter(create_backend(), period_seconds=60)
@@ -1,16 +1,22 @@
-from fastapi import FastAPI, Depends, BackgroundTasks, HTTPException, WebSocket, status, Security
+from fastapi import FastAPI, Depends, BackgroundTasks, HTTPException, WebSocket, WebSocketDisconnect, Header, Query, Request, Response, status, Security
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.requests import HTTPConnection
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm, APIKeyHeader
-from sqlalchemy.orm import Session
-from sqlalchemy import case, func
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import case, func, select
 from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime, timedelta
-from typing import List, Optional
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
 import asyncio
+import ipaddress
 import logging
 import json
+import math
 import os
 import random
 import time
@@ -23,30 +29,43 @@ load_dotenv()
 smtp_user = os.getenv("SMTP_USER")
 logging.info(f"启动检查 - SMTP配置: User={smtp_user if smtp_user else '未找到'}, Server={os.getenv('SMTP_SERVER')}")
 
-from logging.handlers import QueueHandler
 from contextlib import asynccontextmanager
 from jose import JWTError, jwt
 
-import queue
-from database import get_db, engine, SessionLocal
-from models import Base, Product, PriceHistory, SystemConfig, Listing, User, Favorite, APIKey
-from schemas import ProductResponse, ConfigUpdate, StatsResponse, ProductCreate, ProductUpdate, ListingResponse, PriceHistoryResponse, ProductListResponse, UserCreate, UserResponse, Token, PasswordChange, APIKeyCreate, APIKeyResponse, APIKeyCreated, EmailConfig
+from database import get_db, get_async_db, engine, SessionLocal, AsyncSessionLocal
+from models import Product, PriceHistory, SystemConfig, Listing, User, Favorite, APIKey, ChangeEvent, CookieAccount, ProxyServer
+from schemas import ProductResponse, ConfigUpdate, StatsResponse, ProductCreate, ProductUpdate, ListingResponse, PriceHistoryResponse, ProductListResponse, UserCreate, UserResponse, Token, PasswordChange, APIKeyCreate, APIKeyResponse, APIKeyCreated, APIKeyTierUpdate, CookieAccountCreate, CookieAccountUpdate, CookieAccountResponse, ProxyServerCreate, ProxyServerUpdate, ProxyServerResponse, EmailConfig, ItemBatchRequest, ItemBatchResponse, ChangeFeedResponse
 from security import verify_password, get_password_hash, create_access_token, SECRET_KEY, ALGORITHM, generate_api_key, hash_api_key
 from services.scraper import ScraperService
+from services.sharded_crawl import run_sharded_scrape
+from services.min_price_sweep import min_price_sweep, scheduled_min_price_sweep, INTERVAL_MINUTES as MIN_SWEEP_INTERVAL_MINUTES
 from services.notifier import NotifierService
+from services import exporter
+from services.recalc import recalc_all, recalc_products
+from services.freshness import freshness_scheduler, PRIORITY_USER, USER_FRESH_SECONDS
+from services.validity import validity_jobs, validity_hub
+from services.verdicts import verdict_cache
+from services.upstream import transport
+from services.cookie_pool import cookie_pool
+from services.proxy_pool import proxy_pool, mask_proxy_url, SOCKS_SCHEMES
+from services.changes import record_change, record_product_state, encode_cursor, decode_cursor, lowest_in_flight, price_hub, SETTLE_SECONDS
 from state import ScraperState, TaskManager
-from limiter import api_limiter
-
-from collections import deque
+from limiter import api_limiter, tier_limit
+from config import settings
+from auth_cache import Principal, principal_cache, api_key_usage
+from migrations import run_migrations
+from conditional import data_version, not_modified
+from user_cache import bootstrap_cache
+from config_store import system_config
+from compression import CompressionMiddleware
+from serialization import RowsJSONResponse, pick_columns, rows_as_dicts
+from events import EventHub, sse_stream, format_sse, SSE_HEADERS
 
 # ... (imports)
 
 # Log Storage (In-Memory)
 LOG_HISTORY_SIZE = 1000
-log_history = deque(maxlen=LOG_HISTORY_SIZE)
-
-# Init DB
-Base.metadata.create_all(bind=engine)
+log_hub = EventHub(history_size=LOG_HISTORY_SIZE, queue_size=500)
 
 # Scheduler
 scheduler = BackgroundScheduler()
@@ -58,13 +77,13 @@ def scheduled_scrape():
     db = SessionLocal()
     try:
         # Get max_pages from config
-        config_pages = db.query(SystemConfig).filter(SystemConfig.key == "auto_scrape_max_pages").first()
-        max_pages = 50
-        if config_pages:
-            try:
-                max_pages = int(config_pages.value)
-            except:
-                pass
+        max_pages = system_config.get_int("auto_scrape_max_pages", 50)
+
+        if system_config.get("crawl_mode") == "sharded":
+            # Full-category sweep over price-range shards (services/sharded_crawl.py)
+            logging.info("开始定时分片爬取任务...")
+            run_sharded_scrape()
+            return
 
         service = ScraperService(db)
         logging.info(f"开始定时爬取任务 (最大 {max_pages} 页)...")
@@ -101,40 +120,44 @@ def continuous_scrape_job():
         logging.info("常驻爬取任务已停止。")
     finally:
         # Resume scheduler if enabled in config
-        config_enabled = db.query(SystemConfig).filter(SystemConfig.key == "scheduler_enabled").first()
-        if config_enabled and config_enabled.value.lower() == "true":
+        if system_config.get_bool("scheduler_enabled"):
             job = scheduler.get_job('hourly_scrape')
             if job:
                 job.resume()
                 logging.info("常驻任务结束，已恢复定时调度任务。")
         db.close()
 
+def flush_api_key_usage():
+    db = SessionLocal()
+    try:
+        api_key_usage.flush(db)
+    except Exception as e:
+        logging.error(f"写入 API Key 使用时间失败: {e}")
+    finally:
+        db.close()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global log_task
-    # Start log processor
-    log_task = asyncio.create_task(process_log_queue())
+    # Log records, task updates, price changes and validity verdicts are pushed to stream subscribers on this loop
+    loop = asyncio.get_running_loop()
+    log_hub.bind_loop(loop)
+    TaskManager.hub.bind_loop(loop)
+    price_hub.bind_loop(loop)
+    validity_hub.bind_loop(loop)
+
+    # Init DB: apply pending schema migrations before anything touches the tables
+    run_migrations(engine)
 
     db = SessionLocal()
 
     # Get interval from DB or default to 60 minutes
-    config_interval = db.query(SystemConfig).filter(SystemConfig.key == "scrape_interval_minutes").first()
-    interval_minutes = 60
-    if config_interval:
-        try:
-            interval_minutes = int(config_interval.value)
-        except:
-            pass
+    interval_minutes = system_config.get_int("scrape_interval_minutes", 60)
 
     # Get scheduler enabled state
-    config_enabled = db.query(SystemConfig).filter(SystemConfig.key == "scheduler_enabled").first()
-    scheduler_enabled = True # Default to True if not set
-    if config_enabled:
-        scheduler_enabled = config_enabled.value.lower() == "true"
-    else:
+    scheduler_enabled = system_config.get_bool("scheduler_enabled", True) # Default to True if not set
+    if system_config.get("scheduler_enabled") is None:
         # Initialize default
-        db.add(SystemConfig(key="scheduler_enabled", value="true", description="Scheduler Enabled Status"))
-        db.commit()
+        system_config.set(db, "scheduler_enabled", "true", description="Scheduler Enabled Status")
 
     # Initialize Admin User - REMOVED for Setup Wizard
     # We now rely on the frontend to detect if no users exist and prompt for setup.
@@ -143,6 +166,15 @@ async def lifespan(app: FastAPI):
 
     # Add job
     job = scheduler.add_job(scheduled_scrape, 'interval', minutes=interval_minutes, id='hourly_scrape')
+    scheduler.add_job(flush_api_key_usage, 'interval', seconds=30, id='flush_api_key_usage')
+    scheduler.add_job(api_limiter.cleanup, 'interval', minutes=5, id='rate_limiter_cleanup')
+    scheduler.add_job(proxy_pool.check_health, 'interval', minutes=1, id='proxy_health_check')
+    # Price-ascending min-price sweep, next to the time-ordered crawl (services/min_price_sweep.py)
+    min_sweep_minutes = system_config.get_int("min_sweep_interval_minutes", MIN_SWEEP_INTERVAL_MINUTES)
+    scheduler.add_job(scheduled_min_price_sweep, 'interval', minutes=min_sweep_minutes, id='min_price_sweep', max_instances=1)
+
+    # Background listing verification (services/freshness.py)
+    freshness_scheduler.start()
 
     # Start scheduler but pause job if disabled
     scheduler.start()
@@ -156,9 +188,10 @@ async def lifespan(app: FastAPI):
 
     # Shutdown logic
     ScraperState.set_stop(True)
-    if log_task:
-        log_task.cancel()
     scheduler.shutdown(wait=False)
+    freshness_scheduler.stop()
+    min_price_sweep.stop()
+    flush_api_key_usage()
 
 app = FastAPI(title="Bilibili Magic Market Scraper", lifespan=lifespan, docs_url=None, redoc_url=None)
 
@@ -182,6 +215,9 @@ async def redoc_html():
     )
 
 # CORS
+# brotli / gzip for larger bodies, negotiated per request
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], # Allow all for dev
@@ -202,13 +238,13 @@ def scheduled_scrape():
     db = SessionLocal()
     try:
         # Get max_pages from config
-        config_pages = db.query(SystemConfig).filter(SystemConfig.key == "auto_scrape_max_pages").first()
-        max_pages = 50
-        if config_pages:
-            try:
-                max_pages = int(config_pages.value)
-            except:
-                pass
+        max_pages = system_config.get_int("auto_scrape_max_pages", 50)
+
+        if system_config.get("crawl_mode") == "sharded":
+            # Full-category sweep over price-range shards (services/sharded_crawl.py)
+            logging.info("开始定时分片爬取任务...")
+            run_sharded_scrape()
+            return
 
         service = ScraperService(db)
         logging.info(f"开始定时爬取任务 (最大 {max_pages} 页)...")
@@ -245,17 +281,29 @@ def continuous_scrape_job():
         logging.info("常驻爬取任务已停止。")
     finally:
         # Resume scheduler if enabled in config
-        config_enabled = db.query(SystemConfig).filter(SystemConfig.key == "scheduler_enabled").first()
-        if config_enabled and config_enabled.value.lower() == "true":
+        if system_config.get_bool("scheduler_enabled"):
             job = scheduler.get_job('hourly_scrape')
             if job:
                 job.resume()
                 logging.info("常驻任务结束，已恢复定时调度任务。")
         db.close()
 
-# Log Queue Processing
-log_queue = queue.Queue()
-queue_handler = QueueHandler(log_queue)
+# Log Streaming
+class LogHubHandler(logging.Handler):
+    """Publishes each record to log_hub the moment it is emitted, from whichever thread logs it."""
+
+    def emit(self, record):
+        try:
+            log_hub.publish({
+                "time": datetime.fromtimestamp(record.created).strftime('%H:%M:%S'),
+                "level": record.levelname,
+                "message": record.getMessage(),
+                "timestamp": record.created
+            })
+        except Exception:
+            self.handleError(record)
+
+hub_handler = LogHubHandler()
 
 # Configure Logging
 logging.basicConfig(
@@ -263,28 +311,28 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(), # Output to console
-        queue_handler # Output to queue
+        hub_handler # Output to log stream
     ]
 )
 
-# Ensure specific loggers use our queue handler for frontend display
+# Ensure specific loggers use our hub handler for frontend display
 # We explicitly EXCLUDE "uvicorn.access" to prevent HTTP requests from showing in frontend logs
 for logger_name in ["uvicorn", "uvicorn.error", "services.scraper", "services.notifier"]:
     logger = logging.getLogger(logger_name)
     # Remove existing handlers to avoid duplication if reloaded
-    logger.handlers = [h for h in logger.handlers if not isinstance(h, QueueHandler)]
-    logger.addHandler(queue_handler)
+    logger.handlers = [h for h in logger.handlers if not isinstance(h, LogHubHandler)]
+    logger.addHandler(hub_handler)
     logger.setLevel(logging.INFO)
     logger.propagate = False
 
-# Special handling for uvicorn.access - ONLY Console, NO Queue
+# Special handling for uvicorn.access - ONLY Console, NO log stream
 access_logger = logging.getLogger("uvicorn.access")
-# Remove QueueHandler if present (to be safe)
-access_logger.handlers = [h for h in access_logger.handlers if not isinstance(h, QueueHandler)]
+# Remove LogHubHandler if present (to be safe)
+access_logger.handlers = [h for h in access_logger.handlers if not isinstance(h, LogHubHandler)]
 # Ensure it has a StreamHandler (usually added by uvicorn default, but we can ensure it propagates or has one)
-# If we set propagate=True, it goes to root logger which has StreamHandler AND QueueHandler.
+# If we set propagate=True, it goes to root logger which has StreamHandler AND LogHubHandler.
 # So we must set propagate=False and ensure it has its own StreamHandler if we want console only.
-# However, uvicorn usually configures this. Let's just NOT add QueueHandler.
+# However, uvicorn usually configures this. Let's just NOT add LogHubHandler.
 access_logger.propagate = False
 # Add StreamHandler explicitly if empty to ensure console output
 if not access_logger.handlers:
@@ -296,42 +344,17 @@ root_logger.setLevel(logging.INFO)
 
 logging.getLogger('apscheduler').setLevel(logging.WARNING)
 
-log_task = None
-
-async def process_log_queue():
-    try:
-        while True:
-            while not log_queue.empty():
-                try:
-                    record = log_queue.get_nowait()
-
-                    # No need for manual filtering anymore as we don't pipe access logs here
-
-                    log_entry = {
-                        "time": datetime.fromtimestamp(record.created).strftime('%H:%M:%S'),
-                        "level": record.levelname,
-                        "message": record.getMessage(),
-                        "timestamp": record.created
-                    }
-                    log_history.append(log_entry)
-                except queue.Empty:
-                    break
-                except Exception as e:
-                    print(f"Error processing log: {e}")
-            await asyncio.sleep(0.5)
-    except asyncio.CancelledError:
-        pass
-
 # ... (scrape functions)
 
 # HTTP Log Endpoint
 @app.get("/api/logs")
-def get_logs(since: float = 0):
+async def get_logs(since: float = 0):
     """
     Get logs since a specific timestamp.
     If since is 0, returns the last 100 logs.
+    Prefer /api/logs/stream or /ws/logs, which push new records as they happen.
     """
-    logs = list(log_history)
+    logs = log_hub.history()
 
     if since > 0:
         # Filter logs newer than 'since'
@@ -341,32 +364,163 @@ def get_logs(since: float = 0):
         # Return last 100 logs for initial load
         return logs[-100:]
 
+def log_resume_point(last_id: Optional[int]) -> int:
+    # Without a resume id, start with the last 100 records like the initial /api/logs load
+    if last_id is None:
+        return max(log_hub.last_seq - 100, 0)
+    return last_id
+
+@app.get("/api/logs/stream")
+async def stream_logs(last_id: Optional[int] = None, last_event_id: Optional[int] = Header(None)):
+    """
+    Server-Sent Events stream of log records.
+    Each event id is the record's sequence number; EventSource resumes via Last-Event-ID automatically.
+    """
+    since = log_resume_point(last_event_id if last_event_id is not None else last_id)
+    subscription = log_hub.subscribe(since=since)
+    return StreamingResponse(sse_stream(subscription, "log"), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.websocket("/ws/logs")
+async def websocket_logs(websocket: WebSocket, last_id: Optional[int] = None):
+    await websocket.accept()
+    subscription = log_hub.subscribe(since=log_resume_point(last_id))
+    try:
+        while True:
+            event = await subscription.get(timeout=30)
+            if event is None:
+                if subscription.closed:
+                    # Fell too far behind; the client reconnects with ?last_id=
+                    await websocket.close(code=1013)
+                    break
+                continue
+            await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscription.close()
+
+MAX_PRICE_SUBSCRIPTIONS = 500
+
+@app.websocket("/ws/prices")
+async def websocket_prices(websocket: WebSocket, token: Optional[str] = None, api_key: Optional[str] = None):
+    """
+    Live change events (price changes, listings added/removed, stock changes) for chosen goods.
+
+    Authenticate with ?token=<JWT> or ?api_key=. Then send
+    {"action": "subscribe" | "unsubscribe", "goods_ids": [...], "favorites": true}
+    to change the watched set; each change is acknowledged with a "subscribed" message.
+    """
+    try:
+        user_id = await run_in_threadpool(authenticate_websocket, websocket, token, api_key)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    watched = set()
+    subscription = price_hub.subscribe(predicate=lambda event: event["goods_id"] in watched)
+
+    async def favorite_ids():
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Favorite.goods_id).where(Favorite.user_id == user_id))
+            return set(result.scalars().all())
+
+    async def receive_commands():
+        while True:
+            try:
+                command = json.loads(await websocket.receive_text())
+            except ValueError:
+                command = None
+            if not isinstance(command, dict):
+                await websocket.send_json({"type": "error", "detail": "Expected a JSON object"})
+                continue
+            raw_ids = command.get("goods_ids", [])
+            if not isinstance(raw_ids, list) or not all(
+                isinstance(g, (str, int)) and not isinstance(g, bool) and str(g).isdecimal() for g in raw_ids
+            ):
+                await websocket.send_json({"type": "error", "detail": "goods_ids must be a list of goods ids"})
+                continue
+            goods_ids = {int(g) for g in raw_ids}
+            if command.get("favorites"):
+                goods_ids |= await favorite_ids()
+
+            if command.get("action") == "unsubscribe":
+                watched.difference_update(goods_ids)
+            elif command.get("action") == "subscribe":
+                if len(watched | goods_ids) > MAX_PRICE_SUBSCRIPTIONS:
+                    await websocket.send_json({"type": "error", "detail": f"At most {MAX_PRICE_SUBSCRIPTIONS} goods per connection"})
+                    continue
+                watched.update(goods_ids)
+            await websocket.send_json({"type": "subscribed", "goods_ids": sorted(watched)})
+
+    async def send_events():
+        while True:
+            event = await subscription.get(timeout=30)
+            if event is None:
+                if subscription.closed:
+                    # Fell too far behind; the client reconnects and subscribes again
+                    await websocket.close(code=1013)
+                    return
+                continue
+            await websocket.send_json(event)
+
+    tasks = [asyncio.create_task(receive_commands()), asyncio.create_task(send_events())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() and not isinstance(task.exception(), WebSocketDisconnect):
+                logging.warning(f"价格推送连接异常: {task.exception()}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        subscription.close()
+
 # Auth Dependency
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token", auto_error=False)
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
-async def get_current_user(
-    token: Optional[str] = Depends(oauth2_scheme),
-    api_key: Optional[str] = Security(api_key_header),
-    db: Session = Depends(get_db)
-):
+def enforce_rate_limit(hashed_key: str, tier: Optional[str], response: Response):
+    limit = tier_limit(tier)
+    if limit <= 0:
+        return
+
+    result = api_limiter.check(hashed_key, limit)
+    headers = {
+        "RateLimit-Limit": str(result.limit),
+        "RateLimit-Remaining": str(result.remaining),
+        "RateLimit-Reset": str(math.ceil(result.reset_after)),
+    }
+    if not result.allowed:
+        headers["Retry-After"] = str(math.ceil(result.retry_after))
+        raise HTTPException(status_code=429, detail=f"Rate limit exceeded ({limit} req/min)", headers=headers)
+    response.headers.update(headers)
+
+TRUSTED_PROXY_NETWORKS = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXIES]
+
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXY_NETWORKS)
+
+def client_ip(connection: HTTPConnection) -> str:
+    # X-Real-IP only counts when set by a configured proxy (nginx); any other client could make it up
+    peer = connection.client.host if connection.client else "unknown"
+    real_ip = connection.headers.get("x-real-ip")
+    return real_ip if real_ip and is_trusted_proxy(peer) else peer
+
+def cached_principal(response: Response, token: Optional[str], api_key: Optional[str]) -> Tuple[Optional[Principal], str]:
+    """Principal cached for these credentials (if any) and its cache key; API keys are rate limited here."""
     # 1. Try API Key first
     if api_key:
-        # Rate Limiting Check
-        if not api_limiter.is_allowed(api_key):
-            raise HTTPException(status_code=429, detail="Rate limit exceeded (60 req/min)")
-
         hashed_key = hash_api_key(api_key)
-        db_key = db.query(APIKey).filter(APIKey.hashed_key == hashed_key, APIKey.is_active == True).first()
-        if db_key:
-            # Update last used time (Optimized: only update if > 60s ago)
-            now = datetime.now()
-            if not db_key.last_used_at or (now - db_key.last_used_at).total_seconds() > 60:
-                db_key.last_used_at = now
-                db.commit()
-            return db_key.user
-        # If API key is provided but invalid, fail immediately
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API Key")
+        cache_key = f"key:{hashed_key}"
+        principal = principal_cache.get(cache_key)
+        if principal:
+            enforce_rate_limit(hashed_key, principal.api_key_tier, response)
+            api_key_usage.touch(principal.api_key_id)
+        return principal, cache_key
 
     # 2. Try JWT Token
     if not token:
@@ -375,30 +529,110 @@ async def get_current_user(
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-
-    credentials_exception = HTTPException(
+    # A cached principal means this exact token was verified recently (and has not expired)
+    cache_key = f"jwt:{token}"
+    return principal_cache.get(cache_key), cache_key
+
+def limit_api_key_lookups(request: HTTPConnection, response: Response):
+    # Cache miss: limit lookups per client before touching the DB, so a stream of
+    # made-up keys (each one a miss) cannot turn into unlimited queries
+    enforce_rate_limit(f"lookup:{client_ip(request)}", None, response)
+
+def api_key_user(db_key: Optional[APIKey], cache_key: str, response: Response) -> User:
+    # If API key is provided but invalid, fail immediately
+    if not db_key:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API Key")
+    enforce_rate_limit(db_key.hashed_key, db_key.tier, response)
+    # last_used_at is buffered and written in bulk by flush_api_key_usage
+    api_key_usage.touch(db_key.id)
+    principal_cache.put(cache_key, db_key.user, api_key=db_key)
+    return db_key.user
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def token_claims(token: str) -> Tuple[str, Optional[float]]:
+    """Username and expiry of a valid JWT."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        raise credentials_exception()
+    username: str = payload.get("sub")
+    if username is None:
+        raise credentials_exception()
+    return username, payload.get("exp")
 
-    user = db.query(User).filter(User.username == username).first()
+def token_user(user: Optional[User], cache_key: str, expires_at: Optional[float]) -> User:
     if user is None:
-        raise credentials_exception
+        raise credentials_exception()
+    principal_cache.put(cache_key, user, expires_at=expires_at)
     return user
 
+def get_current_user(
+    request: HTTPConnection,
+    response: Response,
+    token: Optional[str] = Depends(oauth2_scheme),
+    api_key: Optional[str] = Security(api_key_header),
+    db: Session = Depends(get_db)
+):
+    principal, cache_key = cached_principal(response, token, api_key)
+    if principal:
+        return principal_cache.attach(db, principal)
+
+    if api_key:
+        limit_api_key_lookups(request, response)
+        db_key = db.query(APIKey).filter(APIKey.hashed_key == hash_api_key(api_key), APIKey.is_active == True).first()
+        return api_key_user(db_key, cache_key, response)
+
+    username, expires_at = token_claims(token)
+    return token_user(db.query(User).filter(User.username == username).first(), cache_key, expires_at)
+
+async def get_current_user_async(
+    request: HTTPConnection,
+    response: Response,
+    token: Optional[str] = Depends(oauth2_scheme),
+    api_key: Optional[str] = Security(api_key_header),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """get_current_user for async endpoints: cache misses are looked up on the async session, off the threadpool."""
+    principal, cache_key = cached_principal(response, token, api_key)
+    if principal:
+        return principal_cache.attach(db, principal)
+
+    if api_key:
+        limit_api_key_lookups(request, response)
+        result = await db.execute(
+            select(APIKey).options(joinedload(APIKey.user))
+            .where(APIKey.hashed_key == hash_api_key(api_key), APIKey.is_active == True)
+        )
+        return api_key_user(result.scalars().first(), cache_key, response)
+
+    username, expires_at = token_claims(token)
+    result = await db.execute(select(User).where(User.username == username))
+    return token_user(result.scalars().first(), cache_key, expires_at)
+
+def authenticate_websocket(websocket: WebSocket, token: Optional[str], api_key: Optional[str]) -> int:
+    """User id for WebSocket credentials. Browsers cannot set headers on a WebSocket, so they come from the query string."""
+    db = SessionLocal()
+    try:
+        return get_current_user(websocket, Response(), token=token, api_key=api_key, db=db).id
+    finally:
+        db.close()
+
 async def get_current_admin_user(current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return current_user
 
+async def get_current_developer_user(current_user: User = Depends(get_current_user)):
+    if not (current_user.is_developer or current_user.role == "admin"):
+        raise HTTPException(status_code=403, detail="Developer access required")
+    return current_user
+
 # Developer & API Key Endpoints
 
 @app.post("/api/developer/apply")
@@ -410,6 +644,7 @@ def apply_developer(current_user: User = Depends(get_current_user), db: Session
     current_user.is_developer = True
     current_user.developer_applied_at = datetime.now()
     db.commit()
+    principal_cache.invalidate_user(current_user.id)
     return {"message": "Developer status granted"}
 
 @app.get("/api/keys", response_model=List[APIKeyResponse])
@@ -446,9 +681,25 @@ def create_api_key(key_in: APIKeyCreate, current_user: User = Depends(get_curren
         created_at=new_key.created_at,
         last_used_at=new_key.last_used_at,
         is_active=new_key.is_active,
+        tier=new_key.tier,
         key=raw_key
     )
 
+@app.put("/api/keys/{key_id}/tier", response_model=APIKeyResponse)
+def update_api_key_tier(key_id: int, tier_in: APIKeyTierUpdate, current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
+    if tier_in.tier not in settings.RATE_LIMIT_TIERS:
+        raise HTTPException(status_code=400, detail=f"Unknown tier, expected one of: {', '.join(settings.RATE_LIMIT_TIERS)}")
+
+    key = db.query(APIKey).filter(APIKey.id == key_id).first()
+    if not key:
+        raise HTTPException(status_code=404, detail="API Key not found")
+
+    key.tier = tier_in.tier
+    db.commit()
+    db.refresh(key)
+    principal_cache.invalidate(f"key:{key.hashed_key}")
+    return key
+
 @app.delete("/api/keys/{key_id}")
 def delete_api_key(key_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     key = db.query(APIKey).filter(APIKey.id == key_id, APIKey.user_id == current_user.id).first()
@@ -457,8 +708,158 @@ def delete_api_key(key_id: int, current_user: User = Depends(get_current_user),
 
     db.delete(key)
     db.commit()
+    principal_cache.invalidate(f"key:{key.hashed_key}")
     return {"message": "API Key deleted"}
 
+# Cookie Pool Endpoints
+
+def mask_cookie(cookie: str) -> str:
+    return cookie[:6] + "..." + cookie[-4:] if len(cookie) > 16 else "***"
+
+def cookie_account_response(account: CookieAccount, runtime: dict) -> CookieAccountResponse:
+    state = runtime.get(account.id, {})
+    return CookieAccountResponse(
+        id=account.id,
+        name=account.name,
+        cookie=mask_cookie(account.cookie),
+        enabled=account.enabled,
+        status=state.get("status", account.status),
+        quarantined_until=account.quarantined_until,
+        strikes=account.strikes,
+        last_error=account.last_error,
+        created_at=account.created_at,
+        requests=state.get("requests", 0),
+        rate_limited=state.get("rate_limited", 0),
+    )
+
+@app.get("/api/cookies", response_model=List[CookieAccountResponse])
+def get_cookie_accounts(current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
+    runtime = cookie_pool.status()
+    return [cookie_account_response(account, runtime) for account in db.query(CookieAccount).order_by(CookieAccount.id).all()]
+
+@app.post("/api/cookies", response_model=CookieAccountResponse)
+def create_cookie_account(account_in: CookieAccountCreate, current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
+    if len(account_in.cookie.strip()) < 10:
+        raise HTTPException(status_code=400, detail="Invalid cookie")
+    account = CookieAccount(name=account_in.name, cookie=account_in.cookie.strip(), enabled=account_in.enabled)
+    db.add(account)
+    db.commit()
+    db.refresh(account)
+    cookie_pool.reload()
+    return cookie_account_response(account, cookie_pool.status())
+
+@app.put("/api/cookies/{account_id}", response_model=CookieAccountResponse)
+def update_cookie_account(account_id: int, account_in: CookieAccountUpdate, current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
+    account = db.get(CookieAccount, account_id)
+    if not account:
+        raise HTTPException(status_code=404, detail="Cookie account not found")
+
+    if account_in.name is not None:
+        account.name = account_in.name
+    if account_in.cookie is not None:
+        if len(account_in.cookie.strip()) < 10:
+            raise HTTPException(status_code=400, detail="Invalid cookie")
+        # A new cookie starts healthy
+        account.cookie = account_in.cookie.strip()
+        account.status = "healthy"
+        account.quarantined_until = None
+        account.strikes = 0
+        account.last_error = None
+    if account_in.enabled is not None:
+        account.enabled = account_in.enabled
+    db.commit()
+    db.refresh(account)
+    cookie_pool.reload()
+    return cookie_account_response(account, cookie_pool.status())
+
+@app.delete("/api/cookies/{account_id}")
+def delete_cookie_account(account_id: int, current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
+    account = db.get(CookieAccount, account_id)
+    if not account:
+        raise HTTPException(status_code=404, detail="Cookie account not found")
+
+    db.delete(account)
+    db.commit()
+    cookie_pool.reload()
+    return {"message": "Cookie account deleted"}
+
+# Proxy Pool Endpoints
+
+PROXY_SCHEMES = ("http", "https") + SOCKS_SCHEMES
+
+def validate_proxy_url(url: str) -> str:
+    url = url.strip()
+    scheme, sep, rest = url.partition("://")
+    if not sep or scheme.lower() not in PROXY_SCHEMES or not rest:
+        raise HTTPException(status_code=400, detail=f"Invalid proxy URL, expected <scheme>://[user:pass@]host:port with scheme one of: {', '.join(PROXY_SCHEMES)}")
+    return url
+
+def proxy_server_response(proxy: ProxyServer, runtime: dict) -> ProxyServerResponse:
+    return ProxyServerResponse(
+        id=proxy.id,
+        name=proxy.name,
+        url=mask_proxy_url(proxy.url),
+        enabled=proxy.enabled,
+        max_concurrency=proxy.max_concurrency,
+        created_at=proxy.created_at,
+        **runtime.get(proxy.id, {}),
+    )
+
+@app.get("/api/proxies", response_model=List[ProxyServerResponse])
+def get_proxy_servers(current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
+    runtime = proxy_pool.status()
+    return [proxy_server_response(proxy, runtime) for proxy in db.query(ProxyServer).order_by(ProxyServer.id).all()]
+
+@app.post("/api/proxies", response_model=ProxyServerResponse)
+def create_proxy_server(proxy_in: ProxyServerCreate, current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
+    proxy = ProxyServer(
+        name=proxy_in.name,
+        url=validate_proxy_url(proxy_in.url),
+        enabled=proxy_in.enabled,
+        max_concurrency=max(1, proxy_in.max_concurrency),
+    )
+    db.add(proxy)
+    db.commit()
+    db.refresh(proxy)
+    proxy_pool.reload()
+    return proxy_server_response(proxy, proxy_pool.status())
+
+@app.put("/api/proxies/{proxy_id}", response_model=ProxyServerResponse)
+def update_proxy_server(proxy_id: int, proxy_in: ProxyServerUpdate, current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
+    proxy = db.get(ProxyServer, proxy_id)
+    if not proxy:
+        raise HTTPException(status_code=404, detail="Proxy not found")
+
+    if proxy_in.name is not None:
+        proxy.name = proxy_in.name
+    if proxy_in.url is not None:
+        proxy.url = validate_proxy_url(proxy_in.url)
+    if proxy_in.enabled is not None:
+        proxy.enabled = proxy_in.enabled
+    if proxy_in.max_concurrency is not None:
+        proxy.max_concurrency = max(1, proxy_in.max_concurrency)
+    db.commit()
+    db.refresh(proxy)
+    proxy_pool.reload()
+    return proxy_server_response(proxy, proxy_pool.status())
+
+@app.delete("/api/proxies/{proxy_id}")
+def delete_proxy_server(proxy_id: int, current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
+    proxy = db.get(ProxyServer, proxy_id)
+    if not proxy:
+        raise HTTPException(status_code=404, detail="Proxy not found")
+
+    db.delete(proxy)
+    db.commit()
+    proxy_pool.reload()
+    return {"message": "Proxy deleted"}
+
+@app.post("/api/proxies/check")
+def check_proxy_servers(current_user: User = Depends(get_current_admin_user)):
+    """Run the proxy health check now instead of waiting for the next scheduled one."""
+    proxy_pool.check_health()
+    return proxy_pool.status()
+
 # System Endpoints
 
 @app.get("/api/system/status")
@@ -467,7 +868,7 @@ def get_system_status(db: Session = Depends(get_db)):
     return {"initialized": user_count > 0}
 
 @app.get("/api/system/email/config", response_model=EmailConfig)
-def get_email_config(current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
+def get_email_config(current_user: User = Depends(get_current_admin_user)):
     # Retrieve from DB or Env
     # Priority: DB > Env
 
@@ -476,8 +877,7 @@ def get_email_config(current_user: User = Depends(get_current_admin_user), db: S
         return os.getenv(key.upper(), default)
 
     # Check enabled status from DB
-    enabled_conf = db.query(SystemConfig).filter(SystemConfig.key == "email_notification_enabled").first()
-    enabled = enabled_conf.value.lower() == "true" if enabled_conf else False
+    enabled = system_config.get_bool("email_notification_enabled")
 
     return {
         "smtp_server": get_config_val("smtp_server", "smtp.qq.com"),
@@ -491,14 +891,7 @@ def get_email_config(current_user: User = Depends(get_current_admin_user), db: S
 @app.post("/api/system/email/config")
 def update_email_config(config: EmailConfig, current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
     # Only update the enabled toggle
-    db_conf = db.query(SystemConfig).filter(SystemConfig.key == "email_notification_enabled").first()
-    if not db_conf:
-        db_conf = SystemConfig(key="email_notification_enabled", value="true" if config.enabled else "false")
-        db.add(db_conf)
-    else:
-        db_conf.value = "true" if config.enabled else "false"
-
-    db.commit()
+    system_config.set(db, "email_notification_enabled", "true" if config.enabled else "false")
     return {"message": "Email configuration updated"}
 
 @app.post("/api/system/email/test")
@@ -609,6 +1002,7 @@ def delete_user(user_id: int, current_user: User = Depends(get_current_admin_use
 
     db.delete(user)
     db.commit()
+    principal_cache.invalidate_user(user_id)
     return {"message": "User deleted"}
 
 @app.post("/api/auth/change-password")
@@ -618,14 +1012,30 @@ def change_password(password_data: PasswordChange, current_user: User = Depends(
 
     current_user.hashed_password = get_password_hash(password_data.new_password)
     db.commit()
+    principal_cache.invalidate_user(current_user.id)
     return {"message": "密码修改成功"}
 
 # Favorite Endpoints
 
 @app.get("/api/tasks/active")
-def get_active_tasks(current_user: User = Depends(get_current_user)):
+async def get_active_tasks(current_user: User = Depends(get_current_user_async)):
     return TaskManager.get_active_tasks()
 
+@app.get("/api/tasks/stream")
+async def stream_tasks(current_user: User = Depends(get_current_user_async)):
+    """
+    Server-Sent Events stream of task updates.
+    Starts with a "snapshot" event holding the active tasks, then one "task" event per change.
+    """
+    subscription = TaskManager.hub.subscribe()
+
+    async def events():
+        yield format_sse({"seq": subscription.last_seq, "tasks": TaskManager.get_active_tasks()}, "snapshot")
+        async for chunk in sse_stream(subscription, "task"):
+            yield chunk
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @app.post("/api/favorites/check")
 def check_all_favorites(body: dict, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     # Get all favorite goods_ids
@@ -639,28 +1049,20 @@ def check_all_favorites(body: dict, background_tasks: BackgroundTasks, current_u
     task_id = TaskManager.add_task("check_favorites", f"检查 {len(goods_ids)} 个关注商品")
     TaskManager.update_task(task_id, total=len(goods_ids))
 
-    # Run check in background to avoid timeout
+    # Checks run on the shared freshness scheduler: goods another user already queued are checked once for both
     def check_task(ids: List[int], tid: str):
-        # Create a new session for the background task
-        task_db = SessionLocal()
         try:
-            service = ScraperService(task_db)
             logging.info(f"开始检查用户 {current_user.username} 的 {len(ids)} 个关注商品...")
-            count = 0
-            for gid in ids:
-                service.check_listings_validity(gid)
-                count += 1
+            checks = freshness_scheduler.request(ids, priority=PRIORITY_USER)
+            for count, check in enumerate(checks, 1):
+                check.wait()
                 TaskManager.update_task(tid, progress=count)
-                # Add a small delay between items to be safe
-                time.sleep(random.uniform(1.0, 2.0))
 
             TaskManager.update_task(tid, status="completed", message="检查完成")
             logging.info(f"用户 {current_user.username} 的关注商品检查完成。")
         except Exception as e:
             TaskManager.update_task(tid, status="failed", message=str(e))
             logging.error(f"检查任务失败: {e}")
-        finally:
-            task_db.close()
 
     background_tasks.add_task(check_task, goods_ids, task_id)
     return {"message": f"已开始后台检查 {len(goods_ids)} 个关注商品，请稍后刷新列表查看结果。"}
@@ -671,6 +1073,7 @@ def toggle_favorite(goods_id: int, current_user: User = Depends(get_current_user
     if existing:
         db.delete(existing)
         db.commit()
+        bootstrap_cache.invalidate_user(current_user.id)
         return {"message": "Removed from favorites", "is_favorite": False}
     else:
         # Check if product exists
@@ -681,103 +1084,64 @@ def toggle_favorite(goods_id: int, current_user: User = Depends(get_current_user
         fav = Favorite(user_id=current_user.id, goods_id=goods_id)
         db.add(fav)
         db.commit()
+        bootstrap_cache.invalidate_user(current_user.id)
         return {"message": "Added to favorites", "is_favorite": True}
 
 @app.get("/api/favorites/ids", response_model=List[int])
-def get_favorite_ids(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    favorites = db.query(Favorite.goods_id).filter(Favorite.user_id == current_user.id).all()
-    return [f.goods_id for f in favorites]
+async def get_favorite_ids(current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(Favorite.goods_id).where(Favorite.user_id == current_user.id))
+    return result.scalars().all()
 
 @app.get("/api/favorites/recent", response_model=List[ProductResponse])
-def get_recent_favorites(limit: int = 5, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_recent_favorites(limit: int = 5, current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
     # Get favorites joined with products, ordered by update_time desc
-    items = db.query(Product)\
-        .join(Favorite, Product.goods_id == Favorite.goods_id)\
-        .filter(Favorite.user_id == current_user.id)\
-        .order_by(Product.update_time.desc())\
-        .limit(limit)\
-        .all()
-    return items
-
-@app.get("/api/tasks/active")
-def get_active_tasks(current_user: User = Depends(get_current_user)):
-    return TaskManager.get_active_tasks()
-
-@app.post("/api/favorites/check")
-def check_all_favorites(body: dict, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Get all favorite goods_ids
-    favorites = db.query(Favorite.goods_id).filter(Favorite.user_id == current_user.id).all()
-    goods_ids = [f.goods_id for f in favorites]
-
-    if not goods_ids:
-        return {"message": "No favorites to check"}
-
-    # Register task
-    task_id = TaskManager.add_task("check_favorites", f"检查 {len(goods_ids)} 个关注商品")
-    TaskManager.update_task(task_id, total=len(goods_ids))
-
-    # Run check in background to avoid timeout
-    def check_task(ids: List[int], tid: str):
-        # Create a new session for the background task
-        task_db = SessionLocal()
-        try:
-            service = ScraperService(task_db)
-            logging.info(f"开始检查用户 {current_user.username} 的 {len(ids)} 个关注商品...")
-            count = 0
-            for gid in ids:
-                service.check_listings_validity(gid)
-                count += 1
-                TaskManager.update_task(tid, progress=count)
-                # Add a small delay between items to be safe
-                time.sleep(random.uniform(1.0, 2.0))
-
-            TaskManager.update_task(tid, status="completed", message="检查完成")
-            logging.info(f"用户 {current_user.username} 的关注商品检查完成。")
-        except Exception as e:
-            TaskManager.update_task(tid, status="failed", message=str(e))
-            logging.error(f"检查任务失败: {e}")
-        finally:
-            task_db.close()
-
-    background_tasks.add_task(check_task, goods_ids, task_id)
-    return {"message": f"已开始后台检查 {len(goods_ids)} 个关注商品，请稍后刷新列表查看结果。"}
+    result = await db.execute(
+        select(Product)
+        .join(Favorite, Product.goods_id == Favorite.goods_id)
+        .where(Favorite.user_id == current_user.id)
+        .order_by(Product.update_time.desc())
+        .limit(limit)
+    )
+    return result.scalars().all()
 
 # Endpoints
 
-@app.get("/api/items", response_model=ProductListResponse)
-def get_items(
-    skip: int = 0,
-    limit: int = 50,
-    sort_by: str = "update_time",
-    order: str = "desc",
-    search: Optional[str] = None,
-    category: Optional[str] = None,
-    only_favorites: bool = False,
-    current_user: Optional[User] = Depends(get_current_user), # Optional auth for public view, but needed for favorites
-    db: Session = Depends(get_db)
-):
-    query = db.query(Product)
+# Columns of the hot list endpoints, in response_model field order (served through serialization.py)
+PRODUCT_COLUMNS = [
+    Product.goods_id, Product.name, Product.img, Product.market_price, Product.category, Product.min_price,
+    Product.historical_low_price, Product.is_out_of_stock, Product.link, Product.update_time,
+]
+LISTING_COLUMNS = [Listing.c2c_id, Listing.goods_id, Listing.price, Listing.update_time]
+HISTORY_COLUMNS = [PriceHistory.id, PriceHistory.goods_id, PriceHistory.price, PriceHistory.record_time]
+
+def sparse_columns(columns: list, fields, required: list) -> list:
+    try:
+        return pick_columns(columns, fields, required)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+def filter_items(query, search: Optional[str], category: Optional[str], only_favorites: bool, current_user: Optional[User]):
+    """Apply the /api/items filters to a select over products (shared with the export endpoints)."""
     if search:
-        query = query.filter(Product.name.contains(search))
+        query = query.where(Product.name.contains(search))
 
     if category:
         # Support multiple categories separated by comma
         categories = [c for c in category.split(',') if c] # Filter out empty strings
         if len(categories) > 0:
             if len(categories) > 1:
-                query = query.filter(Product.category.in_(categories))
+                query = query.where(Product.category.in_(categories))
             else:
-                query = query.filter(Product.category == categories[0])
+                query = query.where(Product.category == categories[0])
 
     if only_favorites:
         if not current_user:
             raise HTTPException(status_code=401, detail="Authentication required for favorites")
-        query = query.join(Favorite, Product.goods_id == Favorite.goods_id).filter(Favorite.user_id == current_user.id)
+        query = query.join(Favorite, Product.goods_id == Favorite.goods_id).where(Favorite.user_id == current_user.id)
 
-    # Get total count before pagination
-    total = query.count()
+    return query
 
+def items_order_by(sort_by: str, order: str):
     sort_attr = Product.update_time # Default
 
     if sort_by == "update_time":
@@ -795,28 +1159,384 @@ def get_items(
         sort_attr = Product.market_price - Product.min_price
 
     if order == "desc":
-        query = query.order_by(sort_attr.desc())
-    else:
-        query = query.order_by(sort_attr.asc())
+        return sort_attr.desc()
+    return sort_attr.asc()
+
+@app.get("/api/items", response_model=ProductListResponse)
+async def get_items(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 50,
+    sort_by: str = "update_time",
+    order: str = "desc",
+    search: Optional[str] = None,
+    category: Optional[str] = None,
+    only_favorites: bool = False,
+    fields: Optional[str] = Query(None, description="Comma separated product fields to return (goods_id is always included)"),
+    current_user: Optional[User] = Depends(get_current_user_async), # Optional auth for public view, but needed for favorites
+    db: AsyncSession = Depends(get_async_db)
+):
+    columns = sparse_columns(PRODUCT_COLUMNS, fields, required=["goods_id"])
+    cached = await not_modified(request, response, db, current_user.id if only_favorites else None, private=True)
+    if cached:
+        return cached
 
-    items = query.offset(skip).limit(limit).all()
-    return {"items": items, "total": total}
+    page = await items_page(db, columns, skip, limit, sort_by, order, search, category, only_favorites, current_user)
+    return RowsJSONResponse(page, headers=response.headers)
+
+async def items_page(db: AsyncSession, columns: list, skip: int, limit: int, sort_by: str, order: str,
+                     search: Optional[str], category: Optional[str], only_favorites: bool, current_user: Optional[User]) -> dict:
+    # Get total count before pagination
+    counted = filter_items(select(Product.goods_id), search, category, only_favorites, current_user)
+    total = (await db.execute(select(func.count()).select_from(counted.subquery()))).scalar_one()
+
+    query = filter_items(select(*columns), search, category, only_favorites, current_user)
+    query = query.order_by(items_order_by(sort_by, order))
+    rows = (await db.execute(query.offset(skip).limit(limit))).all()
+    return {"items": rows_as_dicts(columns, rows), "total": total}
+
+@app.post("/api/items/batch", response_model=ItemBatchResponse)
+async def get_items_batch(body: ItemBatchRequest, current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    """
+    Products, cheapest listings and (optionally) price history for many goods at once.
+    Always three queries at most, however many ids are requested.
+    ``fields`` / ``listing_fields`` narrow the product and listing columns.
+    """
+    product_columns = sparse_columns(PRODUCT_COLUMNS, body.fields, required=["goods_id"])
+    listing_columns = sparse_columns(LISTING_COLUMNS, body.listing_fields, required=["c2c_id"])
+    goods_ids = list(dict.fromkeys(body.goods_ids))
+
+    rows = (await db.execute(select(*product_columns).where(Product.goods_id.in_(goods_ids)))).all()
+    products = {item["goods_id"]: item for item in rows_as_dicts(product_columns, rows)}
+    found = list(products)
+
+    for item in products.values():
+        item["listings"] = []
+        item["history"] = [] if body.include_history else None
+
+    if found and body.listings_limit > 0:
+        # Top-K per item in one pass over ix_listings_goods_id_price
+        ranked = select(
+            *listing_columns,
+            Listing.goods_id.label("group_id"),
+            func.row_number().over(partition_by=Listing.goods_id, order_by=Listing.price.asc()).label("rn")
+        ).where(Listing.goods_id.in_(found)).subquery()
+        result = await db.execute(
+            select(ranked).where(ranked.c.rn <= body.listings_limit).order_by(ranked.c.group_id, ranked.c.rn)
+        )
+        for row in result.all():
+            listing = rows_as_dicts(listing_columns, [row[:len(listing_columns)]], converters={"c2c_id": str})[0]
+            products[row.group_id]["listings"].append(listing)
+
+    if found and body.include_history:
+        # Keep every step-th point (plus the latest) so each item returns about history_points rows
+        points = body.history_points
+        numbered = select(
+            *HISTORY_COLUMNS,
+            func.row_number().over(partition_by=PriceHistory.goods_id, order_by=PriceHistory.record_time.asc()).label("rn"),
+            func.count().over(partition_by=PriceHistory.goods_id).label("cnt")
+        ).where(PriceHistory.goods_id.in_(found)).subquery()
+        step = (numbered.c.cnt + (points - 1)) // points
+        result = await db.execute(
+            select(*(numbered.c[column.key] for column in HISTORY_COLUMNS))
+            .where(((numbered.c.rn - 1) % step == 0) | (numbered.c.rn == numbered.c.cnt))
+            .order_by(numbered.c.goods_id, numbered.c.rn)
+        )
+        for record in rows_as_dicts(HISTORY_COLUMNS, result.all()):
+            products[record["goods_id"]]["history"].append(record)
+
+    return RowsJSONResponse({
+        "items": [products[goods_id] for goods_id in goods_ids if goods_id in products],
+        "missing": [goods_id for goods_id in goods_ids if goods_id not in products],
+    })
+
+@app.get("/api/changes", response_model=ChangeFeedResponse)
+async def get_changes(
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=1000),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Page through the catalog change log, oldest first.
+    Start without a cursor (or right after a full export), then keep passing back next_cursor.
+    """
+    try:
+        after_id = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Taken before reading: a transaction still open then may commit a lower id than what the read returns
+    in_flight = lowest_in_flight()
+    result = await db.execute(
+        select(ChangeEvent).where(ChangeEvent.id > after_id).order_by(ChangeEvent.id).limit(limit + 1)
+    )
+    changes = result.scalars().all()
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    # Stop at the first change that may still have uncommitted predecessors
+    settled = datetime.now() - timedelta(seconds=SETTLE_SECONDS)
+    for index, change in enumerate(changes):
+        if (in_flight is not None and change.id >= in_flight) or change.created_at > settled:
+            changes, has_more = changes[:index], False
+            break
+
+    next_id = changes[-1].id if changes else after_id
+    return {"changes": changes, "next_cursor": encode_cursor(next_id), "has_more": has_more}
+
+# UI settings the item table and dashboard need before their first render
+BOOTSTRAP_CONFIG_KEYS = ["show_images", "table_page_size", "table_current_page", "check_validity_on_click"]
+BOOTSTRAP_SECTIONS = ["config", "favorites", "items", "stats", "price_drops", "recent_favorites"]
+
+async def bootstrap_items(db: AsyncSession, config: dict, sort_by: str, order: str, search: Optional[str], category: Optional[str],
+                          only_favorites: bool, current_user: User) -> dict:
+    # Page and page size are the ones the table last saved, as the frontend used to read them
+    page_size = int(config["table_page_size"]) if (config["table_page_size"] or "").isdigit() else 50
+    page = int(config["table_current_page"]) if (config["table_current_page"] or "").isdigit() else 1
+    if only_favorites:
+        page = 1
+    page_data = await items_page(db, PRODUCT_COLUMNS, (page - 1) * page_size, page_size, sort_by, order,
+                                 search, category, only_favorites, current_user)
+    return {**page_data, "page": page, "page_size": page_size}
+
+async def bootstrap_price_drops(db: AsyncSession) -> list:
+    rows = await db.execute(
+        select(*PRODUCT_COLUMNS)
+        .where(Product.market_price > Product.min_price)
+        .order_by(items_order_by("discount", "desc"))
+        .limit(10)
+    )
+    return rows_as_dicts(PRODUCT_COLUMNS, rows.all())
+
+async def bootstrap_recent_favorites(db: AsyncSession, user_id: int) -> list:
+    rows = await db.execute(
+        select(*PRODUCT_COLUMNS)
+        .join(Favorite, Product.goods_id == Favorite.goods_id)
+        .where(Favorite.user_id == user_id)
+        .order_by(Product.update_time.desc())
+        .limit(5)
+    )
+    return rows_as_dicts(PRODUCT_COLUMNS, rows.all())
+
+async def bootstrap_favorite_ids(db: AsyncSession, user_id: int) -> list:
+    return (await db.execute(select(Favorite.goods_id).where(Favorite.user_id == user_id))).scalars().all()
+
+async def with_session(fn, *args):
+    # Sections run concurrently, and an AsyncSession must not be shared between tasks
+    async with AsyncSessionLocal() as db:
+        return await fn(db, *args)
+
+@app.get("/api/bootstrap")
+async def get_bootstrap(
+    sections: str = Query(",".join(BOOTSTRAP_SECTIONS), description="Comma separated subset of: " + ", ".join(BOOTSTRAP_SECTIONS)),
+    sort_by: str = "update_time",
+    order: str = "desc",
+    search: Optional[str] = None,
+    category: Optional[str] = None,
+    only_favorites: bool = False,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Everything the item table and dashboard need for their first paint, in one round trip:
+    UI config, favorite ids, the first items page, stats, price drops and recent favorites.
+    Sections are queried concurrently; the result is cached per user while the data version holds.
+    """
+    wanted = [name for name in BOOTSTRAP_SECTIONS if name in sections.split(",")]
+    # Served from the config cache; only a reload (at most every few seconds) touches the database
+    config = await run_in_threadpool(system_config.get_many, BOOTSTRAP_CONFIG_KEYS)
+    version, _ = await data_version.get(db)
+    version = f"{version}|{system_config.version}"
+    cache_key = (tuple(wanted), sort_by, order, search, category, only_favorites, date.today())
+    body = bootstrap_cache.get(current_user.id, cache_key, version)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+
+    user_id = current_user.id
+    jobs = {
+        "favorites": lambda: with_session(bootstrap_favorite_ids, user_id),
+        "items": lambda: with_session(bootstrap_items, config, sort_by, order, search, category, only_favorites, current_user),
+        "stats": lambda: with_session(compute_stats),
+        "price_drops": lambda: with_session(bootstrap_price_drops),
+        "recent_favorites": lambda: with_session(bootstrap_recent_favorites, user_id),
+    }
+    queried = [name for name in wanted if name in jobs]
+    results = await asyncio.gather(*(jobs[name]() for name in queried))
+    payload = dict(zip(queried, results))
+    if "config" in wanted:
+        payload["config"] = config
+    if "favorites" in payload:
+        payload["favorite_ids"] = payload.pop("favorites")
+
+    body = RowsJSONResponse(payload).body
+    bootstrap_cache.put(user_id, cache_key, version, body)
+    return Response(content=body, media_type="application/json")
 
 @app.get("/api/items/{goods_id}/listings", response_model=List[ListingResponse])
-def get_item_listings(goods_id: int, limit: int = 20, db: Session = Depends(get_db)):
-    listings = db.query(Listing).filter(Listing.goods_id == goods_id).order_by(Listing.price.asc()).limit(limit).all()
-    return listings
+async def get_item_listings(
+    goods_id: int,
+    request: Request,
+    response: Response,
+    limit: int = 20,
+    fields: Optional[str] = Query(None, description="Comma separated listing fields to return (c2c_id is always included)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    columns = sparse_columns(LISTING_COLUMNS, fields, required=["c2c_id"])
+    cached = await not_modified(request, response, db)
+    if cached:
+        return cached
+    result = await db.execute(select(*columns).where(Listing.goods_id == goods_id).order_by(Listing.price.asc()).limit(limit))
+    return RowsJSONResponse(rows_as_dicts(columns, result.all(), converters={"c2c_id": str}), headers=response.headers)
 
 @app.get("/api/items/{goods_id}/history", response_model=List[PriceHistoryResponse])
-def get_item_history(goods_id: int, db: Session = Depends(get_db)):
-    history = db.query(PriceHistory).filter(PriceHistory.goods_id == goods_id).order_by(PriceHistory.record_time.asc()).all()
-    return history
+async def get_item_history(goods_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    cached = await not_modified(request, response, db)
+    if cached:
+        return cached
+    result = await db.execute(select(*HISTORY_COLUMNS).where(PriceHistory.goods_id == goods_id).order_by(PriceHistory.record_time.asc()))
+    return RowsJSONResponse(rows_as_dicts(HISTORY_COLUMNS, result.all()), headers=response.headers)
+
+PAST_DAY_MAX_AGE = 300
+
+@app.get("/api/items/{goods_id}/history/{day}", response_model=List[PriceHistoryResponse])
+async def get_item_history_day(goods_id: int, day: date, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    """
+    One day of price history. Past days only change when the item is deleted (or
+    re-added), so they may be cached publicly (nginx, browsers) for a bounded
+    PAST_DAY_MAX_AGE and are revalidated against the ETag afterwards.
+    """
+    cached = await not_modified(request, response, db)
+    if day < date.today():
+        response.headers["Cache-Control"] = f"public, max-age={PAST_DAY_MAX_AGE}"
+        if cached:
+            cached.headers["Cache-Control"] = response.headers["Cache-Control"]
+    if cached:
+        return cached
+
+    start = datetime(day.year, day.month, day.day)
+    result = await db.execute(
+        select(*HISTORY_COLUMNS)
+        .where(PriceHistory.goods_id == goods_id, PriceHistory.record_time >= start, PriceHistory.record_time < start + timedelta(days=1))
+        .order_by(PriceHistory.record_time.asc())
+    )
+    return RowsJSONResponse(rows_as_dicts(HISTORY_COLUMNS, result.all()), headers=response.headers)
+
+# Bulk Export
+
+PRODUCT_EXPORT_COLUMNS = [
+    Product.goods_id, Product.name, Product.category, Product.market_price, Product.min_price,
+    Product.historical_low_price, Product.is_out_of_stock, Product.link, Product.img, Product.update_time,
+]
+HISTORY_EXPORT_COLUMNS = [PriceHistory.id, PriceHistory.goods_id, PriceHistory.c2c_id, PriceHistory.price, PriceHistory.record_time]
+
+def export_response(name: str, columns: list, statement, fmt: str, compression: str) -> StreamingResponse:
+    try:
+        exporter.validate_options(fmt, compression)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    media_type, filename = exporter.export_metadata(name, fmt, compression)
+    body = exporter.stream_export(columns, exporter.iter_batches(statement), fmt, compression)
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/api/export/products")
+def export_products(
+    fmt: str = Query("csv", alias="format"),
+    compression: str = "none",
+    sort_by: str = "update_time",
+    order: str = "desc",
+    search: Optional[str] = None,
+    category: Optional[str] = None,
+    only_favorites: bool = False,
+    current_user: User = Depends(get_current_developer_user)
+):
+    """
+    Stream every product matching the /api/items filters as csv, ndjson, parquet or xlsx.
+    csv and ndjson can be compressed with gzip or zstd.
+    """
+    statement = filter_items(select(*PRODUCT_EXPORT_COLUMNS), search, category, only_favorites, current_user)
+    statement = statement.order_by(items_order_by(sort_by, order), Product.goods_id)
+    return export_response("products", PRODUCT_EXPORT_COLUMNS, statement, fmt, compression)
+
+@app.get("/api/export/history")
+def export_history(
+    fmt: str = Query("csv", alias="format"),
+    compression: str = "none",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    search: Optional[str] = None,
+    category: Optional[str] = None,
+    only_favorites: bool = False,
+    current_user: User = Depends(get_current_developer_user)
+):
+    """Stream the price history of every product matching the /api/items filters, ordered by goods_id and time."""
+    goods_ids = filter_items(select(Product.goods_id), search, category, only_favorites, current_user)
+    statement = select(*HISTORY_EXPORT_COLUMNS)
+    if search or category or only_favorites:
+        statement = statement.where(PriceHistory.goods_id.in_(goods_ids))
+    if start:
+        statement = statement.where(PriceHistory.record_time >= start)
+    if end:
+        statement = statement.where(PriceHistory.record_time < end)
+    statement = statement.order_by(PriceHistory.goods_id, PriceHistory.record_time)
+    return export_response("price_history", HISTORY_EXPORT_COLUMNS, statement, fmt, compression)
 
 @app.post("/api/items/{goods_id}/check_validity")
 def check_item_validity(goods_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    service = ScraperService(db)
-    result = service.check_listings_validity(goods_id)
-    return result
+    # Popular goods were usually just checked for another viewer: answer from the verdict cache
+    result = ScraperService(db).check_listings_validity(goods_id, fresh_seconds=USER_FRESH_SECONDS, cached_only=True)
+    if result is not None:
+        return {"job_id": None, "status": "completed", **result}
+
+    # Otherwise check upstream in the background; viewers of the same goods share one job
+    job = validity_jobs.start(goods_id)
+    return {"job_id": job["id"], "status": job["status"], "events": f"/api/validity/{job['id']}/events"}
+
+@app.get("/api/validity/{job_id}")
+def get_validity_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = validity_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {k: v for k, v in job.items() if k not in ("seq", "done_event")}
+
+@app.get("/api/validity/{job_id}/events")
+async def stream_validity_job(job_id: str, current_user: User = Depends(get_current_user_async)):
+    """
+    Server-Sent Events stream of a validity check: one "validity" event per listing verdict
+    (with the product's recomputed min_price), ending with the event of type "done".
+    """
+    job = validity_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        if job["done_event"] is not None:
+            # Finished: its events may have left the replay history, so just report the outcome
+            yield format_sse(job["done_event"], "validity")
+            return
+        # Replay from the job's first event, so verdicts published before the client connected are not missed
+        subscription = validity_hub.subscribe(
+            since=job["seq"] - 1, queue_size=1000, predicate=lambda event: event["job_id"] == job_id
+        )
+        async for chunk in sse_stream(subscription, "validity", until=lambda event: event["type"] == "done"):
+            if chunk.startswith(":") and job["done_event"] is not None:
+                # The job ended but its "done" event never reached this subscription
+                yield format_sse(job["done_event"], "validity")
+                break
+            yield chunk
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/api/freshness/status")
+def get_freshness_status(current_user: User = Depends(get_current_admin_user)):
+    return {**freshness_scheduler.status(), "verdict_cache": verdict_cache.stats}
+
+@app.get("/api/upstream/stats")
+def get_upstream_stats(current_user: User = Depends(get_current_admin_user)):
+    """Per-endpoint latency and status counts of calls to the Bilibili API since startup, and the cookie and proxy pool state."""
+    return {**transport.stats(), "accounts": cookie_pool.status(), "proxies": proxy_pool.status()}
 
 @app.post("/api/items/{goods_id}/recalc")
 def recalc_item_price(goods_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -824,23 +1544,7 @@ def recalc_item_price(goods_id: int, current_user: User = Depends(get_current_us
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    # Find lowest price listing
-    min_listing = db.query(Listing).filter(Listing.goods_id == goods_id).order_by(Listing.price.asc()).first()
-
-    if min_listing:
-        product.min_price = min_listing.price
-        product.is_out_of_stock = False
-        product.link = f"https://mall.bilibili.com/neul-next/index.html?page=magic-market_detail&noTitleBar=1&itemsId={min_listing.c2c_id}&from=market_index"
-
-        # Update historical low if needed
-        if product.historical_low_price is None or min_listing.price < product.historical_low_price:
-            product.historical_low_price = min_listing.price
-    else:
-        # No listings -> Out of stock -> Set price to market price
-        product.min_price = product.market_price
-        product.is_out_of_stock = True
-        product.link = None
-
+    recalc_products(db, [goods_id])
     db.commit()
     db.refresh(product)
     return product
@@ -854,35 +1558,13 @@ def recalc_all_items(background_tasks: BackgroundTasks, current_user: User = Dep
         db_task = SessionLocal()
         try:
             logging.info("开始全局价格修正任务...")
-            products = db_task.query(Product).all()
-            total = len(products)
-            TaskManager.update_task(tid, total=total)
-
-            count = 0
-            for product in products:
-                # Find lowest price listing
-                min_listing = db_task.query(Listing).filter(Listing.goods_id == product.goods_id).order_by(Listing.price.asc()).first()
-
-                if min_listing:
-                    product.min_price = min_listing.price
-                    product.is_out_of_stock = False
-                    product.link = f"https://mall.bilibili.com/neul-next/index.html?page=magic-market_detail&noTitleBar=1&itemsId={min_listing.c2c_id}&from=market_index"
-
-                    # Update historical low if needed
-                    if product.historical_low_price is None or min_listing.price < product.historical_low_price:
-                        product.historical_low_price = min_listing.price
-                else:
-                    # No listings -> Out of stock -> Set price to market price
-                    product.min_price = product.market_price
-                    product.is_out_of_stock = True
-                    product.link = None
-                count += 1
-                if count % 10 == 0: # Update progress every 10 items
-                    TaskManager.update_task(tid, progress=count)
-
-            db_task.commit()
-            TaskManager.update_task(tid, status="completed", message=f"修正完成，共处理 {count} 个商品")
-            logging.info(f"全局价格修正完成，共处理 {count} 个商品。")
+
+            def progress(done: int, total: int):
+                TaskManager.update_task(tid, progress=done, total=total)
+
+            count, changed = recalc_all(db_task, progress=progress)
+            TaskManager.update_task(tid, status="completed", message=f"修正完成，共处理 {count} 个商品，更新 {changed} 个")
+            logging.info(f"全局价格修正完成，共处理 {count} 个商品，更新 {changed} 个。")
         except Exception as e:
             TaskManager.update_task(tid, status="failed", message=str(e))
             logging.error(f"全局价格修正失败: {e}")
@@ -907,6 +1589,7 @@ def create_item(item: ProductCreate, current_user: User = Depends(get_current_ad
         update_time=datetime.now()
     )
     db.add(new_item)
+    record_change(db, "product_created", item.goods_id, new_price=item.min_price)
     db.commit()
     db.refresh(new_item)
 
@@ -919,10 +1602,12 @@ def update_item(goods_id: int, item: ProductUpdate, current_user: User = Depends
         raise HTTPException(status_code=404, detail="Item not found")
 
     update_data = item.dict(exclude_unset=True)
+    old_price, was_out_of_stock = db_item.min_price, db_item.is_out_of_stock
     for key, value in update_data.items():
         setattr(db_item, key, value)
 
     db_item.update_time = datetime.now()
+    record_product_state(db, db_item, old_price, was_out_of_stock)
     db.commit()
     db.refresh(db_item)
     return db_item
@@ -936,15 +1621,19 @@ def delete_item(goods_id: int, current_user: User = Depends(get_current_admin_us
     # Delete history first
     db.query(PriceHistory).filter(PriceHistory.goods_id == goods_id).delete()
     db.delete(db_item)
+    record_change(db, "product_deleted", goods_id, old_price=db_item.min_price)
     db.commit()
     return {"message": "Item deleted"}
 
 @app.post("/api/items/batch_delete")
 def batch_delete_items(goods_ids: List[int], current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
+    existing = db.query(Product.goods_id, Product.min_price).filter(Product.goods_id.in_(goods_ids)).all()
     # Delete history
     db.query(PriceHistory).filter(PriceHistory.goods_id.in_(goods_ids)).delete(synchronize_session=False)
     # Delete products
     db.query(Product).filter(Product.goods_id.in_(goods_ids)).delete(synchronize_session=False)
+    for goods_id, min_price in existing:
+        record_change(db, "product_deleted", goods_id, old_price=min_price)
     db.commit()
     return {"message": f"Deleted {len(goods_ids)} items"}
 
@@ -954,28 +1643,61 @@ def trigger_scrape(current_user: User = Depends(get_current_admin_user), db: Ses
     scheduler.add_job(manual_scrape_job, 'date', run_date=datetime.now(), id='manual_scrape', replace_existing=True)
     return {"message": "Scrape started in background"}
 
+@app.post("/api/scraper/sharded/start")
+def start_sharded_scrape(background_tasks: BackgroundTasks, shard_count: Optional[int] = Query(None, ge=1, le=64),
+                         max_pages_per_shard: int = Query(-1, ge=-1), current_user: User = Depends(get_current_admin_user)):
+    """Sweep the configured category over price-range shards crawled concurrently."""
+    if ScraperState.is_running():
+        raise HTTPException(status_code=400, detail="Scraper is already running")
+
+    task_id = TaskManager.add_task("sharded_scrape", "分片爬取")
+
+    def task(tid: str):
+        ScraperState.set_stop(False)
+        try:
+            stats = run_sharded_scrape(shard_count, max_pages_per_shard, task_id=tid)
+            if stats is None:
+                TaskManager.update_task(tid, status="failed", message="未配置 Cookie")
+            else:
+                TaskManager.update_task(tid, status="completed", message=f"共 {stats['pages']} 页，{stats['items']} 个挂单，用时 {stats['seconds']} 秒")
+        except Exception as e:
+            TaskManager.update_task(tid, status="failed", message=str(e))
+            logging.error(f"分片爬取失败: {e}")
+
+    background_tasks.add_task(task, task_id)
+    return {"message": "Sharded scrape started", "task_id": task_id}
+
 @app.get("/api/stats", response_model=StatsResponse)
-def get_stats(db: Session = Depends(get_db)):
-    total_items = db.query(Product).count()
-    total_history = db.query(PriceHistory).count()
+async def get_stats(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    cached = await not_modified(request, response, db)
+    if cached:
+        return cached
+    return await compute_stats(db)
+
+async def compute_stats(db: AsyncSession) -> dict:
+    total_items = (await db.execute(select(func.count()).select_from(Product))).scalar_one()
+    total_history = (await db.execute(select(func.count()).select_from(PriceHistory))).scalar_one()
 
     today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
 
     # New History Today
-    new_history_today = db.query(PriceHistory).filter(PriceHistory.record_time >= today_start).count()
+    new_history_today = (await db.execute(
+        select(func.count()).select_from(PriceHistory).where(PriceHistory.record_time >= today_start)
+    )).scalar_one()
 
     # New Items Today: Items where min(record_time) >= today_start
     # Note: This is an approximation. A better way is to check if created_at is today, but we don't have created_at.
     # We use first price history record time as creation time.
-    new_items_today = db.query(PriceHistory.goods_id)\
+    new_goods = select(PriceHistory.goods_id)\
         .group_by(PriceHistory.goods_id)\
         .having(func.min(PriceHistory.record_time) >= today_start)\
-        .count()
+        .subquery()
+    new_items_today = (await db.execute(select(func.count()).select_from(new_goods))).scalar_one()
 
     # Category Distribution
-    cat_dist = db.query(Product.category, func.count(Product.goods_id))\
-        .group_by(Product.category)\
-        .all()
+    cat_dist = (await db.execute(
+        select(Product.category, func.count(Product.goods_id)).group_by(Product.category)
+    )).all()
 
     category_distribution = {c: count for c, count in cat_dist if c}
 
@@ -988,23 +1710,42 @@ def get_stats(db: Session = Depends(get_db)):
     }
 
 @app.get("/api/items/today/new", response_model=List[ProductResponse])
-def get_today_new_items(limit: int = 20, db: Session = Depends(get_db)):
+async def get_today_new_items(limit: int = 20, db: AsyncSession = Depends(get_async_db)):
     today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
 
-    subquery = db.query(PriceHistory.goods_id)\
+    subquery = select(PriceHistory.goods_id)\
         .group_by(PriceHistory.goods_id)\
         .having(func.min(PriceHistory.record_time) >= today_start)\
         .subquery()
 
-    items = db.query(Product).join(subquery, Product.goods_id == subquery.c.goods_id).limit(limit).all()
-    return items
+    result = await db.execute(select(Product).join(subquery, Product.goods_id == subquery.c.goods_id).limit(limit))
+    return result.scalars().all()
+
+# UI settings anyone may read; every other key (cookies, crawler settings) is admin only
+PUBLIC_CONFIG_KEYS = set(BOOTSTRAP_CONFIG_KEYS)
+
+def require_config_access(keys: List[str], request: HTTPConnection, response: Response, token: Optional[str],
+                          api_key: Optional[str], db: Session):
+    if all(key in PUBLIC_CONFIG_KEYS for key in keys):
+        return
+    user = get_current_user(request, response, token=token, api_key=api_key, db=db)
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+@app.get("/api/config")
+def get_configs(request: Request, response: Response, keys: str = Query(..., description="Comma separated config keys"),
+                token: Optional[str] = Depends(oauth2_scheme), api_key: Optional[str] = Security(api_key_header),
+                db: Session = Depends(get_db)):
+    """Several config values in one call, as {key: value}; missing keys are null. Non-public keys need admin."""
+    key_list = [k for k in keys.split(",") if k]
+    require_config_access(key_list, request, response, token, api_key, db)
+    return system_config.get_many(key_list)
 
 @app.get("/api/config/{key}")
-def get_config(key: str, db: Session = Depends(get_db)):
-    config = db.query(SystemConfig).filter(SystemConfig.key == key).first()
-    if not config:
-        return {"key": key, "value": None}
-    return {"key": config.key, "value": config.value}
+def get_config(key: str, request: Request, response: Response, token: Optional[str] = Depends(oauth2_scheme),
+               api_key: Optional[str] = Security(api_key_header), db: Session = Depends(get_db)):
+    require_config_access([key], request, response, token, api_key, db)
+    return {"key": key, "value": system_config.get(key)}
 
 import time
 
@@ -1030,13 +1771,7 @@ def restart_scraper_task():
 
 @app.post("/api/config")
 def update_config(config_in: ConfigUpdate, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
-    config = db.query(SystemConfig).filter(SystemConfig.key == config_in.key).first()
-    if not config:
-        config = SystemConfig(key=config_in.key, value=config_in.value)
-        db.add(config)
-    else:
-        config.value = config_in.value
-    db.commit()
+    system_config.set(db, config_in.key, config_in.value)
 
     # Handle special config updates
     if config_in.key == "scrape_interval_minutes":
@@ -1047,6 +1782,14 @@ def update_config(config_in: ConfigUpdate, background_tasks: BackgroundTasks, cu
                 logging.info(f"已重新调度爬取任务为每 {new_minutes} 分钟一次")
         except ValueError:
             pass
+    elif config_in.key == "min_sweep_interval_minutes":
+        try:
+            new_minutes = int(config_in.value)
+            if new_minutes > 0:
+                scheduler.reschedule_job('min_price_sweep', trigger='interval', minutes=new_minutes)
+                logging.info(f"已重新调度最低价扫描为每 {new_minutes} 分钟一次")
+        except ValueError:
+            pass
 
     # If scraper is running, stop and restart it
     if ScraperState.is_running():
@@ -1069,7 +1812,8 @@ def get_scraper_status():
     return {
         "scheduler_status": scheduler_status, # running (enabled) / paused (disabled)
         "is_running": ScraperState.is_running(), # True if currently scraping
-        "next_run": next_run
+        "next_run": next_run,
+        "min_sweep": {"running": min_price_sweep.running, "last_run": min_price_sweep.last_run},
     }
 
 @app.post("/api/scraper/continuous/start")
@@ -1086,6 +1830,29 @@ def start_continuous_scrape(background_tasks: BackgroundTasks, current_user: Use
     background_tasks.add_task(continuous_scrape_job)
     return {"message": "Continuous scrape started"}
 
+@app.post("/api/scraper/min_sweep/start")
+def start_min_price_sweep(background_tasks: BackgroundTasks, current_user: User = Depends(get_current_admin_user)):
+    """Run the price-ascending min-price sweep now; it runs alongside the regular crawl."""
+    if min_price_sweep.running:
+        raise HTTPException(status_code=400, detail="Min-price sweep is already running")
+
+    task_id = TaskManager.add_task("min_price_sweep", "最低价扫描")
+
+    def task(tid: str):
+        try:
+            stats = min_price_sweep.run(task_id=tid)
+            if stats is None:
+                TaskManager.update_task(tid, status="failed", message="未配置 Cookie 或扫描已在运行")
+            else:
+                TaskManager.update_task(tid, status="stopped" if stats["stopped"] else "completed",
+                                        message=f"确认 {stats['confirmed']} 个商品，校正 {stats['corrected']} 个，用时 {stats['seconds']} 秒")
+        except Exception as e:
+            TaskManager.update_task(tid, status="failed", message=str(e))
+            logging.error(f"最低价扫描失败: {e}")
+
+    background_tasks.add_task(task, task_id)
+    return {"message": "Min-price sweep started", "task_id": task_id}
+
 @app.post("/api/scraper/scheduler/toggle")
 def toggle_scheduler(action: str, current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)): # action: start, stop
     job = scheduler.get_job('hourly_scrape')
@@ -1096,15 +1863,8 @@ def toggle_scheduler(action: str, current_user: User = Depends(get_current_admin
              raise HTTPException(status_code=400, detail="Cannot start scheduler while scraper is running. Please stop scraper first.")
 
     # Update DB config
-    config = db.query(SystemConfig).filter(SystemConfig.key == "scheduler_enabled").first()
     new_value = "true" if action == "start" else "false"
-
-    if not config:
-        config = SystemConfig(key="scheduler_enabled", value=new_value, description="Scheduler Enabled Status")
-        db.add(config)
-    else:
-        config.value = new_value
-    db.commit()
+    system_config.set(db, "scheduler_enabled", new_value, description="Scheduler Enabled Status")
 
     if action == "start":
         if job:
@@ -1112,8 +1872,7 @@ def toggle_scheduler(action: str, current_user: User = Depends(get_current_admin
         else:
             # Should not happen if initialized correctly, but fallback
             # Get interval from DB
-            config_interval = db.query(SystemConfig).filter(SystemConfig.key == "scrape_interval_minutes").first()
-            interval = int(config_interval.value) if config_interval else 60
+            interval = system_config.get_int("scrape_interval_minutes", 60)
             scheduler.add_job(scheduled_scrape, 'interval', minutes=interval, id='hourly_scrape', next_run_time=datetime.now() + timedelta(seconds=1))
         return {"message": "Scheduler started"}
     elif action == "stop":
@@ -1124,12 +1883,12 @@ def toggle_scheduler(action: str, current_user: User = Depends(get_current_admin
         raise HTTPException(status_code=400, detail="Invalid action")
 
 @app.post("/api/scraper/stop")
-def stop_scrape(current_user: User = Depends(get_current_admin_user), db: Session = Depends(get_db)):
+def stop_scrape(current_user: User = Depends(get_current_admin_user)):
     ScraperState.set_stop(True)
+    min_price_sweep.stop()
 
     # Resume scheduler if enabled in config
-    config_enabled = db.query(SystemConfig).filter(SystemConfig.key == "scheduler_enabled").first()
-    if config_enabled and config_enabled.value.lower() == "true":
+    if system_config.get_bool("scheduler_enabled"):
         job = scheduler.get_job('hourly_scrape')
         if job:
             job.resume()
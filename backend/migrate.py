@@ -0,0 +1,24 @@
+import argparse
+from database import engine
+from migrations import run_migrations, current_version, load_migrations
+
+def migrate():
+    version = run_migrations(engine)
+    print(f"Migration successful: schema is at version {version}.")
+
+def status():
+    with engine.connect() as connection:
+        version = current_version(connection)
+    for migration in load_migrations():
+        mark = "x" if migration.VERSION <= version else " "
+        print(f"[{mark}] {migration.VERSION:04d} {migration.DESCRIPTION}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending database schema migrations.")
+    parser.add_argument("--status", action="store_true", help="Only show applied / pending migrations")
+    args = parser.parse_args()
+
+    if args.status:
+        status()
+    else:
+        migrate()
@@ -0,0 +1,137 @@
+"""
+Versioned schema migrations.
+
+Every module in this package named ``vNNNN_<slug>.py`` defines ``VERSION``,
+``DESCRIPTION`` and ``upgrade(conn)``. ``run_migrations`` applies the pending
+ones in order and records each of them in the ``schema_version`` table.
+
+A fresh database is built straight from the models and stamped with the
+latest version; a database created before this framework existed is treated
+as version 0 and upgraded step by step.
+"""
+import importlib
+import logging
+import pkgutil
+from datetime import datetime
+
+from sqlalchemy import inspect, select, func, text
+
+from models import Base, SchemaVersion
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_NAME = "bmm_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 300 # seconds
+
+def load_migrations():
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        if not module_info.name.startswith("v"):
+            continue
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        migrations.append(module)
+    migrations.sort(key=lambda m: m.VERSION)
+    return migrations
+
+def current_version(conn) -> int:
+    if not inspect(conn).has_table(SchemaVersion.__tablename__):
+        return 0
+    return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+# Helpers used by individual migrations. They inspect the live schema so a
+# migration can be re-run safely against a partially upgraded database.
+
+def has_table(conn, table: str) -> bool:
+    return inspect(conn).has_table(table)
+
+def has_index(conn, table: str, name: str) -> bool:
+    return any(ix["name"] == name for ix in inspect(conn).get_indexes(table))
+
+def has_column(conn, table: str, column: str) -> bool:
+    return any(col["name"] == column for col in inspect(conn).get_columns(table))
+
+def column_type(conn, table: str, column: str) -> str:
+    for col in inspect(conn).get_columns(table):
+        if col["name"] == column:
+            return str(col["type"]).upper()
+    return ""
+
+def add_column(conn, table: str, column: str, ddl: str):
+    if has_column(conn, table, column):
+        return
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    logger.info(f"已添加字段 {table}.{column}")
+
+def create_index(conn, table: str, name: str, columns: list):
+    """Create an index without blocking writes (in-place, lock-free DDL on MySQL)."""
+    if has_index(conn, table, name):
+        return
+    cols = ", ".join(columns)
+    if conn.dialect.name == "mysql":
+        conn.execute(text(f"ALTER TABLE {table} ADD INDEX {name} ({cols}), ALGORITHM=INPLACE, LOCK=NONE"))
+    else:
+        conn.execute(text(f"CREATE INDEX {name} ON {table} ({cols})"))
+    logger.info(f"已创建索引 {table}.{name} ({cols})")
+
+def drop_index(conn, table: str, name: str):
+    if not has_index(conn, table, name):
+        return
+    if conn.dialect.name == "mysql":
+        conn.execute(text(f"ALTER TABLE {table} DROP INDEX {name}, ALGORITHM=INPLACE, LOCK=NONE"))
+    else:
+        conn.execute(text(f"DROP INDEX {name}"))
+    logger.info(f"已删除索引 {table}.{name}")
+
+def _acquire_lock(conn):
+    # Several uvicorn workers may start at once; only one of them may migrate
+    if conn.dialect.name == "mysql":
+        got = conn.execute(text("SELECT GET_LOCK(:name, :timeout)"),
+                           {"name": MIGRATION_LOCK_NAME, "timeout": MIGRATION_LOCK_TIMEOUT}).scalar()
+        if got != 1:
+            raise RuntimeError("Timed out waiting for the schema migration lock")
+
+def _release_lock(conn):
+    if conn.dialect.name == "mysql":
+        conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK_NAME})
+
+def _stamp(conn, migration):
+    conn.execute(SchemaVersion.__table__.insert().values(
+        version=migration.VERSION,
+        description=migration.DESCRIPTION,
+        applied_at=datetime.now()
+    ))
+
+def run_migrations(engine):
+    """Bring the database schema up to the latest version. Returns the resulting version."""
+    migrations = load_migrations()
+    latest = migrations[-1].VERSION if migrations else 0
+
+    with engine.connect() as conn:
+        _acquire_lock(conn)
+        try:
+            is_fresh = not inspect(conn).get_table_names()
+            SchemaVersion.__table__.create(conn, checkfirst=True)
+            conn.commit()
+
+            version = current_version(conn)
+            if version == 0 and is_fresh:
+                # Empty database: the models already describe the latest schema
+                Base.metadata.create_all(conn)
+                for migration in migrations:
+                    _stamp(conn, migration)
+                conn.commit()
+                logger.info(f"已初始化数据库结构 (版本 {latest})")
+                return latest
+
+            for migration in migrations:
+                if migration.VERSION <= version:
+                    continue
+                logger.info(f"正在应用数据库迁移 {migration.VERSION}: {migration.DESCRIPTION}")
+                migration.upgrade(conn)
+                _stamp(conn, migration)
+                conn.commit()
+                version = migration.VERSION
+
+            return version
+        finally:
+            _release_lock(conn)
@@ -0,0 +1,9 @@
+"""Tables as they existed before versioned migrations were introduced."""
+from models import Base
+
+VERSION = 1
+DESCRIPTION = "baseline schema"
+
+def upgrade(conn):
+    # Legacy installs may predate some tables (users, api_keys, favorites...)
+    Base.metadata.create_all(conn)
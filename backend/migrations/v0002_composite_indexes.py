@@ -0,0 +1,13 @@
+"""Composite indexes for the per-goods listing and history lookups."""
+from migrations import create_index, drop_index
+
+VERSION = 2
+DESCRIPTION = "composite indexes on listings(goods_id, price) and price_history(goods_id, record_time)"
+
+def upgrade(conn):
+    create_index(conn, "listings", "ix_listings_goods_id_price", ["goods_id", "price"])
+    create_index(conn, "price_history", "ix_price_history_goods_id_record_time", ["goods_id", "record_time"])
+
+    # The single-column indexes are now redundant prefixes of the composite ones
+    drop_index(conn, "listings", "ix_listings_goods_id")
+    drop_index(conn, "price_history", "ix_price_history_goods_id")
@@ -0,0 +1,131 @@
+"""
+BIGINT listing ids and DECIMAL prices.
+
+listings.c2c_id / price_history.c2c_id move from VARCHAR(64) to BIGINT and every
+price column moves from FLOAT to DECIMAL(10, 2). The data is copied into shadow
+columns in keyset-ordered chunks (one short transaction each), then the shadow
+columns replace the originals in a single ALTER per table.
+
+That final ALTER drops columns (and for listings swaps the primary key), which
+rebuilds the whole table: the backfill stays online, the swap does not, and
+writes to the table wait for the rebuild. Run it in a maintenance window on
+large tables. Listings whose c2c_id is not numeric cannot be converted; they
+are counted and logged, then removed.
+"""
+import logging
+from sqlalchemy import text
+from migrations import column_type, has_column
+
+VERSION = 3
+DESCRIPTION = "BIGINT c2c_id and DECIMAL(10,2) prices"
+
+CHUNK_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+def _add_shadow_columns(conn, table: str, columns: dict):
+    for name, ddl in columns.items():
+        if not has_column(conn, table, name):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+def _backfill(conn, table: str, key: str, assignments: str):
+    """Run ``UPDATE table SET assignments`` over consecutive key ranges of CHUNK_SIZE rows."""
+    last = None
+    total = 0
+    while True:
+        # Upper bound of the next chunk, found by walking the primary key index
+        upper = conn.execute(text(
+            f"SELECT MAX({key}) FROM (SELECT {key} FROM {table} "
+            f"WHERE (:last IS NULL OR {key} > :last) ORDER BY {key} LIMIT :n) AS chunk"
+        ), {"last": last, "n": CHUNK_SIZE}).scalar()
+        if upper is None:
+            break
+
+        result = conn.execute(text(
+            f"UPDATE {table} SET {assignments} WHERE (:last IS NULL OR {key} > :last) AND {key} <= :upper"
+        ), {"last": last, "upper": upper})
+        conn.commit()
+
+        total += result.rowcount
+        last = upper
+
+    logger.info(f"{table}: 已转换 {total} 行")
+
+def _migrate_listings(conn):
+    if column_type(conn, "listings", "c2c_id").startswith("BIGINT"):
+        return
+
+    _add_shadow_columns(conn, "listings", {
+        "c2c_id_new": "BIGINT NULL",
+        "price_new": "DECIMAL(10,2) NULL",
+    })
+    _backfill(conn, "listings", "c2c_id",
+              "c2c_id_new = IF(c2c_id REGEXP '^[0-9]+$', CAST(c2c_id AS UNSIGNED), NULL), "
+              "price_new = ROUND(price, 2)")
+
+    # Ids that were never numeric cannot be verified upstream anyway
+    invalid = conn.execute(text("SELECT c2c_id FROM listings WHERE c2c_id_new IS NULL")).scalars().all()
+    if invalid:
+        sample = ", ".join(invalid[:20]) + (" ..." if len(invalid) > 20 else "")
+        logger.warning(f"listings: 删除 {len(invalid)} 个非数字 c2c_id 的挂单: {sample}")
+        conn.execute(text("DELETE FROM listings WHERE c2c_id_new IS NULL"))
+        conn.commit()
+
+    logger.info("listings: 替换列并重建表 (期间写入将等待)...")
+
+    conn.execute(text(
+        "ALTER TABLE listings "
+        "DROP PRIMARY KEY, "
+        "DROP INDEX ix_listings_goods_id_price, "
+        "DROP COLUMN c2c_id, "
+        "DROP COLUMN price, "
+        "CHANGE COLUMN c2c_id_new c2c_id BIGINT NOT NULL, "
+        "CHANGE COLUMN price_new price DECIMAL(10,2) NULL, "
+        "ADD PRIMARY KEY (c2c_id), "
+        "ADD INDEX ix_listings_goods_id_price (goods_id, price)"
+    ))
+
+def _migrate_price_history(conn):
+    if column_type(conn, "price_history", "c2c_id").startswith("BIGINT"):
+        return
+
+    _add_shadow_columns(conn, "price_history", {
+        "c2c_id_new": "BIGINT NULL",
+        "price_new": "DECIMAL(10,2) NULL",
+    })
+    _backfill(conn, "price_history", "id",
+              "c2c_id_new = IF(c2c_id REGEXP '^[0-9]+$', CAST(c2c_id AS UNSIGNED), NULL), "
+              "price_new = ROUND(price, 2)")
+
+    logger.info("price_history: 替换列并重建表 (期间写入将等待)...")
+    conn.execute(text(
+        "ALTER TABLE price_history "
+        "DROP COLUMN c2c_id, "
+        "DROP COLUMN price, "
+        "CHANGE COLUMN c2c_id_new c2c_id BIGINT NULL, "
+        "CHANGE COLUMN price_new price DECIMAL(10,2) NULL"
+    ))
+
+def _migrate_products(conn):
+    if column_type(conn, "products", "min_price").startswith("DECIMAL"):
+        return
+
+    price_columns = ["market_price", "min_price", "historical_low_price"]
+    _add_shadow_columns(conn, "products", {f"{c}_new": "DECIMAL(10,2) NULL" for c in price_columns})
+    _backfill(conn, "products", "goods_id", ", ".join(f"{c}_new = ROUND({c}, 2)" for c in price_columns))
+
+    logger.info("products: 替换列并重建表 (期间写入将等待)...")
+    conn.execute(text(
+        "ALTER TABLE products "
+        + ", ".join(f"DROP COLUMN {c}" for c in price_columns) + ", "
+        + ", ".join(f"CHANGE COLUMN {c}_new {c} DECIMAL(10,2) NULL" for c in price_columns)
+    ))
+
+def upgrade(conn):
+    if conn.dialect.name != "mysql":
+        # Other backends are only ever created fresh from the models
+        return
+
+    _migrate_listings(conn)
+    _migrate_price_history(conn)
+    _migrate_products(conn)
@@ -0,0 +1,8 @@
+"""Rate limit tier per API key."""
+from migrations import add_column
+
+VERSION = 4
+DESCRIPTION = "api_keys.tier"
+
+def upgrade(conn):
+    add_column(conn, "api_keys", "tier", "VARCHAR(20) NOT NULL DEFAULT 'standard'")
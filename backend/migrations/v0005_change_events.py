@@ -0,0 +1,10 @@
+"""Append-only change log behind GET /api/changes."""
+from migrations import has_table
+from models import ChangeEvent
+
+VERSION = 5
+DESCRIPTION = "change_events table"
+
+def upgrade(conn):
+    if not has_table(conn, ChangeEvent.__tablename__):
+        ChangeEvent.__table__.create(conn)
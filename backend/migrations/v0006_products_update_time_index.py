@@ -0,0 +1,8 @@
+"""Index on products.update_time: default /api/items sort and the MAX() behind the ETag watermark."""
+from migrations import create_index
+
+VERSION = 6
+DESCRIPTION = "index on products.update_time"
+
+def upgrade(conn):
+    create_index(conn, "products", "ix_products_update_time", ["update_time"])
@@ -0,0 +1,9 @@
+"""listings.verified_at: when the freshness scheduler last confirmed a listing upstream."""
+from migrations import add_column, create_index
+
+VERSION = 7
+DESCRIPTION = "listings.verified_at"
+
+def upgrade(conn):
+    add_column(conn, "listings", "verified_at", "DATETIME NULL")
+    create_index(conn, "listings", "ix_listings_verified_at", ["verified_at"])
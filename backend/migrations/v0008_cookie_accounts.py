@@ -0,0 +1,10 @@
+"""Cookie pool accounts (services/cookie_pool.py)."""
+from migrations import has_table
+from models import CookieAccount
+
+VERSION = 8
+DESCRIPTION = "cookie_accounts table"
+
+def upgrade(conn):
+    if not has_table(conn, CookieAccount.__tablename__):
+        CookieAccount.__table__.create(conn)
@@ -0,0 +1,10 @@
+"""Proxy pool servers (services/proxy_pool.py)."""
+from migrations import has_table
+from models import ProxyServer
+
+VERSION = 9
+DESCRIPTION = "proxy_servers table"
+
+def upgrade(conn):
+    if not has_table(conn, ProxyServer.__tablename__):
+        ProxyServer.__table__.create(conn)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
 from datetime import datetime
 
@@ -47,6 +47,12 @@ class ListingResponse(BaseModel):
     price: float
     update_time: datetime
 
+    @field_validator("c2c_id", mode="before")
+    @classmethod
+    def c2c_id_as_str(cls, v):
+        # Stored as BIGINT, but kept as a string in the API so JS clients never lose precision
+        return str(v)
+
     class Config:
         from_attributes = True
 
@@ -59,10 +65,47 @@ class PriceHistoryResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ItemBatchRequest(BaseModel):
+    goods_ids: List[int] = Field(..., min_length=1, max_length=200)
+    listings_limit: int = Field(5, ge=0, le=50) # Cheapest listings per item
+    include_history: bool = False
+    history_points: int = Field(100, ge=2, le=1000) # History is downsampled to about this many points per item
+    fields: Optional[List[str]] = None # Sparse fieldset for products (goods_id is always included)
+    listing_fields: Optional[List[str]] = None # Sparse fieldset for listings (c2c_id is always included)
+
+class ItemBatchEntry(ProductResponse):
+    listings: List[ListingResponse] = []
+    history: Optional[List[PriceHistoryResponse]] = None
+
+class ItemBatchResponse(BaseModel):
+    items: List[ItemBatchEntry]
+    missing: List[int] = [] # Requested ids that do not exist
+
 class ConfigUpdate(BaseModel):
     key: str
     value: str # JSON string
 
+class ChangeEventResponse(BaseModel):
+    event_type: str
+    goods_id: int
+    c2c_id: Optional[str] = None
+    old_price: Optional[float] = None
+    new_price: Optional[float] = None
+    created_at: datetime
+
+    @field_validator("c2c_id", mode="before")
+    @classmethod
+    def c2c_id_as_str(cls, v):
+        return str(v) if v is not None else None
+
+    class Config:
+        from_attributes = True
+
+class ChangeFeedResponse(BaseModel):
+    changes: List[ChangeEventResponse]
+    next_cursor: str # Pass back as ?cursor= to continue after the last change returned
+    has_more: bool
+
 class StatsResponse(BaseModel):
     total_items: int
     total_history: int
@@ -108,6 +151,7 @@ class APIKeyCreate(APIKeyBase):
 class APIKeyResponse(APIKeyBase):
     id: int
     prefix: str
+    tier: str = "standard"
     created_at: datetime
     last_used_at: Optional[datetime] = None
     is_active: bool
@@ -118,6 +162,61 @@ class APIKeyResponse(APIKeyBase):
 class APIKeyCreated(APIKeyResponse):
     key: str # Only returned once
 
+class APIKeyTierUpdate(BaseModel):
+    tier: str
+
+class CookieAccountCreate(BaseModel):
+    name: Optional[str] = None
+    cookie: str
+    enabled: bool = True
+
+class CookieAccountUpdate(BaseModel):
+    name: Optional[str] = None
+    cookie: Optional[str] = None
+    enabled: Optional[bool] = None
+
+class CookieAccountResponse(BaseModel):
+    id: int
+    name: Optional[str] = None
+    cookie: str # Masked
+    enabled: bool
+    status: str
+    quarantined_until: Optional[datetime] = None
+    strikes: int
+    last_error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    # Runtime state from the cookie pool
+    requests: int = 0
+    rate_limited: int = 0
+
+class ProxyServerCreate(BaseModel):
+    name: Optional[str] = None
+    url: str
+    enabled: bool = True
+    max_concurrency: int = 2
+
+class ProxyServerUpdate(BaseModel):
+    name: Optional[str] = None
+    url: Optional[str] = None
+    enabled: Optional[bool] = None
+    max_concurrency: Optional[int] = None
+
+class ProxyServerResponse(BaseModel):
+    id: int
+    name: Optional[str] = None
+    url: str # Without credentials
+    enabled: bool
+    max_concurrency: int
+    created_at: Optional[datetime] = None
+    # Runtime state from the proxy pool
+    healthy: Optional[bool] = None
+    latency_ms: Optional[float] = None
+    in_flight: int = 0
+    requests: int = 0
+    errors: int = 0
+    last_error: Optional[str] = None
+    accounts: List[int] = []
+
 class EmailConfig(BaseModel):
     smtp_server: Optional[str] = None
     smtp_port: Optional[int] = None
@@ -0,0 +1,52 @@
+"""
+Fast path for the hot list endpoints.
+
+Rows selected as plain Core tuples are zipped into dicts and encoded with orjson,
+skipping ORM object construction and Pydantic validation. The output matches the
+endpoint's response_model, which stays declared for the OpenAPI schema.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+import orjson
+from fastapi import Response
+
+class RowsJSONResponse(Response):
+    """Pass ``headers=response.headers`` to keep headers set on the injected Response (ETag etc.)."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        # Naive datetimes come out as ISO 8601 without offset, the same as Pydantic
+        return orjson.dumps(content)
+
+def pick_columns(columns: Sequence, fields: Union[str, Iterable[str], None], required: Iterable[str] = ()) -> List:
+    """
+    Narrow ``columns`` to a sparse fieldset, keeping declaration order.
+
+    :param fields: Comma separated string or list of column names; empty means every column.
+    :param required: Names that are always included (the row's identity).
+    :raises ValueError: On unknown names.
+    """
+    if not fields:
+        return list(columns)
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    wanted = {name.strip() for name in fields if name.strip()}
+    available = [column.key for column in columns]
+    unknown = wanted.difference(available)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}. Available: {', '.join(available)}")
+    wanted.update(required)
+    return [column for column in columns if column.key in wanted]
+
+def rows_as_dicts(columns: Sequence, rows, converters: Optional[Dict[str, Callable]] = None) -> List[dict]:
+    """Turn result tuples of ``select(*columns)`` into dicts keyed by column name."""
+    keys = [column.key for column in columns]
+    items = [dict(zip(keys, row)) for row in rows]
+    for key, convert in (converters or {}).items():
+        if key not in keys:
+            continue
+        for item in items:
+            if item[key] is not None:
+                item[key] = convert(item[key])
+    return items
@@ -0,0 +1,122 @@
+"""
+Change feed.
+
+The scraper, the validity checker and the recalc endpoints append a ChangeEvent
+row for every change a catalog mirror cares about, in the same transaction as
+the change itself. Consumers page through them with an opaque cursor, and once
+the transaction commits the same changes are pushed to ``price_hub`` for live
+subscribers (/ws/prices).
+"""
+import base64
+import threading
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from events import EventHub
+from models import ChangeEvent, Product
+
+CURSOR_PREFIX = "v1:"
+
+# Ids are assigned at insert but become visible at commit, so a lower id can appear
+# after a higher one. The feed stops short of the lowest id still uncommitted in this
+# process (see lowest_in_flight); events younger than this are held back as well, which
+# covers the moment between an insert and its registration and writers in other processes.
+SETTLE_SECONDS = 2
+
+# Session.info keys holding the changes of the current transaction until it ends:
+# payloads to publish on commit, rows not flushed yet, and the ids of flushed ones
+PENDING_KEY = "pending_changes"
+ROWS_KEY = "pending_change_rows"
+IDS_KEY = "pending_change_ids"
+
+_in_flight = set() # ids of change events inserted by transactions of this process that are still open
+_in_flight_lock = threading.Lock()
+
+price_hub = EventHub(history_size=256, queue_size=256)
+
+def record_change(db: Session, event_type: str, goods_id: int, c2c_id: Optional[int] = None,
+                  old_price: Optional[float] = None, new_price: Optional[float] = None):
+    created_at = datetime.now()
+    row = ChangeEvent(
+        event_type=event_type, goods_id=goods_id, c2c_id=c2c_id,
+        old_price=old_price, new_price=new_price, created_at=created_at
+    )
+    db.add(row)
+    db.info.setdefault(ROWS_KEY, []).append(row)
+    db.info.setdefault(PENDING_KEY, []).append({
+        "type": event_type,
+        "goods_id": goods_id,
+        "c2c_id": str(c2c_id) if c2c_id is not None else None,
+        "old_price": old_price,
+        "new_price": new_price,
+        "created_at": created_at.isoformat(),
+    })
+
+def lowest_in_flight() -> Optional[int]:
+    """Lowest change event id inserted but not yet committed or rolled back in this process."""
+    with _in_flight_lock:
+        return min(_in_flight, default=None)
+
+@event.listens_for(Session, "after_flush_postexec")
+def _register_flushed_changes(session, flush_context):
+    rows = session.info.get(ROWS_KEY)
+    if not rows:
+        return
+    ids = [row.id for row in rows if row.id is not None]
+    session.info[ROWS_KEY] = [row for row in rows if row.id is None]
+    session.info.setdefault(IDS_KEY, []).extend(ids)
+    with _in_flight_lock:
+        _in_flight.update(ids)
+
+def _release_changes(session):
+    # Ids were kept at flush: rows are expired once the commit is done
+    session.info.pop(ROWS_KEY, None)
+    ids = session.info.pop(IDS_KEY, ())
+    with _in_flight_lock:
+        _in_flight.difference_update(ids)
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed_changes(session):
+    _release_changes(session)
+    for change in session.info.pop(PENDING_KEY, []):
+        price_hub.publish(change)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_changes(session):
+    _release_changes(session)
+    session.info.pop(PENDING_KEY, None)
+
+@event.listens_for(Session, "after_transaction_end")
+def _release_closed_changes(session, transaction):
+    # A session closed without commit or rollback ends its transaction here
+    if transaction.parent is None:
+        _release_changes(session)
+
+def record_product_state(db: Session, product: Product, old_price: Optional[float], was_out_of_stock: bool):
+    """Record min price and stock transitions of ``product`` against its previous state."""
+    record_state_change(db, product.goods_id, old_price, product.min_price, was_out_of_stock, product.is_out_of_stock)
+
+def record_state_change(db: Session, goods_id: int, old_price: Optional[float], new_price: Optional[float],
+                        was_out_of_stock: bool, is_out_of_stock: bool):
+    if bool(is_out_of_stock) != bool(was_out_of_stock):
+        record_change(db, "out_of_stock" if is_out_of_stock else "in_stock", goods_id)
+    if new_price != old_price:
+        record_change(db, "min_price_changed", goods_id, old_price=old_price, new_price=new_price)
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{CURSOR_PREFIX}{last_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """Last seen event id encoded in ``cursor``; 0 (start of the feed) when empty."""
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        if not raw.startswith(CURSOR_PREFIX):
+            raise ValueError
+        return int(raw[len(CURSOR_PREFIX):])
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
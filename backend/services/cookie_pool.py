@@ -0,0 +1,199 @@
+"""
+Pool of Bilibili accounts (cookies) for upstream calls.
+
+Upstream rate limits are per account, so every account gets its own
+``RateBudget`` and each call goes out on the account whose next slot is free
+soonest. Throughput grows with the number of healthy accounts.
+
+An account answered with 412/429 is quarantined, for longer on every
+consecutive hit. Once its quarantine ends, the next call that picks it is a
+probe: on success the account is healthy again, otherwise it goes back into
+quarantine.
+
+Accounts live in the cookie_accounts table. The legacy ``user_cookie`` setting
+is included as an implicit account, so a single-cookie setup works unchanged.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import requests
+
+from config_store import system_config
+from database import SessionLocal
+from models import CookieAccount
+from services.pacing import RateBudget
+
+logger = logging.getLogger(__name__)
+
+# Per-account pace: what the single cookie used to be allowed (1.5-3s between calls)
+ACCOUNT_INTERVAL = 1.5
+ACCOUNT_JITTER = 1.5
+
+QUARANTINE_BASE_SECONDS = 60
+QUARANTINE_MAX_SECONDS = 30 * 60
+RATE_LIMITED = (412, 429)
+RELOAD_SECONDS = 30
+
+LEGACY_ACCOUNT_ID = 0 # The user_cookie setting
+
+class NoHealthyAccount(requests.exceptions.RequestException):
+    """Every account is quarantined (or none is configured)."""
+
+class Account:
+    def __init__(self, account_id: int, name: str, cookie: str):
+        self.id = account_id
+        self.name = name
+        self.cookie = cookie
+        self.budget = RateBudget(ACCOUNT_INTERVAL, ACCOUNT_JITTER)
+        self.status = "healthy" # healthy, quarantined, probing
+        self.quarantined_until = 0.0 # time.monotonic()
+        self.strikes = 0
+        self.last_error: Optional[str] = None
+        self.requests = 0
+        self.rate_limited = 0
+
+    def available(self, now: float) -> bool:
+        return self.status == "healthy" or (self.status == "quarantined" and now >= self.quarantined_until)
+
+class CookiePool:
+    def __init__(self):
+        self._accounts: Dict[int, Account] = {}
+        self._order: List[int] = []
+        self._cursor = 0
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def reload(self):
+        """Pick up added, changed and removed accounts; runtime state of unchanged ones is kept."""
+        db = SessionLocal()
+        try:
+            rows = db.query(CookieAccount).filter(CookieAccount.enabled == True).order_by(CookieAccount.id).all()
+        finally:
+            db.close()
+
+        wanted = {row.id: row for row in rows}
+        legacy_cookie = system_config.get("user_cookie", "")
+        with self._lock:
+            accounts = {}
+            for account_id, row in wanted.items():
+                account = self._accounts.get(account_id)
+                if account is None or account.cookie != row.cookie:
+                    account = Account(account_id, row.name or f"#{account_id}", row.cookie)
+                    if row.status == "quarantined" and row.quarantined_until and row.quarantined_until > datetime.now():
+                        account.status = "quarantined"
+                        account.strikes = row.strikes
+                        account.quarantined_until = time.monotonic() + (row.quarantined_until - datetime.now()).total_seconds()
+                accounts[account_id] = account
+            if legacy_cookie and legacy_cookie not in {row.cookie for row in rows}:
+                account = self._accounts.get(LEGACY_ACCOUNT_ID)
+                if account is None or account.cookie != legacy_cookie:
+                    account = Account(LEGACY_ACCOUNT_ID, "user_cookie", legacy_cookie)
+                accounts[LEGACY_ACCOUNT_ID] = account
+            self._accounts = accounts
+            self._order = sorted(accounts)
+            self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= RELOAD_SECONDS:
+            self.reload()
+            return
+        legacy = self._accounts.get(LEGACY_ACCOUNT_ID)
+        legacy_cookie = system_config.get("user_cookie", "")
+        if (legacy.cookie if legacy else "") != legacy_cookie:
+            self.reload()
+
+    def has_accounts(self) -> bool:
+        self._ensure_loaded()
+        return bool(self._accounts)
+
+    def available(self) -> bool:
+        """Whether a call could go out now without waiting for a quarantine to end."""
+        self._ensure_loaded()
+        now = time.monotonic()
+        return any(account.available(now) for account in self._accounts.values())
+
+    def acquire(self) -> Account:
+        """Pick the account whose next slot is free soonest, reserve that slot and wait for it."""
+        self._ensure_loaded()
+        with self._lock:
+            now = time.monotonic()
+            candidates = [self._accounts[i] for i in self._order[self._cursor:] + self._order[:self._cursor]]
+            candidates = [account for account in candidates if account.available(now)]
+            if not candidates:
+                raise NoHealthyAccount("没有可用的 Cookie 账号" if self._accounts else "未配置 Cookie")
+
+            # Least loaded first; ties go round-robin from the cursor
+            account = min(candidates, key=lambda a: a.budget.next_free)
+            self._cursor = (self._order.index(account.id) + 1) % len(self._order)
+            if account.status == "quarantined":
+                account.status = "probing" # One probe at a time
+            account.requests += 1
+            delay = account.budget.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return account
+
+    def report(self, account: Account, status_code: Optional[int]):
+        """Feed back the outcome of a call made with ``account`` (None: no response, e.g. a network error)."""
+        seconds = 0
+        with self._lock:
+            if status_code in RATE_LIMITED:
+                account.rate_limited += 1
+                account.strikes += 1
+                seconds = min(QUARANTINE_BASE_SECONDS * 2 ** (account.strikes - 1), QUARANTINE_MAX_SECONDS)
+                account.status = "quarantined"
+                account.quarantined_until = time.monotonic() + seconds
+                account.last_error = f"HTTP {status_code}"
+                logger.warning(f"Cookie 账号 {account.name} 被限流 (HTTP {status_code})，隔离 {seconds} 秒")
+                changed = True
+            elif status_code is None:
+                # Not the account's fault; let a probe be retried right away
+                changed = False
+                if account.status == "probing":
+                    account.status = "quarantined"
+            else:
+                changed = account.status != "healthy" or account.strikes != 0
+                if account.status == "probing":
+                    logger.info(f"Cookie 账号 {account.name} 已恢复")
+                account.status = "healthy"
+                account.strikes = 0
+        if changed:
+            self._persist(account, seconds)
+
+    def _persist(self, account: Account, quarantine_seconds: float):
+        if account.id == LEGACY_ACCOUNT_ID:
+            return
+        db = SessionLocal()
+        try:
+            row = db.get(CookieAccount, account.id)
+            if row is None:
+                return
+            row.status = "quarantined" if quarantine_seconds else "healthy"
+            row.quarantined_until = datetime.now() + timedelta(seconds=quarantine_seconds) if quarantine_seconds else None
+            row.strikes = account.strikes
+            row.last_error = account.last_error
+            db.commit()
+        except Exception as e:
+            logger.error(f"保存 Cookie 账号状态失败: {e}")
+        finally:
+            db.close()
+
+    def status(self) -> Dict[int, dict]:
+        """Runtime state of every pooled account, by account id."""
+        self._ensure_loaded()
+        now = time.monotonic()
+        with self._lock:
+            return {
+                account.id: {
+                    "status": account.status,
+                    "quarantine_remaining": max(0, round(account.quarantined_until - now)) if account.status != "healthy" else 0,
+                    "requests": account.requests,
+                    "rate_limited": account.rate_limited,
+                }
+                for account in self._accounts.values()
+            }
+
+cookie_pool = CookiePool()
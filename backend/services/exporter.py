@@ -0,0 +1,220 @@
+"""
+Streaming bulk export.
+
+Rows are read through a server-side cursor in batches and each batch is encoded
+and (optionally) compressed before the next one is fetched, so memory stays flat
+no matter how many rows the export covers.
+"""
+import csv
+import io
+import json
+import tempfile
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+from sqlalchemy.sql import Select
+
+from database import SessionLocal
+
+BATCH_SIZE = 2000
+XLSX_MAX_ROWS = 1048575 # Excel sheet limit, minus the header row
+
+# format -> (media type, file extension)
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+# compression -> (media type, file extension)
+COMPRESSIONS = {
+    "none": (None, None),
+    "gzip": ("application/gzip", "gz"),
+    "zstd": ("application/zstd", "zst"),
+}
+
+# Formats that are compressed internally rather than wrapped in a compressed stream
+SELF_COMPRESSED = {"parquet", "xlsx"}
+
+def validate_options(fmt: str, compression: str):
+    """Reject unknown or unavailable options before the response starts streaming."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of: {', '.join(FORMATS)}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression '{compression}', expected one of: {', '.join(COMPRESSIONS)}")
+    if fmt == "xlsx" and compression != "none":
+        raise ValueError("xlsx files are already compressed, use compression=none")
+    if fmt == "parquet":
+        try:
+            import pyarrow # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export requires pyarrow (pip install pyarrow)")
+    elif compression == "zstd":
+        try:
+            import zstandard # noqa: F401
+        except ImportError:
+            raise ValueError("zstd compression requires zstandard (pip install zstandard)")
+
+def export_metadata(name: str, fmt: str, compression: str) -> Tuple[str, str]:
+    """Media type and download filename for an export."""
+    media_type, extension = FORMATS[fmt]
+    filename = f"{name}-{datetime.now():%Y%m%d-%H%M%S}.{extension}"
+    if fmt not in SELF_COMPRESSED and compression != "none":
+        media_type, suffix = COMPRESSIONS[compression]
+        filename += f".{suffix}"
+    return media_type, filename
+
+def iter_batches(statement: Select, batch_size: int = BATCH_SIZE) -> Iterator[List[tuple]]:
+    """Run ``statement`` on its own session and yield rows ``batch_size`` at a time from a server-side cursor."""
+    db = SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+    finally:
+        db.close()
+
+def stream_export(columns: Sequence, batches: Iterable[List[tuple]], fmt: str, compression: str = "none") -> Iterator[bytes]:
+    """
+    Encode row batches as ``fmt`` and yield the output incrementally.
+
+    :param columns: The selected SQLAlchemy columns, used for the header and Parquet schema.
+    """
+    names = [column.key for column in columns]
+    if fmt == "csv":
+        chunks = _csv_chunks(names, batches)
+    elif fmt == "ndjson":
+        chunks = _ndjson_chunks(names, batches)
+    elif fmt == "parquet":
+        return _parquet_chunks(columns, batches, compression)
+    else:
+        return _xlsx_chunks(names, batches)
+    return _compress(chunks, compression)
+
+def _csv_chunks(names: List[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header only: the query returned nothing
+        yield buffer.getvalue().encode("utf-8")
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _ndjson_chunks(names: List[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    for batch in batches:
+        lines = [json.dumps(dict(zip(names, row)), ensure_ascii=False, default=_json_default) for row in batch]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+def _compress(chunks: Iterator[bytes], compression: str) -> Iterator[bytes]:
+    if compression == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31 writes a gzip header
+    elif compression == "zstd":
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        yield from chunks
+        return
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+class _Drain(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _arrow_type(column):
+    import pyarrow as pa
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return pa.string()
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    if python_type is datetime:
+        return pa.timestamp("us")
+    return pa.string()
+
+def _parquet_chunks(columns: Sequence, batches: Iterable[List[tuple]], compression: str) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(column.key, _arrow_type(column)) for column in columns])
+    sink = _Drain()
+    # One row group per batch; the footer is written on close
+    writer = pq.ParquetWriter(sink, schema, compression=compression if compression != "none" else "none")
+    try:
+        for batch in batches:
+            arrays = [list(values) for values in zip(*batch)] if batch else [[] for _ in columns]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(arrays, schema)], schema=schema
+            ))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def _xlsx_chunks(names: List[str], batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    from openpyxl import Workbook
+
+    # write_only keeps rows on disk as they are appended; the zip itself can only be produced at the end
+    workbook = Workbook(write_only=True)
+    sheet = None
+    rows_in_sheet = XLSX_MAX_ROWS
+    for batch in batches:
+        for row in batch:
+            if rows_in_sheet >= XLSX_MAX_ROWS:
+                sheet = workbook.create_sheet()
+                sheet.append(names)
+                rows_in_sheet = 0
+            sheet.append(row)
+            rows_in_sheet += 1
+    if sheet is None:
+        workbook.create_sheet().append(names)
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as output:
+        workbook.save(output)
+        output.seek(0)
+        while True:
+            data = output.read(64 * 1024)
+            if not data:
+                break
+            yield data
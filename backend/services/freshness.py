@@ -0,0 +1,252 @@
+"""
+Listing freshness scheduler.
+
+One background worker verifies listings upstream for every goods, instead of
+each user re-checking their own favorites. Work comes from a single priority
+queue:
+
+- user requests for a goods (e.g. "check all favorites") go first. A goods
+  that is already queued is not queued again: later requesters share the
+  pending check and can only raise its priority.
+- in the background, the cheapest listings of every goods are re-verified,
+  most overdue first: staleness weighted by how many users favorited the goods,
+  divided by the listing's price rank.
+
+Every upstream call is paced by ``cookie_pool``, shared with the crawler.
+Background re-verification is off unless ``freshness_enabled`` is set, and
+pauses with the crawl scheduler or while no cookie is configured; user
+requests are always served.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func, or_, select
+
+from config_store import system_config
+from database import SessionLocal
+from models import Favorite, Listing, Product
+from services.cookie_pool import cookie_pool
+from services.scraper import ScraperService
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_BACKGROUND = 0
+PRIORITY_USER = 1
+
+CANDIDATE_RANKS = 3 # Only the cheapest listings of a goods decide its min_price
+REVERIFY_SECONDS = 30 * 60 # Background checks skip listings confirmed more recently
+USER_FRESH_SECONDS = 5 * 60 # User checks (here and in services/validity.py) trust listings confirmed more recently
+QUEUE_LIMIT = 2000
+REFILL_SECONDS = 5 * 60
+STOP_TIMEOUT = 10 # Shutdown waits this long for an in-flight check to finish
+
+class GoodsCheck:
+    """A pending check of one goods, shared by everyone who requested it."""
+
+    def __init__(self, goods_id: int, priority: int):
+        self.goods_id = goods_id
+        self.priority = priority
+        self.result: Optional[dict] = None
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """The check_listings_validity result, or None if it is still pending after ``timeout``."""
+        self._done.wait(timeout)
+        return self.result
+
+class FreshnessScheduler:
+    def __init__(self):
+        # (-priority, -score, seq, goods_id, c2c_id); c2c_id is None for a whole-goods check
+        self._heap = []
+        self._pending: Dict[int, GoodsCheck] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._refilled_at = None
+        self.stats = {"goods_checked": 0, "listings_checked": 0, "listings_removed": 0}
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="freshness", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(STOP_TIMEOUT)
+            if thread.is_alive():
+                logger.warning(f"挂单校验线程 {STOP_TIMEOUT} 秒内未结束，放弃等待")
+
+    def request(self, goods_ids: Iterable[int], priority: int = PRIORITY_USER) -> List[GoodsCheck]:
+        """Queue a check of each goods (or join the one already queued) and return the shared handles."""
+        checks = []
+        with self._cond:
+            for goods_id in goods_ids:
+                check = self._pending.get(goods_id)
+                if check is None:
+                    check = self._pending[goods_id] = GoodsCheck(goods_id, priority)
+                    self._push(priority, 0, goods_id, None)
+                elif priority > check.priority:
+                    # The old entry is skipped when it comes up
+                    check.priority = priority
+                    self._push(priority, 0, goods_id, None)
+                checks.append(check)
+            self._cond.notify()
+        return checks
+
+    def status(self) -> dict:
+        with self._cond:
+            background = sum(1 for entry in self._heap if entry[4] is not None)
+            return {
+                "running": self._thread is not None,
+                "pending_goods": len(self._pending),
+                "queued_listings": background,
+                **self.stats,
+            }
+
+    def _push(self, priority: int, score: float, goods_id: int, c2c_id: Optional[int]):
+        heapq.heappush(self._heap, (-priority, -score, next(self._seq), goods_id, c2c_id))
+
+    def _take(self):
+        with self._cond:
+            while self._heap:
+                entry = heapq.heappop(self._heap)
+                priority, goods_id, c2c_id = -entry[0], entry[3], entry[4]
+                if c2c_id is None:
+                    check = self._pending.get(goods_id)
+                    if check is None or check.priority != priority:
+                        continue # Superseded by a higher priority entry
+                return entry
+        return None
+
+    def _run(self):
+        while not self._stopping:
+            entry = self._take()
+            if entry is None:
+                if self._refilled_at is None or time.monotonic() - self._refilled_at >= REFILL_SECONDS:
+                    self._refill()
+                    continue
+                with self._cond:
+                    if not self._heap and not self._stopping:
+                        self._cond.wait(max(0.0, REFILL_SECONDS - (time.monotonic() - self._refilled_at)))
+                continue
+
+            _, _, _, goods_id, c2c_id = entry
+            try:
+                if c2c_id is None:
+                    self._check_goods(goods_id)
+                else:
+                    self._verify_listing(c2c_id)
+            except Exception as e:
+                logger.error(f"挂单校验失败 (商品 {goods_id}): {e}")
+
+    def _check_goods(self, goods_id: int):
+        result = {"checked": 0, "removed": 0}
+        db = SessionLocal()
+        try:
+            result = ScraperService(db).check_listings_validity(goods_id, fresh_seconds=USER_FRESH_SECONDS)
+            self.stats["goods_checked"] += 1
+            self.stats["listings_checked"] += result["checked"]
+            self.stats["listings_removed"] += result["removed"]
+        finally:
+            db.close()
+            with self._cond:
+                check = self._pending.pop(goods_id, None)
+            if check is not None:
+                check.result = result
+                check._done.set()
+
+    def _verify_listing(self, c2c_id: int):
+        db = SessionLocal()
+        try:
+            verdict = ScraperService(db).verify_listing(c2c_id)
+            self.stats["listings_checked"] += 1
+            if verdict is False:
+                self.stats["listings_removed"] += 1
+        finally:
+            db.close()
+
+    def _refill(self):
+        """Replace the background part of the queue with the currently most overdue listings."""
+        self._refilled_at = time.monotonic()
+        candidates = []
+        if self._background_enabled():
+            db = SessionLocal()
+            try:
+                candidates = stale_listings(db)
+            except Exception as e:
+                logger.error(f"加载待校验挂单失败: {e}")
+            finally:
+                db.close()
+
+        with self._cond:
+            self._heap = [entry for entry in self._heap if entry[4] is None]
+            for score, goods_id, c2c_id in candidates:
+                self._heap.append((-PRIORITY_BACKGROUND, -score, next(self._seq), goods_id, c2c_id))
+            heapq.heapify(self._heap)
+        if candidates:
+            logger.info(f"已加载 {len(candidates)} 个待校验挂单")
+
+    @staticmethod
+    def _background_enabled() -> bool:
+        if not system_config.get_bool("freshness_enabled", False) or not system_config.get_bool("scheduler_enabled", True):
+            return False
+        try:
+            # Without a cookie every check would just fail with NoHealthyAccount
+            return cookie_pool.has_accounts()
+        except Exception as e:
+            logger.error(f"加载 Cookie 账号失败: {e}")
+            return False
+
+def stale_listings(db, limit: int = QUEUE_LIMIT) -> List[tuple]:
+    """(score, goods_id, c2c_id) of the most overdue among the cheapest listings of every goods, highest score first."""
+    now = datetime.now()
+    # Price of each goods' CANDIDATE_RANKS-th cheapest listing, read off the (goods_id, price) index;
+    # NULL when it has fewer listings. Only listings up to it are read, not the whole table
+    cutoff = (
+        select(Listing.price).where(Listing.goods_id == Product.goods_id)
+        .order_by(Listing.price).offset(CANDIDATE_RANKS - 1).limit(1)
+        .correlate(Product).scalar_subquery()
+    )
+    goods = select(Product.goods_id, cutoff.label("cutoff")).subquery()
+    favorites = select(Favorite.goods_id, func.count().label("favorites")).group_by(Favorite.goods_id).subquery()
+
+    rows = db.execute(
+        select(
+            Listing.c2c_id, Listing.goods_id, Listing.price,
+            func.coalesce(Listing.verified_at, Listing.update_time), func.coalesce(favorites.c.favorites, 0),
+        )
+        .join(goods, goods.c.goods_id == Listing.goods_id)
+        .outerjoin(favorites, favorites.c.goods_id == Listing.goods_id)
+        .where(or_(goods.c.cutoff.is_(None), Listing.price <= goods.c.cutoff))
+    ).all()
+
+    stale_before = now - timedelta(seconds=REVERIFY_SECONDS)
+    scored = []
+    rows.sort(key=lambda row: (row[1], row[2], row[0]))
+    for _, group in itertools.groupby(rows, key=lambda row: row[1]):
+        for price_rank, (c2c_id, goods_id, _, seen_at, favorite_count) in enumerate(group, start=1):
+            if price_rank > CANDIDATE_RANKS:
+                break # Ties at the cutoff price
+            if seen_at is not None and seen_at >= stale_before:
+                continue
+            age_hours = (now - seen_at).total_seconds() / 3600 if seen_at else 24 * 7
+            scored.append((age_hours * (1 + favorite_count) / price_rank, goods_id, c2c_id))
+    return heapq.nlargest(limit, scored)
+
+freshness_scheduler = FreshnessScheduler()
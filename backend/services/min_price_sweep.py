@@ -0,0 +1,261 @@
+"""
+Price-ascending min-price discovery sweep.
+
+The regular crawl reads listings newest first, so a product's minimum is only
+right if the crawl went deep enough to see its cheapest listing. This sweep
+reads each category cheapest first instead (``sortType: PRICE_ASC``), shard by
+shard from the cheapest price range up, so the first listing seen of a goods
+is its current cheapest:
+
+- that listing is stored (process_item) and marked verified, and stored
+  listings of the goods cheaper than it are gone upstream and are removed,
+  which corrects minimums left stale by sold or withdrawn listings.
+- a shard is left as soon as a page holds nothing but goods already confirmed
+  earlier in the sweep; beyond that point the sweep mostly re-reads pricier
+  copies, which the regular crawl covers.
+
+Removal needs every cheaper listing to have been read, so it only reaches up
+to the price the sweep has covered without a gap; after a shard is left early,
+later shards remove nothing above that price. A shard whose pages leave its
+price range (upstream ignored the filter) is left early the same way. Only rows written before the
+sweep fetched its first page are removed: the covered range was read page by
+page since then, so a cheaper listing stored meanwhile by another crawl may be
+newer than the page that covered its price.
+
+Categories are swept concurrently, each on its own session. The sweep runs on
+its own schedule next to the time-ordered crawl and shares the upstream pacing
+with it through ``cookie_pool``.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from sqlalchemy import delete, or_, select
+
+from config_store import system_config
+from database import SessionLocal
+from models import Listing, Product
+from services.changes import record_change
+from services.cookie_pool import NoHealthyAccount, cookie_pool
+from services.proxy_pool import ProxyUnavailable
+from services.scraper import CATEGORY_MAP, ScraperService, listing_goods_id, parse_price
+from services.sharded_crawl import Shard, in_shard, plan_shards, shard_filter
+from services.upstream import transport
+from services.verdicts import verdict_cache
+from state import TaskManager
+
+logger = logging.getLogger(__name__)
+
+SORT_TYPE = "PRICE_ASC"
+SHARD_COUNT = 4
+MAX_PAGES_PER_SHARD = 20 # Safety cap when pages keep bringing up unconfirmed goods
+MAX_RETRIES = 3 # Rate-limited page requests retried on another account
+INTERVAL_MINUTES = 30
+
+class CategorySweep:
+    def __init__(self, category: str, shards: List[Shard], max_pages_per_shard: int):
+        self.category = category
+        self.shards = shards
+        self.max_pages_per_shard = max_pages_per_shard
+        # goods_id -> (c2c_id, price) of its cheapest listing seen in this sweep
+        self.confirmed: Dict[int, Tuple[int, float]] = {}
+        self.stats = {"pages": 0, "confirmed": 0, "corrected": 0, "removed": 0}
+        # Every listing below ``covered`` has been read, as long as no shard was left early
+        self.covered = 0.0
+        self.contiguous = True
+        # When the first page of the covered range was fetched; rows written later are spared
+        self.started_at: Optional[datetime] = None
+
+    def run(self, stopping: threading.Event):
+        db = SessionLocal()
+        try:
+            # Only the sweep's own signal: the global one stays set after the regular crawl is stopped
+            service = ScraperService(db, should_stop=stopping.is_set)
+            service.current_category_id = self.category
+            service.payload_template = {**service.payload_template, "sortType": SORT_TYPE}
+            self.started_at = datetime.now()
+            for shard in self.shards:
+                if stopping.is_set():
+                    break
+                self._sweep_shard(service, shard, stopping)
+        finally:
+            db.close()
+        return self.stats
+
+    def _sweep_shard(self, service: ScraperService, shard: Shard, stopping: threading.Event):
+        next_id = None
+        for _ in range(self.max_pages_per_shard):
+            if stopping.is_set():
+                return
+            data = self._fetch(service.list_payload(self.category, [shard_filter(shard)], next_id))
+            items = data.get("data") or []
+            self.stats["pages"] += 1
+
+            seen_new = False
+            seen_any = False
+            for item in items:
+                price = parse_price(item["showPrice"])
+                if not in_shard(shard, price):
+                    # Upstream ignored the range (see sharded_crawl); the rest is not this shard's
+                    logger.error(f"最低价扫描分片 {shard_filter(shard)} 返回了区间外的价格 (¥ {price:,.2f})，停止该分片")
+                    self.contiguous = False
+                    return
+                if self.contiguous:
+                    self.covered = max(self.covered, price)
+                goods_id = listing_goods_id(item)
+                if goods_id is None:
+                    continue
+                seen_any = True
+                if goods_id in self.confirmed:
+                    continue # A pricier copy of a goods already confirmed
+                seen_new = True
+                self._confirm(service, goods_id, item, price, min(price, self.covered))
+
+            next_id = data.get("nextId")
+            if not next_id or not items:
+                if self.contiguous and shard[1]:
+                    self.covered = max(self.covered, shard[1] / 100)
+                return
+            if seen_any and not seen_new:
+                self.contiguous = False
+                return
+        self.contiguous = False # Page cap reached
+
+    @staticmethod
+    def _fetch(payload: dict) -> dict:
+        for attempt in range(MAX_RETRIES):
+            try:
+                response = transport.list_page(payload)
+                response.raise_for_status()
+                return response.json().get("data") or {}
+            except requests.exceptions.HTTPError as e:
+                # The pool quarantined the account; retry on another one while any is left
+                if e.response.status_code not in (412, 429) or attempt == MAX_RETRIES - 1 or not cookie_pool.available():
+                    raise
+
+    def _confirm(self, service: ScraperService, goods_id: int, item: dict, price: float, remove_below: float):
+        """
+        Record ``item`` as the cheapest listing of ``goods_id`` and drop stored ones below ``remove_below``,
+        which are gone, unless they were written after the sweep started reading the covered range.
+        """
+        c2c_id = int(item["c2cItemsId"])
+        self.confirmed[goods_id] = (c2c_id, price)
+        self.stats["confirmed"] += 1
+
+        db = service.db
+        committed = False
+        try:
+            # Product row first, as process_item does, so concurrent crawls cannot deadlock against this
+            db.execute(select(Product.goods_id).where(Product.goods_id == goods_id).with_for_update())
+            stale = db.execute(
+                select(Listing.c2c_id, Listing.price).where(
+                    Listing.goods_id == goods_id, Listing.price < remove_below, Listing.c2c_id != c2c_id,
+                    or_(Listing.update_time.is_(None), Listing.update_time < self.started_at),
+                )
+            ).all()
+            if stale:
+                db.execute(delete(Listing).where(Listing.c2c_id.in_([row.c2c_id for row in stale])))
+                for row in stale:
+                    record_change(db, "listing_removed", goods_id, c2c_id=row.c2c_id, old_price=row.price)
+
+            # Upserts the listing and recomputes the product from its listings, then commits
+            if service.process_item(item):
+                service.mark_verified([c2c_id])
+                db.commit()
+                committed = True
+        finally:
+            if not committed:
+                db.rollback() # Ends the transaction either way, releasing the product lock
+        if not committed:
+            return
+
+        verdict_cache.put(c2c_id, True)
+        for row in stale:
+            verdict_cache.put(row.c2c_id, False)
+        if stale:
+            self.stats["removed"] += len(stale)
+            self.stats["corrected"] += 1
+            logger.info(f"商品 {goods_id} 最低价校正: 移除 {len(stale)} 个已失效的更低价挂单，当前最低 ¥ {price:,.2f}")
+
+class MinPriceSweep:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.last_run: Optional[dict] = None
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self, task_id: Optional[str] = None) -> Optional[dict]:
+        """One sweep of the configured categories. Returns its stats, or None if a sweep is already running."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        self._stopping.clear()
+        started = time.monotonic()
+        try:
+            cookie_pool.reload()
+            if not cookie_pool.has_accounts():
+                logger.error("❌ 未检测到有效的 Cookie！请先在设置页面配置 Bilibili Cookie。")
+                return None
+
+            filter_settings = system_config.get_json("filter_settings", {})
+            category = filter_settings.get("category") or "2312"
+            categories = list(CATEGORY_MAP) if category == "ALL" else [category]
+            shard_count = system_config.get_int("min_sweep_shard_count", SHARD_COUNT)
+            max_pages = system_config.get_int("min_sweep_max_pages", MAX_PAGES_PER_SHARD)
+
+            db = SessionLocal()
+            try:
+                # Contiguous ranges from 0 up: removing cheaper listings relies on having seen every price below
+                sweeps = [CategorySweep(c, plan_shards(db, c, shard_count), max_pages) for c in categories]
+            finally:
+                db.close()
+            if task_id:
+                TaskManager.update_task(task_id, total=len(sweeps), message=f"{len(sweeps)} 个分类")
+
+            logger.info(f"开始最低价扫描 ({len(sweeps)} 个分类)...")
+            stats = {"pages": 0, "confirmed": 0, "corrected": 0, "removed": 0, "failed": 0}
+            done = 0
+            with ThreadPoolExecutor(max_workers=len(sweeps), thread_name_prefix="min-sweep") as executor:
+                futures = {executor.submit(sweep.run, self._stopping): sweep for sweep in sweeps}
+                for future, sweep in futures.items():
+                    try:
+                        future.result()
+                    except (NoHealthyAccount, ProxyUnavailable, requests.exceptions.RequestException) as e:
+                        stats["failed"] += 1
+                        logger.error(f"分类 {CATEGORY_MAP.get(sweep.category, sweep.category)} 最低价扫描失败: {e}")
+                    for key in ("pages", "confirmed", "corrected", "removed"):
+                        stats[key] += sweep.stats[key]
+                    done += 1
+                    if task_id:
+                        TaskManager.update_task(task_id, progress=done)
+
+            stats["seconds"] = round(time.monotonic() - started, 1)
+            stats["stopped"] = self._stopping.is_set()
+            logger.info(
+                f"{'⏹️ 最低价扫描已停止' if stats['stopped'] else '✅ 最低价扫描完成'}: {stats['pages']} 页，确认 {stats['confirmed']} 个商品，"
+                f"校正 {stats['corrected']} 个 (移除 {stats['removed']} 个失效挂单)，用时 {stats['seconds']} 秒"
+            )
+            self.last_run = {**stats, "finished_at": time.time()}
+            return stats
+        finally:
+            self._lock.release()
+
+min_price_sweep = MinPriceSweep()
+
+def scheduled_min_price_sweep():
+    # Off by default: the sweep deletes listings. It also pauses with the crawl scheduler
+    if not system_config.get_bool("min_sweep_enabled", False) or not system_config.get_bool("scheduler_enabled", True):
+        return
+    try:
+        min_price_sweep.run()
+    except Exception as e:
+        logger.error(f"最低价扫描失败: {e}")
@@ -0,0 +1,34 @@
+"""Call pacing shared across threads (see services/cookie_pool.py and services/upstream.py)."""
+import random
+import threading
+import time
+
+class RateBudget:
+    def __init__(self, interval: float, jitter: float = 0.0):
+        """
+        At most one call per ``interval`` seconds (plus up to ``jitter`` random seconds,
+        so the request pattern does not look machine-timed), across all threads.
+        """
+        self.interval = interval
+        self.jitter = jitter
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def next_free(self) -> float:
+        """time.monotonic() at which the next slot is free."""
+        return self._next_slot
+
+    def reserve(self) -> float:
+        """Reserve the next free slot and return how many seconds until it starts."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval + random.uniform(0, self.jitter)
+        return slot - now
+
+    def acquire(self):
+        """Block until this thread's slot comes up."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,234 @@
+"""
+Pool of outbound proxies for upstream calls.
+
+The WAF also limits per IP, so with proxies configured every upstream call
+leaves through one of them instead of this server's own address:
+
+- each cookie account is pinned to one proxy (sticky), so an account always
+  shows up from the same IP; it is moved only when its proxy turns unhealthy.
+  New pairings favor fast proxies with few accounts (latency-weighted random).
+- a proxy carries at most ``max_concurrency`` calls at a time; further calls
+  wait for a free slot.
+- consecutive connection failures mark a proxy unhealthy; the periodic health
+  check (``check_health``) measures latency and brings it back once reachable.
+
+Proxies live in the proxy_servers table. HTTP(S) proxies work out of the box;
+SOCKS proxies need PySocks (requests[socks]). Without any proxy configured,
+calls go out directly as before.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import requests
+
+from config_store import system_config
+from database import SessionLocal
+from models import ProxyServer
+
+try:
+    import socks
+except ImportError: # Optional: without it SOCKS proxies are skipped
+    socks = None
+
+logger = logging.getLogger(__name__)
+
+FAILURE_LIMIT = 3 # Consecutive connection failures before a proxy is taken out
+LATENCY_SMOOTHING = 0.3 # Weight of the newest sample in the latency average
+DEFAULT_LATENCY_MS = 1000.0 # Assumed until a proxy is measured
+ACQUIRE_TIMEOUT = 30
+RELOAD_SECONDS = 30
+
+HEALTH_CHECK_URL = "https://mall.bilibili.com/"
+HEALTH_CHECK_TIMEOUT = 5
+
+SOCKS_SCHEMES = ("socks4", "socks4a", "socks5", "socks5h")
+
+class ProxyUnavailable(requests.exceptions.RequestException):
+    """Proxies are configured but none is healthy, or none freed a slot in time."""
+
+def mask_proxy_url(url: str) -> str:
+    """``url`` without its credentials, for logs and the API."""
+    return re.sub(r"//[^@/]*@", "//***@", url)
+
+class Proxy:
+    def __init__(self, proxy_id: int, name: str, url: str, max_concurrency: int):
+        self.id = proxy_id
+        self.name = name
+        self.url = url
+        self.max_concurrency = max(1, max_concurrency)
+        self.mapping = {"http": url, "https": url}
+        self.healthy = True # Until proven otherwise
+        self.failures = 0
+        self.latency_ms: Optional[float] = None
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+
+    def record_latency(self, elapsed_ms: float):
+        if self.latency_ms is None:
+            self.latency_ms = elapsed_ms
+        else:
+            self.latency_ms += LATENCY_SMOOTHING * (elapsed_ms - self.latency_ms)
+
+class ProxyPool:
+    def __init__(self):
+        self._proxies: Dict[int, Proxy] = {}
+        self._sticky: Dict[int, int] = {} # account id -> proxy id
+        self._loaded_at: Optional[float] = None
+        self._cond = threading.Condition()
+
+    def reload(self):
+        """Pick up added, changed and removed proxies; runtime state of unchanged ones is kept."""
+        db = SessionLocal()
+        try:
+            rows = db.query(ProxyServer).filter(ProxyServer.enabled == True).order_by(ProxyServer.id).all()
+        finally:
+            db.close()
+
+        with self._cond:
+            proxies = {}
+            for row in rows:
+                scheme = row.url.split("://", 1)[0].lower()
+                if scheme in SOCKS_SCHEMES and socks is None:
+                    logger.error(f"代理 {mask_proxy_url(row.url)} 需要 PySocks (pip install requests[socks])，已跳过")
+                    continue
+                proxy = self._proxies.get(row.id)
+                if proxy is None or proxy.url != row.url:
+                    proxy = Proxy(row.id, row.name or f"#{row.id}", row.url, row.max_concurrency)
+                proxy.max_concurrency = max(1, row.max_concurrency)
+                proxies[row.id] = proxy
+            self._proxies = proxies
+            self._sticky = {account: proxy_id for account, proxy_id in self._sticky.items() if proxy_id in proxies}
+            self._loaded_at = time.monotonic()
+            self._cond.notify_all()
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= RELOAD_SECONDS:
+            self.reload()
+
+    def configured(self) -> bool:
+        self._ensure_loaded()
+        return bool(self._proxies)
+
+    def available(self) -> bool:
+        """Whether a healthy proxy is left (always True when calls go out directly)."""
+        self._ensure_loaded()
+        return not self._proxies or any(proxy.healthy for proxy in self._proxies.values())
+
+    def acquire(self, account_id: int, timeout: float = ACQUIRE_TIMEOUT) -> Optional[Proxy]:
+        """
+        Take a slot on the proxy of ``account_id``, pairing the account with one first if needed.
+        Returns None when no proxy is configured (direct connection). Pair with ``release``.
+        """
+        self._ensure_loaded()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if not self._proxies:
+                    return None
+                proxy = self._proxies.get(self._sticky.get(account_id))
+                if proxy is None or not proxy.healthy:
+                    proxy = self._bind(account_id)
+                if proxy.in_flight < proxy.max_concurrency:
+                    proxy.in_flight += 1
+                    proxy.requests += 1
+                    return proxy
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ProxyUnavailable(f"代理 {proxy.name} 并发已满")
+                self._cond.wait(remaining)
+
+    def _bind(self, account_id: int) -> Proxy:
+        healthy = [proxy for proxy in self._proxies.values() if proxy.healthy]
+        if not healthy:
+            raise ProxyUnavailable("没有可用的代理")
+        bound = {}
+        for proxy_id in self._sticky.values():
+            bound[proxy_id] = bound.get(proxy_id, 0) + 1
+        # Faster proxies and proxies carrying fewer accounts are more likely
+        weights = [1.0 / ((proxy.latency_ms or DEFAULT_LATENCY_MS) * (1 + bound.get(proxy.id, 0))) for proxy in healthy]
+        proxy = random.choices(healthy, weights=weights, k=1)[0]
+        self._sticky[account_id] = proxy.id
+        logger.info(f"Cookie 账号 #{account_id} 绑定代理 {proxy.name}")
+        return proxy
+
+    def release(self, proxy: Optional[Proxy], elapsed_ms: float, ok: bool, error: Optional[str] = None):
+        """Give back the slot taken by ``acquire``. ``ok`` is False when no response came back through the proxy."""
+        if proxy is None:
+            return
+        with self._cond:
+            proxy.in_flight -= 1
+            if ok:
+                proxy.failures = 0
+                proxy.record_latency(elapsed_ms)
+            else:
+                proxy.errors += 1
+                proxy.failures += 1
+                proxy.last_error = error
+                if proxy.healthy and proxy.failures >= FAILURE_LIMIT:
+                    proxy.healthy = False
+                    logger.warning(f"代理 {proxy.name} 连续 {proxy.failures} 次连接失败，暂停使用: {error}")
+            self._cond.notify_all()
+
+    def check_health(self):
+        """Probe every proxy once; run periodically from the scheduler."""
+        self._ensure_loaded()
+        proxies = list(self._proxies.values())
+        if not proxies:
+            return
+        check_url = system_config.get("proxy_check_url", HEALTH_CHECK_URL)
+        with ThreadPoolExecutor(max_workers=min(8, len(proxies)), thread_name_prefix="proxy-check") as executor:
+            for proxy, (elapsed_ms, error) in zip(proxies, executor.map(lambda p: self._probe(p, check_url), proxies)):
+                with self._cond:
+                    proxy.checked_at = time.monotonic()
+                    if error is None:
+                        proxy.record_latency(elapsed_ms)
+                        proxy.failures = 0
+                        if not proxy.healthy:
+                            proxy.healthy = True
+                            logger.info(f"代理 {proxy.name} 已恢复 ({elapsed_ms:.0f} ms)")
+                    else:
+                        proxy.last_error = error
+                        if proxy.healthy:
+                            proxy.healthy = False
+                            logger.warning(f"代理 {proxy.name} 健康检查失败，暂停使用: {error}")
+                    self._cond.notify_all()
+
+    @staticmethod
+    def _probe(proxy: Proxy, url: str):
+        started = time.perf_counter()
+        try:
+            # Any HTTP response means the proxy works; the upstream status is not its concern
+            requests.get(url, proxies=proxy.mapping, timeout=HEALTH_CHECK_TIMEOUT, allow_redirects=False)
+        except requests.exceptions.RequestException as e:
+            return None, str(e)[:255]
+        return (time.perf_counter() - started) * 1000, None
+
+    def status(self) -> Dict[int, dict]:
+        """Runtime state of every pooled proxy, by proxy id."""
+        self._ensure_loaded()
+        with self._cond:
+            accounts = {}
+            for account_id, proxy_id in self._sticky.items():
+                accounts.setdefault(proxy_id, []).append(account_id)
+            return {
+                proxy.id: {
+                    "healthy": proxy.healthy,
+                    "latency_ms": round(proxy.latency_ms, 1) if proxy.latency_ms is not None else None,
+                    "in_flight": proxy.in_flight,
+                    "requests": proxy.requests,
+                    "errors": proxy.errors,
+                    "last_error": proxy.last_error,
+                    "accounts": sorted(accounts.get(proxy.id, [])),
+                }
+                for proxy in self._proxies.values()
+            }
+
+proxy_pool = ProxyPool()
@@ -0,0 +1,118 @@
+"""
+Set-based recalculation of the cached price fields on products.
+
+Products are walked in goods_id order, a chunk at a time. For each chunk one
+windowed query finds the cheapest listing of every goods, only the products
+whose cached state differs are written in one bulk UPDATE, and the chunk is
+committed before the next one is read, so memory and lock time stay bounded
+by the chunk size.
+"""
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from models import Listing, Product
+from services.changes import record_state_change
+
+CHUNK_SIZE = 1000
+
+LINK_TEMPLATE = "https://mall.bilibili.com/neul-next/index.html?page=magic-market_detail&noTitleBar=1&itemsId={}&from=market_index"
+
+def listing_link(c2c_id: int) -> str:
+    return LINK_TEMPLATE.format(c2c_id)
+
+def recalc_products(db: Session, goods_ids: List[int]) -> int:
+    """
+    Recompute min_price, historical_low_price, is_out_of_stock and link of ``goods_ids``
+    from their listings, without committing. Returns the number of products changed.
+
+    A product with listings is in stock and links to its cheapest one, which also
+    repairs links left pointing at a listing that is gone or no longer the cheapest.
+    A product without listings is out of stock at its market price with no link.
+    """
+    if not goods_ids:
+        return 0
+
+    ranked = (
+        select(
+            Listing.goods_id, Listing.c2c_id, Listing.price,
+            func.row_number().over(partition_by=Listing.goods_id, order_by=(Listing.price, Listing.c2c_id)).label("rn"),
+        )
+        .where(Listing.goods_id.in_(goods_ids))
+        .subquery()
+    )
+    cheapest = {
+        goods_id: (c2c_id, price)
+        for goods_id, c2c_id, price in db.execute(
+            select(ranked.c.goods_id, ranked.c.c2c_id, ranked.c.price).where(ranked.c.rn == 1)
+        )
+    }
+
+    products = db.execute(
+        select(Product.goods_id, Product.market_price, Product.min_price, Product.historical_low_price,
+               Product.is_out_of_stock, Product.link)
+        .where(Product.goods_id.in_(goods_ids))
+    ).all()
+
+    changes = []
+    for goods_id, market_price, min_price, historical_low, is_out_of_stock, link in products:
+        if goods_id in cheapest:
+            c2c_id, price = cheapest[goods_id]
+            new_state = {
+                "min_price": price,
+                "historical_low_price": price if historical_low is None or price < historical_low else historical_low,
+                "is_out_of_stock": False,
+                "link": listing_link(c2c_id),
+            }
+        else:
+            # No listings -> Out of stock -> Set price to market price
+            new_state = {
+                "min_price": market_price,
+                "historical_low_price": historical_low,
+                "is_out_of_stock": True,
+                "link": None,
+            }
+
+        old_state = {
+            "min_price": min_price,
+            "historical_low_price": historical_low,
+            "is_out_of_stock": bool(is_out_of_stock),
+            "link": link,
+        }
+        if new_state == old_state:
+            continue
+        changes.append({"goods_id": goods_id, **new_state})
+        record_state_change(db, goods_id, min_price, new_state["min_price"], bool(is_out_of_stock), new_state["is_out_of_stock"])
+
+    if changes:
+        # Bulk UPDATE by primary key (executemany)
+        db.execute(update(Product), changes)
+    return len(changes)
+
+def recalc_all(db: Session, progress: Optional[Callable[[int, int], None]] = None,
+               chunk_size: int = CHUNK_SIZE) -> Tuple[int, int]:
+    """
+    Recalculate every product, committing after each chunk.
+
+    :param progress: Called with (processed, total) after each committed chunk.
+    :return: (products processed, products changed)
+    """
+    total = db.execute(select(func.count()).select_from(Product)).scalar_one()
+    processed = changed = 0
+    last_id = None
+    while True:
+        query = select(Product.goods_id).order_by(Product.goods_id).limit(chunk_size)
+        if last_id is not None:
+            query = query.where(Product.goods_id > last_id)
+        goods_ids = db.execute(query).scalars().all()
+        if not goods_ids:
+            break
+
+        changed += recalc_products(db, goods_ids)
+        db.commit()
+        processed += len(goods_ids)
+        last_id = goods_ids[-1]
+        if progress:
+            progress(processed, total)
+    return processed, changed
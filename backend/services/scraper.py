@@ -1,14 +1,21 @@
-import json
 import time
 import logging
 import requests
 import random
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from datetime import datetime
-from models import Product, PriceHistory, SystemConfig, Listing, User, Favorite
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from models import Product, PriceHistory, Listing, User, Favorite
 from database import SessionLocal
 from state import ScraperState
 from services.notifier import NotifierService
+from services.changes import record_change, record_product_state
+from services.cookie_pool import NoHealthyAccount, cookie_pool
+from services.proxy_pool import ProxyUnavailable, proxy_pool
+from services.upstream import transport
+from services.verdicts import verdict_cache
+from config_store import system_config
 
 from sqlalchemy.exc import IntegrityError
 
@@ -16,32 +23,37 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 
 logger = logging.getLogger(__name__)
 
+CATEGORY_MAP = {
+    "2312": "手办",
+    "2066": "模型",
+    "2331": "周边",
+    "2273": "3C"
+}
+
+def parse_price(value) -> float:
+    # Prices are stored as DECIMAL(10, 2); round here so comparisons with stored values are exact
+    return round(float(value), 2)
+
+def listing_goods_id(item_data) -> Optional[int]:
+    """goods_id of a single-item list entry; None for the entries process_item skips (bundles, blind boxes)."""
+    details = item_data.get('detailDtoList') or []
+    name = item_data.get('c2cItemsName', '')
+    if len(details) != 1 or "等" in name and "个商品" in name or item_data.get('type') == 2:
+        return None
+    return details[0].get('itemsId') or None
+
 class ScraperService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, should_stop: Callable[[], bool] = ScraperState.should_stop):
         self.db = db
-        self.headers = self._get_headers()
+        self.should_stop = should_stop # Stop signal checked per item; the global scraper one unless a job has its own
         self.payload_template = self._get_payload_template()
         self.current_category_id = None # Track current category for this run
         self.notifier = NotifierService()
 
-    def _get_headers(self):
-        config = self.db.query(SystemConfig).filter(SystemConfig.key == "user_cookie").first()
-        cookie = config.value if config else ""
-        return {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Content-Type": "application/json",
-            "Referer": "https://mall.bilibili.com/neul-next/index.html?page=magic-market_index",
-            "Origin": "https://mall.bilibili.com",
-            "Cookie": cookie
-        }
-
     def _get_payload_template(self):
-        config = self.db.query(SystemConfig).filter(SystemConfig.key == "payload_template").first()
-        if config:
-            try:
-                return json.loads(config.value)
-            except:
-                pass
+        template = system_config.get_json("payload_template")
+        if template is not None:
+            return template
 
         # Default template
         return {
@@ -53,44 +65,36 @@ class ScraperService:
         }
 
     def is_item_valid(self, c2c_id, item_name):
-        url = "https://mall.bilibili.com/mall-magic-c/internet/c2c/items/queryC2cItemsDetail"
+        # Unknown (rate limited / network error) counts as valid to prevent deletion
+        return self.check_item(c2c_id) is not False
+
+    def check_item(self, c2c_id) -> Optional[bool]:
+        """
+        Verdict for one listing: True on sale, False gone, None unknown (rate limited or unreachable).
+
+        Served from the verdict cache when another check answered it recently; concurrent
+        checks of the same listing share one upstream call.
+        """
+        return verdict_cache.get_or_check(int(c2c_id), lambda: self._query_item(c2c_id))
+
+    def _query_item(self, c2c_id) -> Optional[bool]:
         try:
-            payload = {"c2cItemsId": int(c2c_id)}
-
-            # Construct specific headers for this GET request
-            # Copy base headers but remove Origin (not needed for GET) and update Referer
-            request_headers = self.headers.copy()
-            if "Origin" in request_headers:
-                del request_headers["Origin"]
-            # Remove Content-Type for GET requests as it's not standard and might trigger WAF
-            if "Content-Type" in request_headers:
-                del request_headers["Content-Type"]
-
-            request_headers["Referer"] = f"https://mall.bilibili.com/neul-next/index.html?page=magic-market_detail&noTitleBar=1&itemsId={c2c_id}&from=market_index"
-            request_headers["Accept"] = "application/json, text/plain, */*"
-            request_headers["Sec-Fetch-Dest"] = "empty"
-            request_headers["Sec-Fetch-Mode"] = "cors"
-            request_headers["Sec-Fetch-Site"] = "same-origin"
-
-            # Add a small random delay to avoid burst requests triggering WAF
-            time.sleep(random.uniform(0.5, 1.5))
-
-            # Use a shorter timeout for validity checks
-            response = requests.get(url, headers=request_headers, params=payload, timeout=5)
+            # Pooled connection, prepared detail headers, paced per account by the cookie pool
+            response = transport.item_detail(c2c_id)
             if response.status_code != 200:
                 logger.warning(f"Item {c2c_id} check failed: HTTP {response.status_code}")
                 if response.status_code == 412:
-                    logger.warning(f"Headers sent: {request_headers}")
+                    logger.warning(f"Headers sent: {response.request.headers}")
                     logger.warning(f"Response content: {response.text[:200]}")
-                    # 412 Precondition Failed (Rate Limit/WAF) -> Assume valid to prevent deletion
-                    return True
+                    # 412 Precondition Failed (Rate Limit/WAF) -> Unknown
+                    return None
                 if response.status_code == 429:
                     logger.warning("Rate limit exceeded (429) during validity check.")
-                    # 429 Too Many Requests -> Assume valid
-                    return True
+                    # 429 Too Many Requests -> Unknown
+                    return None
                 if response.status_code >= 500:
-                    # Server error -> Assume valid
-                    return True
+                    # Server error -> Unknown
+                    return None
 
                 # For 404 or other 4xx errors, we assume invalid
                 return False
@@ -128,10 +132,17 @@ class ScraperService:
 
         except Exception as e:
             logger.warning(f"Check validity error for {c2c_id}: {e}")
-            # If network error, assume valid to prevent deletion
-            return True
+            # Network error -> Unknown
+            return None
 
-    def check_listings_validity(self, goods_id):
+    def check_listings_validity(self, goods_id, fresh_seconds: float = 0, cached_only: bool = False):
+        """
+        Check the cheapest listings of ``goods_id`` until 3 are confirmed valid, removing the ones that are gone.
+
+        :param fresh_seconds: Listings verified more recently than this count as valid without an upstream call.
+        :param cached_only: Answer only from recent verifications and cached verdicts; returns None
+            (changing nothing) when any listing would need an upstream call.
+        """
         # Get all listings ordered by price
         listings = self.db.query(Listing).filter(Listing.goods_id == goods_id).order_by(Listing.price.asc()).all()
 
@@ -149,6 +160,8 @@ class ScraperService:
         # Check sequentially to be gentle to the server
         # Limit total checks to avoid ban
         max_checks = 5
+        fresh_after = datetime.now() - timedelta(seconds=fresh_seconds)
+        verified = []
 
         for listing in listings:
             if valid_count >= target_valid_count:
@@ -158,44 +171,99 @@ class ScraperService:
                 logger.warning(f"达到最大检查次数 ({max_checks})，停止检查以防风控。")
                 break
 
-            # Check validity
-            is_valid = self.is_item_valid(listing.c2c_id, name)
+            if fresh_seconds and listing.verified_at and listing.verified_at > fresh_after:
+                valid_count += 1
+                continue
+
+            # Check validity (paced by the shared upstream budget)
+            if cached_only:
+                found, verdict = verdict_cache.lookup(listing.c2c_id)
+                if not found:
+                    self.db.rollback()
+                    return None
+            else:
+                verdict = self.check_item(listing.c2c_id)
             checked_count += 1
 
-            if is_valid:
+            if verdict is not False:
                 valid_count += 1
+                if verdict:
+                    verified.append(listing.c2c_id)
             else:
                 self.db.delete(listing)
+                record_change(self.db, "listing_removed", goods_id, c2c_id=listing.c2c_id, old_price=listing.price)
                 removed_count += 1
 
-            # Sleep between checks to avoid rate limiting
-            # Increased delay to be safer
-            time.sleep(random.uniform(1.5, 3.0))
-
+        self.mark_verified(verified)
+        self.db.commit()
         if removed_count > 0:
-            self.db.commit()
-            # Update min_price
-            min_listing = self.db.query(Listing).filter(Listing.goods_id == goods_id).order_by(Listing.price.asc()).first()
-            product = self.db.query(Product).filter(Product.goods_id == goods_id).first()
-            if product:
-                if min_listing:
-                    product.min_price = min_listing.price
-                    product.link = f"https://mall.bilibili.com/neul-next/index.html?page=magic-market_detail&noTitleBar=1&itemsId={min_listing.c2c_id}&from=market_index"
-                else:
-                    # No listings left - Clear the link to indicate out of stock
-                    product.link = None
-                    # We keep min_price as a reference to the last known price
-                self.db.commit()
+            self._refresh_min_price(goods_id)
 
         return {"checked": checked_count, "removed": removed_count}
 
+    def verify_listing(self, c2c_id) -> Optional[bool]:
+        """Check a single listing upstream; remove it when it is gone, otherwise record when it was confirmed."""
+        listing = self.db.get(Listing, c2c_id)
+        if listing is None:
+            return False
+
+        verdict = self.check_item(c2c_id)
+        if verdict:
+            self.mark_verified([c2c_id])
+            self.db.commit()
+        elif verdict is False:
+            self.remove_listing(c2c_id)
+        return verdict
+
+    def remove_listing(self, c2c_id):
+        """Delete a listing found gone upstream and repoint its product at the cheapest remaining one."""
+        listing = self.db.get(Listing, c2c_id)
+        if listing is None:
+            return
+        self.db.delete(listing)
+        record_change(self.db, "listing_removed", listing.goods_id, c2c_id=c2c_id, old_price=listing.price)
+        self.db.commit()
+        self._refresh_min_price(listing.goods_id)
+
+    def mark_verified(self, c2c_ids):
+        """Record that these listings were just confirmed on sale (not committed)."""
+        if not c2c_ids:
+            return
+        # Keep update_time: it means "last seen by the crawler"
+        self.db.execute(
+            update(Listing)
+            .where(Listing.c2c_id.in_(c2c_ids))
+            .values(verified_at=datetime.now(), update_time=Listing.update_time)
+            .execution_options(synchronize_session=False)
+        )
+
+    def _refresh_min_price(self, goods_id):
+        """Point the product at its cheapest remaining listing after some were removed."""
+        # Product row locked first, as in process_item, so a concurrent crawl cannot interleave this read-modify-write
+        product = self.db.query(Product).filter(Product.goods_id == goods_id).with_for_update().populate_existing().first()
+        if product is None:
+            self.db.rollback()
+            return
+        min_listing = self.db.query(Listing).filter(Listing.goods_id == goods_id).order_by(Listing.price.asc()).first()
+        old_price, was_out_of_stock = product.min_price, product.is_out_of_stock
+        if min_listing:
+            product.min_price = min_listing.price
+            product.link = f"https://mall.bilibili.com/neul-next/index.html?page=magic-market_detail&noTitleBar=1&itemsId={min_listing.c2c_id}&from=market_index"
+        else:
+            # No listings left - Clear the link to indicate out of stock
+            product.link = None
+            product.is_out_of_stock = True
+            # We keep min_price as a reference to the last known price
+        record_product_state(self.db, product, old_price, was_out_of_stock)
+        self.db.commit()
+
     def process_item(self, item_data):
         # Check stop signal before processing each item
-        if ScraperState.should_stop():
+        if self.should_stop():
             return False # Return False if stopped
 
         try:
-            c2c_id = str(item_data['c2cItemsId'])
+            c2c_id = int(item_data['c2cItemsId'])
             details = item_data.get('detailDtoList', [])
 
             if not details:
@@ -218,11 +286,11 @@ class ScraperService:
             if item_data.get('type') == 2:
                 return False
 
-            total_price = float(item_data['showPrice'])
+            total_price = parse_price(item_data['showPrice'])
 
             # Single item
             price = total_price
-            market_price = float(item_data['showMarketPrice'])
+            market_price = parse_price(item_data['showMarketPrice'])
 
             link = f"https://mall.bilibili.com/neul-next/index.html?page=magic-market_detail&noTitleBar=1&itemsId={c2c_id}&from=market_index"
 
@@ -230,7 +298,10 @@ class ScraperService:
                 return False # Skip blind box
 
             # 1. Upsert Product
-            product = self.db.query(Product).filter(Product.goods_id == goods_id).first()
+            # Lock the product row for the rest of this item's transaction: concurrent crawls
+            # (sharded crawl, min-price sweep) may process the same goods at once, and the
+            # min_price / is_out_of_stock read-modify-write below must not interleave
+            product = self.db.query(Product).filter(Product.goods_id == goods_id).with_for_update().populate_existing().first()
 
             # Get current category from payload template or random selection
             current_category = self.current_category_id or self.payload_template.get("categoryFilter", "2312")
@@ -239,6 +310,7 @@ class ScraperService:
 
             is_new = False
             is_price_changed = False
+            listing_change = None
 
             if not product:
                 try:
@@ -258,12 +330,16 @@ class ScraperService:
                 except IntegrityError:
                     self.db.rollback()
                     # Retry query, it should exist now
-                    product = self.db.query(Product).filter(Product.goods_id == goods_id).first()
+                    product = self.db.query(Product).filter(Product.goods_id == goods_id).with_for_update().populate_existing().first()
                     if not product:
                         # Should not happen
                         logger.error(f"Failed to recover from IntegrityError for goods_id {goods_id}")
                         return False
-            else:
+
+            # Previous state, for the change feed
+            old_price, was_out_of_stock = product.min_price, product.is_out_of_stock
+
+            if not is_new:
                 # Update basic info
                 product.update_time = datetime.now()
                 # Update category if it was default or empty
@@ -281,6 +357,7 @@ class ScraperService:
                     update_time=datetime.now()
                 )
                 self.db.add(listing)
+                listing_change = ("listing_added", None)
                 # self.db.commit() # Defer commit
 
                 # Add History for new listing
@@ -290,6 +367,7 @@ class ScraperService:
             else:
                 if listing.price != price:
                     # Price changed for this specific listing (rare but possible)
+                    listing_change = ("listing_price_changed", listing.price)
                     listing.price = price
                     listing.update_time = datetime.now()
                     # self.db.commit() # Defer commit
@@ -364,6 +442,15 @@ class ScraperService:
                 product.link = None
                 # We keep min_price as a reference to the last known price
 
+            # Change feed rows go in just before the commit, so their ids become visible right away
+            if is_new:
+                record_change(self.db, "product_created", goods_id, new_price=product.min_price)
+            else:
+                record_product_state(self.db, product, old_price, was_out_of_stock)
+            if listing_change:
+                event_type, old_listing_price = listing_change
+                record_change(self.db, event_type, goods_id, c2c_id=c2c_id, old_price=old_listing_price, new_price=price)
+
             # Final commit for the item
             self.db.commit()
 
@@ -375,82 +462,78 @@ class ScraperService:
             return False
 
     def _get_request_interval(self):
-        config = self.db.query(SystemConfig).filter(SystemConfig.key == "request_interval").first()
-        if config:
-            try:
-                return float(config.value)
-            except:
-                return 3.0
-        return 3.0
+        return system_config.get_float("request_interval", 3.0)
+
+    def resolve_category(self, filter_settings: dict) -> str:
+        """Category to crawl this run; with "ALL" one is picked at random by the configured weights."""
+        # Priority: filter_settings['category'] > payload_template['categoryFilter']
+        target_category = filter_settings.get("category")
+
+        # If target_category is None or empty string, fallback to template or default
+        if target_category is None or target_category == "":
+             target_category = self.payload_template.get("categoryFilter", "2312")
+
+        # Handle "ALL" logic
+        if target_category == "ALL":
+            # Weighted random selection
+            weights = filter_settings.get("category_weights", {})
+
+            categories = list(CATEGORY_MAP.keys())
+            # Default weight 25 if not set (for 4 categories)
+            category_weights = [weights.get(c, 25) for c in categories]
+
+            # Select one category for this run
+            selected_category = random.choices(categories, weights=category_weights, k=1)[0]
+
+            self.current_category_id = selected_category
+            category_name = CATEGORY_MAP.get(selected_category, selected_category)
+            logger.info(f"当前配置为全部分类，本次随机选中分类: {category_name} (权重: {weights.get(selected_category, 25)})")
+            return selected_category
+
+        self.current_category_id = target_category
+        category_name = CATEGORY_MAP.get(target_category, target_category)
+        logger.info(f"当前爬取分类: {category_name}")
+        return target_category
+
+    def resolve_price_filters(self, filter_settings: dict) -> list:
+        price_filters = filter_settings.get("priceFilters", [])
+        if not price_filters:
+             price_filters = self.payload_template.get("priceFilters", [])
+        return price_filters
+
+    def list_payload(self, category: str, price_filters: list, next_id) -> dict:
+        payload = self.payload_template.copy()
+        payload["nextId"] = next_id
+        # Override categoryFilter with our selected target
+        payload["categoryFilter"] = category if category != "ALL" else "2312" # Fallback just in case, but category should be resolved by now
+        # Apply price filters
+        payload["priceFilters"] = price_filters
+        return payload
 
     def run_scrape(self, max_pages=100):
         ScraperState.set_running(True)
         # logger.info(f"Scraper started. Max pages: {max_pages}")
         try:
             # Refresh config
-            self.headers = self._get_headers()
             self.payload_template = self._get_payload_template()
             request_interval = self._get_request_interval()
 
-            # Validate Cookie
-            if 'Cookie' not in self.headers or not self.headers['Cookie'] or len(self.headers['Cookie']) < 10:
+            # Validate Cookie (user_cookie or accounts in the cookie pool)
+            cookie_pool.reload()
+            if not cookie_pool.has_accounts():
                 logger.error("❌ 未检测到有效的 Cookie！请先在设置页面配置 Bilibili Cookie。")
                 return
 
-            url = "https://mall.bilibili.com/mall-magic-c/internet/c2c/v2/list"
             next_id = None
 
             # 1. Load filter settings from DB
-            filter_config = self.db.query(SystemConfig).filter(SystemConfig.key == "filter_settings").first()
-            filter_settings = {}
-            if filter_config:
-                try:
-                    filter_settings = json.loads(filter_config.value)
-                except:
-                    pass
+            filter_settings = system_config.get_json("filter_settings", {})
 
             # 2. Determine target category
-            # Priority: filter_settings['category'] > payload_template['categoryFilter']
-            target_category = filter_settings.get("category")
-
-            # If target_category is None or empty string, fallback to template or default
-            if target_category is None or target_category == "":
-                 target_category = self.payload_template.get("categoryFilter", "2312")
-
-            category_map = {
-                "2312": "手办",
-                "2066": "模型",
-                "2331": "周边",
-                "2273": "3C"
-            }
-
-            # Handle "ALL" logic
-            if target_category == "ALL":
-                # Weighted random selection
-                weights = filter_settings.get("category_weights", {})
-
-                categories = list(category_map.keys())
-                # Default weight 25 if not set (for 4 categories)
-                category_weights = [weights.get(c, 25) for c in categories]
-
-                # Select one category for this run
-                selected_category = random.choices(categories, weights=category_weights, k=1)[0]
-
-                self.current_category_id = selected_category
-                category_name = category_map.get(selected_category, selected_category)
-                logger.info(f"当前配置为全部分类，本次随机选中分类: {category_name} (权重: {weights.get(selected_category, 25)})")
-
-                # IMPORTANT: Update target_category to the selected one so payload uses it
-                target_category = selected_category
-            else:
-                self.current_category_id = target_category
-                category_name = category_map.get(target_category, target_category)
-                logger.info(f"当前爬取分类: {category_name}")
+            target_category = self.resolve_category(filter_settings)
 
             # 3. Determine price filters
-            price_filters = filter_settings.get("priceFilters", [])
-            if not price_filters:
-                 price_filters = self.payload_template.get("priceFilters", [])
+            price_filters = self.resolve_price_filters(filter_settings)
 
             if price_filters:
                 logger.info(f"应用价格筛选: {price_filters}")
@@ -470,15 +553,10 @@ class ScraperService:
                     break
 
                 try:
-                    payload = self.payload_template.copy()
-                    payload["nextId"] = next_id
-                    # Override categoryFilter with our selected target
-                    payload["categoryFilter"] = target_category if target_category != "ALL" else "2312" # Fallback just in case, but target_category should be resolved by now
-                    # Apply price filters
-                    payload["priceFilters"] = price_filters
+                    payload = self.list_payload(target_category, price_filters, next_id)
 
                     logger.info(f"正在获取第 {page_count} 页...")
-                    response = requests.post(url, headers=self.headers, data=json.dumps(payload), timeout=10)
+                    response = transport.list_page(payload)
                     response.raise_for_status()
                     data = response.json()
 
@@ -528,7 +606,20 @@ class ScraperService:
                             break
                         time.sleep(0.1)
 
+                except NoHealthyAccount:
+                    logger.error("❌ 所有 Cookie 账号均被限流，停止爬取。")
+                    break
+
+                except ProxyUnavailable as e:
+                    logger.error(f"❌ {e}，停止爬取。")
+                    break
+
                 except requests.exceptions.HTTPError as e:
+                    if e.response.status_code in (412, 429) and cookie_pool.available():
+                        # The pool quarantined the account; retry this page on another one
+                        logger.warning(f"账号被限流 (HTTP {e.response.status_code})，切换账号继续。")
+                        page_count -= 1
+                        continue
                     if e.response.status_code == 429:
                         logger.warning("请求过于频繁 (429)。临时增加 1秒 间隔并冷却 5秒。")
                         request_interval += 1.0
@@ -538,6 +629,15 @@ class ScraperService:
                         logger.error(f"爬取错误: {e}")
                         break
 
+                except requests.exceptions.ConnectionError as e:
+                    if proxy_pool.configured() and proxy_pool.available():
+                        # Failing proxies are taken out by the pool; retry this page
+                        logger.warning(f"代理连接失败，重试本页: {e}")
+                        page_count -= 1
+                        continue
+                    logger.error(f"爬取错误: {e}")
+                    break
+
                 except Exception as e:
                     logger.error(f"爬取错误: {e}")
                     break
@@ -0,0 +1,244 @@
+"""
+Price-range sharded crawl of one category.
+
+Upstream pagination is one ``nextId`` chain per query, so a plain crawl walks
+the whole category page after page. A ``priceFilters`` range is its own query
+with its own chain, though: the category is split into price-range shards and
+the shards are crawled side by side, each with an independent cursor.
+
+Shard boundaries come from the local listing mirror: price quantiles of the
+category's listings, so every shard holds about as many listings and the
+chains end at about the same depth. Each sweep refreshes the mirror, so the
+next sweep's boundaries follow the catalog. Without enough local data the
+standard upstream price bands are used.
+
+The upstream UI only offers the standard bands, so a shard checks that its
+pages stay inside its range: a page with listings outside it means the range
+was ignored and the shard is holding the whole category, and the shard stops
+instead of crawling it all once more.
+
+Shards share nothing but the upstream pacing: every page waits for a slot of
+an account in ``cookie_pool``, which is what bounds the sweep. Listings seen
+by more than one shard (a price changed mid-sweep, or sitting on a boundary)
+are processed once.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import requests
+from sqlalchemy import func, select
+
+from config_store import system_config
+from database import SessionLocal
+from models import Listing, Product
+from services.cookie_pool import NoHealthyAccount, cookie_pool
+from services.proxy_pool import ProxyUnavailable, proxy_pool
+from services.scraper import ScraperService, parse_price
+from services.upstream import transport
+from state import ScraperState, TaskManager
+
+logger = logging.getLogger(__name__)
+
+SHARD_COUNT = 8
+MIN_LISTINGS_TO_TUNE = 200 # Below this the local mirror says too little about the price distribution
+MAX_RETRIES = 5 # Consecutive failed requests before a shard is given up
+
+# The upstream's own price bands, in cents; an upper bound of 0 means open-ended
+DEFAULT_BANDS = [(0, 2000), (2000, 3000), (3000, 5000), (5000, 10000), (10000, 20000), (20000, 0)]
+
+Shard = Tuple[int, int] # (low, high) in cents, high 0 = open-ended
+
+def shard_filter(shard: Shard) -> str:
+    return f"{shard[0]}-{shard[1]}"
+
+def in_shard(shard: Shard, price: float) -> bool:
+    """Whether ``price`` (yuan) falls in ``shard``; both bounds count, as upstream may include either."""
+    cents = int(round(price * 100))
+    return shard[0] <= cents and (not shard[1] or cents <= shard[1])
+
+def parse_price_filter(value: str) -> Optional[Shard]:
+    try:
+        low, high = value.split("-", 1)
+        return int(low), int(high)
+    except (AttributeError, ValueError):
+        return None
+
+def plan_shards(db, category: str, shard_count: int = SHARD_COUNT, bands: Optional[List[str]] = None) -> List[Shard]:
+    """
+    Price ranges that split ``category`` into ``shard_count`` shards of about equal size,
+    restricted to ``bands`` (configured price filters) if given.
+    """
+    tiles = (
+        select(Listing.price, func.ntile(shard_count).over(order_by=Listing.price).label("tile"))
+        .join(Product, Product.goods_id == Listing.goods_id)
+        .where(Product.category == category)
+        .subquery()
+    )
+    rows = db.execute(
+        select(func.max(tiles.c.price), func.count()).group_by(tiles.c.tile).order_by(tiles.c.tile)
+    ).all()
+
+    if sum(count for _, count in rows) < MIN_LISTINGS_TO_TUNE:
+        shards = list(DEFAULT_BANDS)
+    else:
+        edges = [0]
+        for upper, _ in rows[:-1]:
+            cents = int(round(float(upper) * 100))
+            if cents > edges[-1]:
+                edges.append(cents)
+        edges.append(0)
+        shards = list(zip(edges, edges[1:]))
+
+    wanted = [band for band in (parse_price_filter(value) for value in bands or []) if band]
+    if not wanted:
+        return shards
+    return sorted({cut for shard in shards for band in wanted if (cut := _intersect(shard, band))})
+
+def _intersect(a: Shard, b: Shard) -> Optional[Shard]:
+    low = max(a[0], b[0])
+    highs = [high for high in (a[1], b[1]) if high]
+    high = min(highs) if highs else 0
+    if high and high <= low:
+        return None
+    return low, high
+
+class ShardedCrawl:
+    def __init__(self, category: str, shards: List[Shard], workers: int, max_pages_per_shard: int = -1,
+                 task_id: Optional[str] = None):
+        self.category = category
+        self.shards = shards
+        self.workers = max(1, min(workers, len(shards)))
+        self.max_pages_per_shard = max_pages_per_shard
+        self.task_id = task_id
+        self._seen = set()
+        self._lock = threading.Lock()
+        self._abort = threading.Event()
+        self.stats = {"pages": 0, "items": 0, "duplicates": 0, "new": 0, "price_changed": 0, "shards_done": 0, "shards_failed": 0}
+
+    def run(self) -> dict:
+        started = time.monotonic()
+        logger.info(f"分片爬取开始: {len(self.shards)} 个价格分片，{self.workers} 路并发")
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="shard") as executor:
+            list(executor.map(self._crawl_shard, self.shards))
+        self.stats["seconds"] = round(time.monotonic() - started, 1)
+        return self.stats
+
+    def _stopping(self) -> bool:
+        return self._abort.is_set() or ScraperState.should_stop()
+
+    def _claim(self, c2c_id) -> bool:
+        with self._lock:
+            if c2c_id in self._seen:
+                self.stats["duplicates"] += 1
+                return False
+            self._seen.add(c2c_id)
+            return True
+
+    def _count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+            shards_finished = self.stats["shards_done"] + self.stats["shards_failed"]
+            message = f"{shards_finished}/{len(self.shards)} 个分片完成，{self.stats['pages']} 页，{self.stats['items']} 个挂单"
+        if self.task_id:
+            TaskManager.update_task(self.task_id, progress=shards_finished, message=message)
+
+    def _crawl_shard(self, shard: Shard):
+        name = shard_filter(shard)
+        db = SessionLocal()
+        try:
+            service = ScraperService(db)
+            service.current_category_id = self.category
+            next_id = None
+            pages = 0
+            failures = 0
+            while not self._stopping():
+                if self.max_pages_per_shard != -1 and pages >= self.max_pages_per_shard:
+                    break
+                try:
+                    response = transport.list_page(service.list_payload(self.category, [name], next_id))
+                    response.raise_for_status()
+                    data = response.json()["data"] or {}
+                    items = data.get("data") or []
+                    outside = [item for item in items if not in_shard(shard, parse_price(item["showPrice"]))]
+                except (NoHealthyAccount, ProxyUnavailable) as e:
+                    logger.error(f"❌ {e}，停止分片爬取。")
+                    self._abort.set()
+                    break
+                except requests.exceptions.RequestException as e:
+                    # Rate-limited accounts and failing proxies are taken out by their pools; retry on the next ones
+                    failures += 1
+                    status = getattr(e.response, "status_code", None)
+                    retryable = cookie_pool.available() if status in (412, 429) else status is None and proxy_pool.available()
+                    if retryable and failures < MAX_RETRIES:
+                        logger.warning(f"分片 {name} 请求失败，重试: {e}")
+                        continue
+                    logger.error(f"分片 {name} 爬取错误: {e}")
+                    self._count(shards_failed=1)
+                    return
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning(f"分片 {name} 响应数据异常: {e}")
+                    break
+
+                failures = 0
+                pages += 1
+                if outside:
+                    logger.error(f"分片 {name} 返回了区间外的价格 (¥ {parse_price(outside[0]['showPrice']):,.2f})，上游未按此价格区间过滤，停止该分片")
+                    self._count(pages=1, shards_failed=1)
+                    return
+                new_count = changed_count = duplicates = 0
+                for item in items:
+                    if not self._claim(item.get("c2cItemsId")):
+                        duplicates += 1
+                        continue
+                    result = service.process_item(item)
+                    if result:
+                        new_count += bool(result.get("is_new"))
+                        changed_count += bool(result.get("is_price_changed"))
+                self._count(pages=1, items=len(items) - duplicates, new=new_count, price_changed=changed_count)
+
+                next_id = data.get("nextId")
+                if not items or not next_id:
+                    break
+            if self._stopping():
+                return
+            logger.info(f"分片 {name} 完成，共 {pages} 页")
+            self._count(shards_done=1)
+        finally:
+            db.close()
+
+def run_sharded_scrape(shard_count: Optional[int] = None, max_pages_per_shard: int = -1,
+                       task_id: Optional[str] = None) -> Optional[dict]:
+    """Sweep the configured category shard by shard. Returns the sweep stats, or None if it could not start."""
+    ScraperState.set_running(True)
+    db = SessionLocal()
+    try:
+        cookie_pool.reload()
+        if not cookie_pool.has_accounts():
+            logger.error("❌ 未检测到有效的 Cookie！请先在设置页面配置 Bilibili Cookie。")
+            return None
+
+        service = ScraperService(db)
+        filter_settings = system_config.get_json("filter_settings", {})
+        category = service.resolve_category(filter_settings)
+        shard_count = shard_count or system_config.get_int("crawl_shard_count", SHARD_COUNT)
+        shards = plan_shards(db, category, shard_count, service.resolve_price_filters(filter_settings))
+        db.close() # Shards use sessions of their own
+
+        # Enough workers to keep every account busy while others process their pages
+        workers = system_config.get_int("crawl_shard_workers", 2 * max(1, len(cookie_pool.status())))
+        if task_id:
+            TaskManager.update_task(task_id, total=len(shards), message=f"{len(shards)} 个价格分片")
+
+        stats = ShardedCrawl(category, shards, workers, max_pages_per_shard, task_id).run()
+        logger.info(
+            f"✅ 分片爬取完成: {stats['shards_done']}/{len(shards)} 个分片，{stats['pages']} 页，"
+            f"{stats['items']} 个挂单 (新增 {stats['new']}，价格变动 {stats['price_changed']})，用时 {stats['seconds']} 秒"
+        )
+        return stats
+    finally:
+        db.close()
+        ScraperState.set_running(False)
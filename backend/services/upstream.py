@@ -0,0 +1,174 @@
+"""
+Transport for calls to the Bilibili market API.
+
+Crawling and listing verification run in different threads but hit the same
+upstream, which rate limits (412/429) per cookie and IP. All of them go through
+``transport``, and every call goes out on an account from ``cookie_pool``,
+after waiting for that account's next slot, so together they never exceed any
+account's pace. With proxies configured, the call leaves through the proxy
+``proxy_pool`` pairs with that account.
+"""
+import json
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from services.cookie_pool import CookiePool, cookie_pool
+from services.proxy_pool import ProxyPool, proxy_pool
+
+LIST_URL = "https://mall.bilibili.com/mall-magic-c/internet/c2c/v2/list"
+DETAIL_URL = "https://mall.bilibili.com/mall-magic-c/internet/c2c/items/queryC2cItemsDetail"
+DETAIL_REFERER = "https://mall.bilibili.com/neul-next/index.html?page=magic-market_detail&noTitleBar=1&itemsId={}&from=market_index"
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+LIST_HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Content-Type": "application/json",
+    "Referer": "https://mall.bilibili.com/neul-next/index.html?page=magic-market_index",
+    "Origin": "https://mall.bilibili.com",
+}
+# The detail endpoint is a plain GET: no Origin / Content-Type, which might trigger the WAF
+DETAIL_HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept": "application/json, text/plain, */*",
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-origin",
+}
+
+# (connect, read) timeouts per endpoint
+TIMEOUTS = {
+    "list": (5, 10),
+    "detail": (3, 5),
+}
+
+class EndpointStats:
+    def __init__(self, window: int = 500):
+        self.count = 0
+        self.errors = 0
+        self.statuses: Dict[int, int] = {}
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._recent = deque(maxlen=window)
+
+    def record(self, elapsed_ms: float, status: Optional[int]):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self._recent.append(elapsed_ms)
+        if status is None:
+            self.errors += 1
+        else:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def snapshot(self) -> dict:
+        recent = sorted(self._recent)
+        def percentile(p):
+            return round(recent[min(len(recent) - 1, int(len(recent) * p))], 1) if recent else None
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "statuses": dict(self.statuses),
+            "avg_ms": round(self.total_ms / self.count, 1) if self.count else None,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(self.max_ms, 1),
+        }
+
+class UpstreamTransport:
+    def __init__(self, pool_size: int = 10, retries: int = 2, accounts: CookiePool = cookie_pool,
+                 proxies: ProxyPool = proxy_pool):
+        """
+        The one HTTP client for the Bilibili market API.
+
+        A shared requests.Session keeps connections alive across pages and checks (no
+        handshake per call). Connection errors and 502/503/504 are retried with backoff;
+        412/429 are not, since retrying a rate limit only makes it worse: the account is
+        reported to ``accounts`` instead, which quarantines it. Every call waits for a
+        slot of the account it uses, and for a slot on that account's proxy if any; its
+        latency is recorded per endpoint. Connection pools are kept per proxy.
+        """
+        self.accounts = accounts
+        self.proxies = proxies
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries, connect=retries, read=1, status=retries,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}), # The list POST is a read-only query
+            backoff_factor=0.5,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._stats: Dict[str, EndpointStats] = {endpoint: EndpointStats() for endpoint in TIMEOUTS}
+        self._stats_lock = threading.Lock()
+        # cookie -> {endpoint: headers}
+        self._headers: Dict[str, Dict[str, dict]] = {}
+
+    def headers(self, endpoint: str, cookie: str) -> dict:
+        """Prepared headers of ``endpoint`` for ``cookie``; built once per cookie. Do not modify."""
+        prepared = self._headers.get(cookie)
+        if prepared is None:
+            if len(self._headers) > 32:
+                self._headers.clear()
+            prepared = self._headers[cookie] = {
+                "list": {**LIST_HEADERS, "Cookie": cookie},
+                "detail": {**DETAIL_HEADERS, "Cookie": cookie},
+            }
+        return prepared[endpoint]
+
+    def list_page(self, payload: dict) -> requests.Response:
+        return self.request("list", "POST", LIST_URL, data=json.dumps(payload))
+
+    def item_detail(self, c2c_id) -> requests.Response:
+        return self.request("detail", "GET", DETAIL_URL, {"Referer": DETAIL_REFERER.format(c2c_id)},
+                            params={"c2cItemsId": int(c2c_id)})
+
+    def request(self, endpoint: str, method: str, url: str, extra_headers: Optional[dict] = None,
+                **kwargs) -> requests.Response:
+        """
+        One call on the next free account, through its proxy. Raises NoHealthyAccount /
+        ProxyUnavailable (both RequestExceptions) when every account is quarantined or
+        no proxy is usable.
+        """
+        account = self.accounts.acquire()
+        headers = self.headers(endpoint, account.cookie)
+        if extra_headers:
+            headers = {**headers, **extra_headers}
+        try:
+            proxy = self.proxies.acquire(account.id)
+        except BaseException:
+            # No call went out: hand back a probing account instead of leaving it stuck
+            self.accounts.report(account, None)
+            raise
+        started = time.perf_counter()
+        status = None
+        error = None
+        try:
+            response = self.session.request(method, url, headers=headers, timeout=TIMEOUTS[endpoint],
+                                            proxies=proxy.mapping if proxy else None, **kwargs)
+            status = response.status_code
+            return response
+        except requests.exceptions.RequestException as e:
+            error = str(e)[:255]
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._stats_lock:
+                self._stats[endpoint].record(elapsed_ms, status)
+            self.proxies.release(proxy, elapsed_ms, status is not None, error)
+            self.accounts.report(account, status)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {endpoint: stats.snapshot() for endpoint, stats in self._stats.items()}
+
+transport = UpstreamTransport()
@@ -0,0 +1,160 @@
+"""
+On-demand validity checks as background jobs.
+
+``POST /api/items/{goods_id}/check_validity`` starts a job and returns its id
+right away. The job checks the cheapest listings of the goods a few at a time
+(bounded by a small thread pool; each upstream call still waits for a slot of an
+account in ``cookie_pool``), applies every verdict as soon as it arrives and publishes
+it, together with the recomputed product price, to ``validity_hub``. Clients
+follow a job over SSE (/api/validity/{job_id}/events).
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import select
+
+from database import SessionLocal
+from events import EventHub
+from models import Listing, Product
+from services.freshness import USER_FRESH_SECONDS
+from services.scraper import ScraperService
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = 3 # Upstream calls in flight across all jobs
+TARGET_VALID = 3 # Stop once this many of the cheapest listings are confirmed
+MAX_CHECKS = 5 # Upstream calls per job, to avoid bans
+JOB_RETENTION_SECONDS = 300
+
+validity_hub = EventHub(history_size=1000, queue_size=256)
+
+def _verdict_name(verdict: Optional[bool]) -> str:
+    if verdict is None:
+        return "unknown"
+    return "valid" if verdict else "invalid"
+
+class ValidityJobs:
+    def __init__(self, concurrency: int = CONCURRENCY):
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="validity")
+        self._jobs: Dict[str, dict] = {}
+        self._running_by_goods: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def start(self, goods_id: int) -> dict:
+        """Start a check of ``goods_id``, or return the one already running for it."""
+        with self._lock:
+            self._prune()
+            job_id = self._running_by_goods.get(goods_id)
+            if job_id is not None:
+                return self._jobs[job_id]
+            job = {
+                "id": uuid.uuid4().hex,
+                "goods_id": goods_id,
+                "status": "running", # running, completed, failed
+                "checked": 0,
+                "removed": 0,
+                "verdicts": [],
+                "seq": 0,
+                "done_event": None, # Kept for clients that connect after it left validity_hub's history
+                "created_at": time.time(),
+            }
+            self._jobs[job["id"]] = job
+            self._running_by_goods[goods_id] = job["id"]
+
+        job["seq"] = self._publish(job, {"type": "started"})["seq"]
+        threading.Thread(target=self._run, args=(job,), name=f"validity-{goods_id}", daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [k for k, job in self._jobs.items() if job["status"] != "running" and job["created_at"] < cutoff]:
+            del self._jobs[job_id]
+
+    def _publish(self, job: dict, event: dict) -> dict:
+        return validity_hub.publish({"job_id": job["id"], "goods_id": job["goods_id"], **event})
+
+    def _run(self, job: dict):
+        goods_id = job["goods_id"]
+        db = SessionLocal()
+        try:
+            service = ScraperService(db)
+            listings = db.execute(
+                select(Listing.c2c_id, Listing.price, Listing.verified_at)
+                .where(Listing.goods_id == goods_id)
+                .order_by(Listing.price, Listing.c2c_id)
+            ).all()
+            fresh_after = datetime.now() - timedelta(seconds=USER_FRESH_SECONDS)
+
+            valid = 0
+            next_index = 0
+            in_flight = {}
+            verified = []
+            while True:
+                # Keep just enough checks in flight to reach TARGET_VALID if they all come back valid
+                while (valid + len(in_flight) < TARGET_VALID and job["checked"] + len(in_flight) < MAX_CHECKS
+                       and next_index < len(listings)):
+                    c2c_id, price, verified_at = listings[next_index]
+                    next_index += 1
+                    if verified_at and verified_at > fresh_after:
+                        valid += 1
+                        self._record(job, db, c2c_id, price, True, cached=True)
+                        continue
+                    in_flight[self._executor.submit(service.check_item, c2c_id)] = (c2c_id, price)
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    c2c_id, price = in_flight.pop(future)
+                    try:
+                        verdict = future.result()
+                    except Exception as e:
+                        logger.warning(f"Check validity error for {c2c_id}: {e}")
+                        verdict = None
+                    job["checked"] += 1
+                    if verdict is False:
+                        service.remove_listing(c2c_id)
+                        job["removed"] += 1
+                    else:
+                        # Unknown counts as valid so rate limiting never deletes listings
+                        valid += 1
+                        if verdict:
+                            verified.append(c2c_id)
+                    self._record(job, db, c2c_id, price, verdict)
+
+            service.mark_verified(verified)
+            db.commit()
+            job["status"] = "completed"
+            job["done_event"] = self._publish(job, {"type": "done", "checked": job["checked"], "removed": job["removed"], **self._product_state(db, goods_id)})
+        except Exception as e:
+            logger.error(f"商品 {goods_id} 有效性检查失败: {e}")
+            job["status"] = "failed"
+            job["done_event"] = self._publish(job, {"type": "done", "error": str(e), "checked": job["checked"], "removed": job["removed"]})
+        finally:
+            db.close()
+            with self._lock:
+                self._running_by_goods.pop(goods_id, None)
+
+    def _record(self, job: dict, db, c2c_id: int, price: float, verdict: Optional[bool], cached: bool = False):
+        entry = {"c2c_id": str(c2c_id), "price": price, "verdict": _verdict_name(verdict), "cached": cached}
+        job["verdicts"].append(entry)
+        self._publish(job, {"type": "verdict", **entry, **self._product_state(db, job["goods_id"])})
+
+    @staticmethod
+    def _product_state(db, goods_id: int) -> dict:
+        row = db.execute(
+            select(Product.min_price, Product.is_out_of_stock, Product.link).where(Product.goods_id == goods_id)
+        ).first()
+        if row is None:
+            return {}
+        return {"min_price": row.min_price, "is_out_of_stock": bool(row.is_out_of_stock), "link": row.link}
+
+validity_jobs = ValidityJobs()
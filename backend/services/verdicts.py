@@ -0,0 +1,94 @@
+"""
+Per-listing validity verdict cache.
+
+Upstream verdicts are kept per c2c_id for a TTL that depends on the verdict, so
+a listing another viewer verified a moment ago is answered from memory.
+Concurrent lookups of the same listing are single-flighted: the first caller
+queries upstream and everyone else waiting on that listing gets its answer.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# Verdict TTLs in seconds
+VALID_TTL = 5 * 60
+INVALID_TTL = 10 * 60 # Gone listings are deleted anyway; this covers a re-crawl racing the delete
+UNKNOWN_TTL = 30 # Rate limited (412/429) or unreachable: back off briefly instead of retrying at once
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.verdict: Optional[bool] = None
+        self.error: Optional[BaseException] = None
+
+class VerdictCache:
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        # c2c_id -> (verdict, expires_at)
+        self._entries: Dict[int, Tuple[Optional[bool], float]] = {}
+        self._inflight: Dict[int, _Flight] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    @staticmethod
+    def ttl_for(verdict: Optional[bool]) -> float:
+        if verdict is None:
+            return UNKNOWN_TTL
+        return VALID_TTL if verdict else INVALID_TTL
+
+    def lookup(self, c2c_id: int) -> Tuple[bool, Optional[bool]]:
+        """(found, verdict) without querying upstream."""
+        entry = self._entries.get(c2c_id)
+        if entry is None or entry[1] <= time.monotonic():
+            return False, None
+        return True, entry[0]
+
+    def get_or_check(self, c2c_id: int, check: Callable[[], Optional[bool]]) -> Optional[bool]:
+        """Cached verdict for ``c2c_id``, or the result of ``check()``, run once however many threads ask at the same time."""
+        with self._lock:
+            found, verdict = self.lookup(c2c_id)
+            if found:
+                self.stats["hits"] += 1
+                return verdict
+            flight = self._inflight.get(c2c_id)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[c2c_id] = _Flight()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.verdict
+
+        try:
+            flight.verdict = check()
+            self.put(c2c_id, flight.verdict)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(c2c_id, None)
+            flight.done.set()
+        return flight.verdict
+
+    def put(self, c2c_id: int, verdict: Optional[bool]):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._evict_expired()
+            self._entries[c2c_id] = (verdict, time.monotonic() + self.ttl_for(verdict))
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        expired = [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]
+        if not expired:
+            # Still full: drop the oldest entries (dicts keep insertion order)
+            expired = list(self._entries)[:len(self._entries) // 10 or 1]
+        for c2c_id in expired:
+            del self._entries[c2c_id]
+
+verdict_cache = VerdictCache()
@@ -1,7 +1,11 @@
+import threading
+import time
 import uuid
 from datetime import datetime
 from typing import Dict, Optional
 
+from events import EventHub
+
 class ScraperState:
     _should_stop = False
     _is_running = False
@@ -23,52 +27,109 @@ class ScraperState:
         return cls._is_running
 
 class TaskManager:
+    """
+    Registry of background tasks shown in the UI.
+
+    Background threads update tasks concurrently, so every access goes through _lock.
+    Each change is published to ``hub``; progress-only updates are throttled to
+    PUBLISH_INTERVAL per task, with a trailing publish so the latest value always goes out.
+    """
+    PUBLISH_INTERVAL = 0.2 # at most 5 progress events per second per task
+
     _tasks: Dict[str, dict] = {}
+    _lock = threading.RLock()
+    _last_published: Dict[str, float] = {}
+    _pending_timers: Dict[str, threading.Timer] = {}
+    hub = EventHub(history_size=200)
 
     @classmethod
     def add_task(cls, task_type: str, description: str) -> str:
         task_id = str(uuid.uuid4())
-        cls._tasks[task_id] = {
-            "id": task_id,
-            "type": task_type,
-            "description": description,
-            "status": "running", # running, completed, failed
-            "progress": 0,
-            "total": 0,
-            "start_time": datetime.now(),
-            "end_time": None,
-            "message": ""
-        }
+        with cls._lock:
+            cls._prune()
+            cls._tasks[task_id] = {
+                "id": task_id,
+                "type": task_type,
+                "description": description,
+                "status": "running", # running, completed, stopped, failed
+                "progress": 0,
+                "total": 0,
+                "start_time": datetime.now(),
+                "end_time": None,
+                "message": ""
+            }
+            cls._publish(task_id)
         return task_id
 
     @classmethod
     def update_task(cls, task_id: str, status: str = None, progress: int = None, total: int = None, message: str = None):
-        if task_id in cls._tasks:
-            if status: cls._tasks[task_id]["status"] = status
-            if progress is not None: cls._tasks[task_id]["progress"] = progress
-            if total is not None: cls._tasks[task_id]["total"] = total
-            if message: cls._tasks[task_id]["message"] = message
+        with cls._lock:
+            task = cls._tasks.get(task_id)
+            if task is None:
+                return
+
+            if status: task["status"] = status
+            if progress is not None: task["progress"] = progress
+            if total is not None: task["total"] = total
+            if message: task["message"] = message
 
-            if status in ["completed", "failed"]:
-                cls._tasks[task_id]["end_time"] = datetime.now()
+            if status in ["completed", "stopped", "failed"]:
+                task["end_time"] = datetime.now()
+
+            # Status, total and message changes always go out; bare progress ticks are throttled
+            if status or total is not None or message:
+                cls._publish(task_id)
+                return
+
+            wait = cls._last_published.get(task_id, 0) + cls.PUBLISH_INTERVAL - time.monotonic()
+            if wait <= 0:
+                cls._publish(task_id)
+            elif task_id not in cls._pending_timers:
+                timer = threading.Timer(wait, cls._publish_pending, args=(task_id,))
+                timer.daemon = True
+                cls._pending_timers[task_id] = timer
+                timer.start()
+
+    @classmethod
+    def get_task(cls, task_id: str) -> Optional[dict]:
+        with cls._lock:
+            task = cls._tasks.get(task_id)
+            return dict(task) if task else None
 
     @classmethod
     def get_active_tasks(cls):
         # Return tasks that are running or completed within last 10 seconds (for UI feedback)
         now = datetime.now()
-        active = []
-        to_remove = []
-
-        for tid, task in cls._tasks.items():
-            if task["status"] == "running":
-                active.append(task)
-            elif task["end_time"] and (now - task["end_time"]).total_seconds() < 10:
-                active.append(task)
-            elif task["end_time"] and (now - task["end_time"]).total_seconds() > 60:
-                # Cleanup old tasks
-                to_remove.append(tid)
-
-        for tid in to_remove:
-            del cls._tasks[tid]
+        with cls._lock:
+            return [
+                dict(task) for task in cls._tasks.values()
+                if task["status"] == "running"
+                or (task["end_time"] and (now - task["end_time"]).total_seconds() < 10)
+            ]
+
+    @classmethod
+    def _publish(cls, task_id: str):
+        timer = cls._pending_timers.pop(task_id, None)
+        if timer:
+            timer.cancel()
+        cls._last_published[task_id] = time.monotonic()
+        cls.hub.publish(dict(cls._tasks[task_id]))
+
+    @classmethod
+    def _publish_pending(cls, task_id: str):
+        with cls._lock:
+            cls._pending_timers.pop(task_id, None)
+            if task_id in cls._tasks:
+                cls._publish(task_id)
 
-        return active
+    @classmethod
+    def _prune(cls):
+        # Cleanup old tasks
+        now = datetime.now()
+        expired = [
+            tid for tid, task in cls._tasks.items()
+            if task["end_time"] and (now - task["end_time"]).total_seconds() > 60
+        ]
+        for tid in expired:
+            del cls._tasks[tid]
+            cls._last_published.pop(tid, None)
@@ -0,0 +1,53 @@
+import threading
+import time
+from typing import Dict, Hashable, Optional, Tuple
+
+class UserResponseCache:
+    def __init__(self, ttl_seconds: int = 30, max_entries: int = 2000):
+        """
+        Short-lived per-user cache of assembled response bodies.
+
+        Each entry remembers the data version (conditional.data_version) it was built
+        from and is only served while that version is current. Per-user state that the
+        version does not cover (favorites, UI config) is invalidated explicitly.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # (user_id, key) -> (data version, expires_at, body)
+        self._entries: Dict[Tuple[int, Hashable], Tuple[str, float, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, key: Hashable, version: str) -> Optional[bytes]:
+        entry = self._entries.get((user_id, key))
+        if entry is None:
+            return None
+        entry_version, expires_at, body = entry
+        if entry_version != version or expires_at <= time.monotonic():
+            return None
+        return body
+
+    def put(self, user_id: int, key: Hashable, version: str, body: bytes):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._evict_expired()
+            self._entries[(user_id, key)] = (version, time.monotonic() + self.ttl_seconds, body)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for cache_key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[cache_key]
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        expired = [k for k, e in self._entries.items() if e[1] <= now]
+        if not expired:
+            # Still full: drop the oldest entries (dicts keep insertion order)
+            expired = list(self._entries)[:len(self._entries) // 10 or 1]
+        for cache_key in expired:
+            del self._entries[cache_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+bootstrap_cache = UserResponseCache(ttl_seconds=30)
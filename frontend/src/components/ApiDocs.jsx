@@ -52,7 +52,7 @@ const ApiDocs = () => {
       key: '1',
       method: 'GET',
       path: '/api/items',
-      desc: '获取商品列表 (支持分页、搜索、排序)',
+      desc: '获取商品列表 (支持分页、搜索、排序，fields=goods_id,min_price 只返回指定字段)',
     },
     {
       key: '2',
@@ -60,6 +60,24 @@ const ApiDocs = () => {
       path: '/api/items/{id}/history',
       desc: '获取指定商品的历史价格记录',
     },
+    {
+      key: '7',
+      method: 'POST',
+      path: '/api/items/batch',
+      desc: '批量获取商品、最低价挂单及历史价格 (goods_ids 最多 200 个)',
+    },
+    {
+      key: '8',
+      method: 'GET',
+      path: '/api/changes',
+      desc: '增量变更流 (新商品、最低价变化、挂单上/下架、缺货)，用返回的 next_cursor 继续拉取',
+    },
+    {
+      key: '9',
+      method: 'GET',
+      path: '/api/bootstrap',
+      desc: '首屏数据一次返回 (配置、收藏 ID、首页商品、统计、降价、最近收藏)，sections=stats,items 只取指定部分',
+    },
     {
       key: '3',
       method: 'GET',
@@ -72,6 +90,18 @@ const ApiDocs = () => {
       path: '/api/scrape',
       desc: '触发一次手动爬取任务',
     },
+    {
+      key: '5',
+      method: 'GET',
+      path: '/api/export/products',
+      desc: '流式导出全部商品 (format=csv/ndjson/parquet/xlsx, compression=none/gzip/zstd, 筛选参数同 /api/items)',
+    },
+    {
+      key: '6',
+      method: 'GET',
+      path: '/api/export/history',
+      desc: '流式导出历史价格 (支持 start/end 时间范围, 筛选参数同 /api/items)',
+    },
   ];
 
   const columns = [
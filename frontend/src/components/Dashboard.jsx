@@ -13,12 +13,15 @@ import {
 import { PieChart, Pie, Cell, Tooltip as RechartsTooltip, ResponsiveContainer, Legend } from 'recharts';
 import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
+import { useAuth } from '../context/AuthContext';
+import { openPriceSocket } from '../utils/priceSocket';
 
 const { Text, Title } = Typography;
 const { useBreakpoint } = Grid;
 
 const Dashboard = () => {
   const { token } = theme.useToken();
+  const { token: authToken } = useAuth();
   const navigate = useNavigate();
   const screens = useBreakpoint();
   const isMobile = screens.xs;
@@ -69,16 +72,54 @@ const Dashboard = () => {
     }
   };
 
+  const fetchBootstrap = async () => {
+    try {
+      // First paint in one round trip; the 10s refresh below only needs stats
+      const res = await axios.get('/api/bootstrap', {
+        params: { sections: 'stats,price_drops,recent_favorites' }
+      });
+      setStats(res.data.stats);
+      setPriceDrops(res.data.price_drops);
+      setRecentFavorites(res.data.recent_favorites);
+    } catch (error) {
+      console.error(error);
+      fetchStats();
+      fetchPriceDrops();
+      fetchRecentFavorites();
+    }
+  };
+
   useEffect(() => {
-    fetchStats();
-    fetchPriceDrops();
-    fetchRecentFavorites();
+    fetchBootstrap();
     const interval = setInterval(() => {
       fetchStats();
     }, 10000); // Refresh stats every 10s
     return () => clearInterval(interval);
   }, []);
 
+  // Push price changes of favorites and listed price drops into the cards as they happen
+  const watchedIds = [...priceDrops, ...recentFavorites].map(item => item.goods_id).sort().join(',');
+  useEffect(() => {
+    if (!authToken) return;
+    const goodsIds = watchedIds ? watchedIds.split(',').map(Number) : [];
+    const applyChange = (event) => (items) => items.map(item => {
+      if (item.goods_id !== event.goods_id) return item;
+      if (event.type === 'min_price_changed') return { ...item, min_price: event.new_price };
+      if (event.type === 'out_of_stock' || event.type === 'in_stock') return { ...item, is_out_of_stock: event.type === 'out_of_stock' };
+      return item;
+    });
+
+    return openPriceSocket({
+      token: authToken,
+      goodsIds,
+      favorites: true,
+      onEvent: (event) => {
+        setPriceDrops(applyChange(event));
+        setRecentFavorites(applyChange(event));
+      },
+    });
+  }, [authToken, watchedIds]);
+
   const goToFavorites = () => {
     // Navigate to items page with state to trigger "only favorites" filter
     // We can use URL query params or state. Let's use state for now, but query params are better for sharing.
@@ -1,9 +1,11 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Table, Tag, Image, Button, Input, Select, Space, Card, Row, Col, Tooltip, App, Modal, Form, InputNumber, Popconfirm, Tabs, Switch, List, Grid, Checkbox } from 'antd';
 import { SearchOutlined, CopyOutlined, LinkOutlined, PlusOutlined, EditOutlined, DeleteOutlined, PictureOutlined, HeartOutlined, HeartFilled, SyncOutlined } from '@ant-design/icons';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip as RechartsTooltip, ResponsiveContainer } from 'recharts';
 import axios from 'axios';
 import { useAuth } from '../context/AuthContext';
+import { openPriceSocket } from '../utils/priceSocket';
+import { openEventStream } from '../utils/eventStream';
 import { useLocation } from 'react-router-dom';
 
 const { Option } = Select;
@@ -11,7 +13,7 @@ const { useBreakpoint } = Grid;
 
 const ItemTable = () => {
   const { message } = App.useApp();
-  const { user } = useAuth();
+  const { user, token } = useAuth();
   const location = useLocation();
   const screens = useBreakpoint();
   const isMobile = screens.xs;
@@ -60,10 +62,42 @@ const ItemTable = () => {
   const [listingsLoading, setListingsLoading] = useState(false);
   const [priceHistory, setPriceHistory] = useState([]);
   const [historyLoading, setHistoryLoading] = useState(false);
+  // Verdicts of the running validity check by c2c_id: 'valid' | 'invalid' | 'unknown'
+  const [validity, setValidity] = useState({});
+  const [validityRunning, setValidityRunning] = useState(false);
+  const closeValidityStream = useRef(null);
 
   // Selection State
   const [selectedRowKeys, setSelectedRowKeys] = useState([]);
 
+  // Live updates for the item open in the detail modal, instead of refetching
+  useEffect(() => {
+    if (!isDetailModalVisible || !detailItem || !token) return;
+    const goodsId = detailItem.goods_id;
+    const updateItem = (changes) => {
+      setDetailItem(prev => prev && prev.goods_id === goodsId ? { ...prev, ...changes } : prev);
+      setData(prev => prev.map(item => item.goods_id === goodsId ? { ...item, ...changes } : item));
+    };
+
+    return openPriceSocket({
+      token,
+      goodsIds: [goodsId],
+      onEvent: (event) => {
+        if (event.type === 'listing_removed') {
+          setListings(prev => prev.filter(l => l.c2c_id !== event.c2c_id));
+        } else if (event.type === 'listing_added' || event.type === 'listing_price_changed') {
+          const listing = { c2c_id: event.c2c_id, goods_id: goodsId, price: event.new_price, update_time: event.created_at };
+          setListings(prev => [...prev.filter(l => l.c2c_id !== event.c2c_id), listing].sort((a, b) => a.price - b.price));
+          setPriceHistory(prev => [...prev, { id: `live-${event.c2c_id}-${event.created_at}`, goods_id: goodsId, price: event.new_price, record_time: event.created_at }]);
+        } else if (event.type === 'min_price_changed') {
+          updateItem({ min_price: event.new_price });
+        } else if (event.type === 'out_of_stock' || event.type === 'in_stock') {
+          updateItem({ is_out_of_stock: event.type === 'out_of_stock' });
+        }
+      },
+    });
+  }, [isDetailModalVisible, detailItem?.goods_id, token]);
+
   const fetchFavorites = async () => {
     if (!user) return;
     try {
@@ -89,66 +123,51 @@ const ItemTable = () => {
     }
   };
 
+  const checkValidityOnClick = useRef(null);
+
   useEffect(() => {
     const init = async () => {
-      let currentShowImages = true;
-      let currentPageSize = 50;
-      let currentPage = 1;
-
-      // 0. Fetch Favorites
-      fetchFavorites();
-
-      // 1. Load Config
+      // Config, favorites and the first page arrive in one round trip
+      setLoading(true);
       try {
-        // Load Show Images
-        try {
-          const imgRes = await axios.get('/api/config/show_images');
-          if (imgRes.data.value !== null) {
-            currentShowImages = imgRes.data.value !== 'false';
-          } else {
-             const savedShowImages = localStorage.getItem('show_images');
-             if (savedShowImages !== null) {
-               currentShowImages = savedShowImages !== 'false';
-             }
-          }
-        } catch (e) {
-             const savedShowImages = localStorage.getItem('show_images');
-             if (savedShowImages !== null) {
-               currentShowImages = savedShowImages !== 'false';
-             }
+        const params = {
+          sections: 'config,favorites,items',
+          sort_by: sortBy,
+          order: sortOrder,
+          only_favorites: onlyFavorites
+        };
+        if (searchText) {
+          params.search = searchText;
+        }
+        if (categoryFilter && categoryFilter.length > 0) {
+          params.category = Array.isArray(categoryFilter) ? categoryFilter.join(',') : categoryFilter;
         }
-        setShowImages(currentShowImages);
 
-        // Load Page Size
-        try {
-          const sizeRes = await axios.get('/api/config/table_page_size');
-          if (sizeRes.data.value) {
-            currentPageSize = parseInt(sizeRes.data.value);
-            setPagination(prev => ({ ...prev, pageSize: currentPageSize }));
-          }
-        } catch (e) {}
-
-        // Load Current Page
-        try {
-          const pageRes = await axios.get('/api/config/table_current_page');
-          if (pageRes.data.value) {
-            // If we are filtering by favorites (e.g. from Dashboard), force page 1
-            if (location.state?.onlyFavorites) {
-                currentPage = 1;
-            } else {
-                currentPage = parseInt(pageRes.data.value);
-            }
-            setPagination(prev => ({ ...prev, current: currentPage }));
-          }
-        } catch (e) {}
+        const res = await axios.get('/api/bootstrap', { params });
+        const { config, favorite_ids, items } = res.data;
 
+        let currentShowImages = true;
+        const savedShowImages = config.show_images ?? localStorage.getItem('show_images');
+        if (savedShowImages !== null) {
+          currentShowImages = savedShowImages !== 'false';
+        }
+        setShowImages(currentShowImages);
+        checkValidityOnClick.current = config.check_validity_on_click === 'true';
+        setFavorites(favorite_ids);
+        setData(items.items);
+
+        const newPagination = { ...pagination, current: items.page, pageSize: items.page_size, total: items.total };
+        setPagination(newPagination);
+        sessionStorage.setItem('itemTablePagination', JSON.stringify(newPagination));
+        setSelectedRowKeys([]);
       } catch (error) {
         console.error(error);
+        // Fall back to the individual endpoints
+        fetchFavorites();
+        await fetchData(1, pagination.pageSize, searchText, categoryFilter, sortBy, sortOrder, onlyFavorites);
+      } finally {
+        setLoading(false);
       }
-
-      // 2. Fetch Data
-      // Use the current state value which is initialized from location.state
-      fetchData(currentPage, currentPageSize, searchText, categoryFilter, sortBy, sortOrder, onlyFavorites);
     };
 
     init();
@@ -198,20 +217,17 @@ const ItemTable = () => {
       setListings(res.data);
       setListingsLoading(false); // Stop loading spinner so user can see data
 
-      // 2. Check config to see if we should trigger validity check
+      // 2. Check config to see if we should trigger validity check (loaded with the bootstrap call)
       try {
-          const configRes = await axios.get('/api/config/check_validity_on_click');
-          const shouldCheck = configRes.data.value === 'true';
+          let shouldCheck = checkValidityOnClick.current;
+          if (shouldCheck === null) {
+              const configRes = await axios.get('/api/config/check_validity_on_click');
+              shouldCheck = configRes.data.value === 'true';
+          }
 
           if (shouldCheck) {
-              // Trigger validity check in background
-              const checkRes = await axios.post(`/api/items/${goods_id}/check_validity`);
-              if (checkRes.data.removed > 0) {
-                  message.info(`已自动清理 ${checkRes.data.removed} 个失效链接，正在刷新...`);
-                  // 3. Reload data if changes occurred
-                  const newRes = await axios.get(`/api/items/${goods_id}/listings`);
-                  setListings(newRes.data);
-              }
+              // Trigger validity check in background; verdicts update the modal as they arrive
+              await runValidityCheck(goods_id);
           }
       } catch (e) {
           console.error("Validity check failed", e);
@@ -234,23 +250,76 @@ const ItemTable = () => {
     }
   };
 
+  const stopValidityStream = () => {
+    if (closeValidityStream.current) {
+      closeValidityStream.current();
+      closeValidityStream.current = null;
+    }
+    setValidityRunning(false);
+  };
+
+  // Starts (or joins) a validity check job and follows its verdicts over SSE
+  const runValidityCheck = async (goodsId, { notify = false } = {}) => {
+    stopValidityStream();
+    const res = await axios.post(`/api/items/${goodsId}/check_validity`);
+    const report = (removed) => {
+      if (notify) {
+        message.success(`检查完成，清理了 ${removed} 个失效链接`);
+      } else if (removed > 0) {
+        message.info(`已自动清理 ${removed} 个失效链接`);
+      }
+    };
+
+    if (!res.data.job_id) {
+      // Answered from recent checks, nothing to wait for
+      report(res.data.removed);
+      if (res.data.removed > 0) {
+        const newRes = await axios.get(`/api/items/${goodsId}/listings`);
+        setListings(newRes.data);
+      }
+      return;
+    }
+
+    const updateItem = (changes) => {
+      setDetailItem(prev => prev && prev.goods_id === goodsId ? { ...prev, ...changes } : prev);
+      setData(prev => prev.map(item => item.goods_id === goodsId ? { ...item, ...changes } : item));
+    };
+
+    setValidity({});
+    setValidityRunning(true);
+    closeValidityStream.current = openEventStream(res.data.events, {
+      token,
+      onEvent: (type, event) => {
+        if (event.type === 'verdict') {
+          setValidity(prev => ({ ...prev, [event.c2c_id]: event.verdict }));
+          if (event.verdict === 'invalid') {
+            setListings(prev => prev.filter(l => String(l.c2c_id) !== event.c2c_id));
+          }
+          if (event.min_price !== undefined) {
+            updateItem({ min_price: event.min_price, is_out_of_stock: event.is_out_of_stock, link: event.link });
+          }
+        } else if (event.type === 'done') {
+          stopValidityStream();
+          if (event.error) {
+            message.error('检查失败');
+          } else {
+            report(event.removed);
+          }
+        }
+      },
+      onError: () => {
+        stopValidityStream();
+        message.error('检查失败');
+      },
+    });
+  };
+
   const handleCheckDetailValidity = async () => {
     if (!detailItem) return;
-    setListingsLoading(true);
     try {
-      const res = await axios.post(`/api/items/${detailItem.goods_id}/check_validity`);
-      message.success(`检查完成，清理了 ${res.data.removed} 个失效链接`);
-      // Refresh detail data
-      fetchListings(detailItem.goods_id);
-      // Also refresh main table data to update min_price if changed
-      fetchData(pagination.current, pagination.pageSize, searchText, categoryFilter, sortBy, sortOrder, onlyFavorites);
-
-      // Update detailItem min_price locally if needed (optional, but good for UX)
-      // Actually fetchListings updates listings, but detailItem is state.
-      // We should probably re-fetch the product info too, but for now let's just refresh listings.
+      await runValidityCheck(detailItem.goods_id, { notify: true });
     } catch (error) {
       message.error('检查失败');
-      setListingsLoading(false);
     }
   };
 
@@ -262,6 +331,8 @@ const ItemTable = () => {
   };
 
   const handleDetailCancel = () => {
+    stopValidityStream();
+    setValidity({});
     setIsDetailModalVisible(false);
     setDetailItem(null);
     setListings([]);
@@ -843,7 +914,7 @@ const ItemTable = () => {
                   icon={<SyncOutlined />}
                   size="small"
                   onClick={handleCheckDetailValidity}
-                  loading={listingsLoading}
+                  loading={listingsLoading || validityRunning}
                 >
                   刷新列表
                 </Button>
@@ -870,6 +941,16 @@ const ItemTable = () => {
                   key: 'update_time',
                   render: (text) => new Date(text).toLocaleString(),
                 },
+                {
+                  title: '状态',
+                  key: 'validity',
+                  render: (_, record) => {
+                    const verdict = validity[String(record.c2c_id)];
+                    if (verdict === 'valid') return <Tag color="green">有效</Tag>;
+                    if (verdict === 'unknown') return <Tag>未确认</Tag>;
+                    return validityRunning ? <Tag icon={<SyncOutlined spin />} color="processing">检查中</Tag> : null;
+                  }
+                },
                 {
                   title: '操作',
                   key: 'action',
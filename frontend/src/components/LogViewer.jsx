@@ -6,14 +6,14 @@ import { useLogContext } from '../context/LogContext';
 const { Text } = Typography;
 
 const LogViewer = () => {
-  const { logs, connected, clearLogs, reconnect, startPolling, stopPolling } = useLogContext();
+  const { logs, connected, clearLogs, reconnect, startStream, stopStream } = useLogContext();
   const [autoScroll, setAutoScroll] = useState(true);
   const listRef = useRef(null);
 
-  // Start polling when component mounts, stop when unmounts
+  // Open the log stream when component mounts, close it when unmounts
   useEffect(() => {
-    startPolling();
-    return () => stopPolling();
+    startStream();
+    return () => stopStream();
   }, []);
 
   useEffect(() => {
@@ -31,66 +31,48 @@ const Settings = () => {
     { label: '3C (2273)', value: '2273' },
   ];
 
+  // Everyone may read the display settings; the crawler ones (and the cookie) are admin only
+  const PUBLIC_CONFIG_KEYS = ['show_images', 'table_page_size', 'check_validity_on_click'];
+  const ADMIN_CONFIG_KEYS = [
+    'user_cookie', 'request_interval', 'scrape_interval_minutes', 'auto_scrape_max_pages', 'filter_settings'
+  ];
+  const CONFIG_KEYS = isAdmin ? [...PUBLIC_CONFIG_KEYS, ...ADMIN_CONFIG_KEYS] : PUBLIC_CONFIG_KEYS;
+
   const fetchConfig = async () => {
     try {
-      // Fetch Show Images
-      try {
-        const imgRes = await axios.get('/api/config/show_images');
-        const showImages = imgRes.data.value !== 'false';
-        form.setFieldsValue({ show_images: showImages });
-        // Sync to local storage
-        localStorage.setItem('show_images', showImages ? 'true' : 'false');
-      } catch (e) {
-        // Fallback to local storage
-        const savedShowImages = localStorage.getItem('show_images');
-        const showImages = savedShowImages === 'false' ? false : true;
-        form.setFieldsValue({ show_images: showImages });
-      }
-
-      // Fetch Cookie
-      try {
-        const cookieRes = await axios.get('/api/config/user_cookie');
-        form.setFieldsValue({ user_cookie: cookieRes.data.value });
-      } catch (e) {}
-
-      // Fetch Rate Limit
-      try {
-        const intervalRes = await axios.get('/api/config/request_interval');
-        form.setFieldsValue({ request_interval: intervalRes.data.value });
-      } catch (e) {
-        form.setFieldsValue({ request_interval: 3 });
-      }
-
-      // Fetch Schedule Interval
-      try {
-        const scheduleRes = await axios.get('/api/config/scrape_interval_minutes');
-        form.setFieldsValue({ scrape_interval_minutes: scheduleRes.data.value });
-      } catch (e) {
-        form.setFieldsValue({ scrape_interval_minutes: 60 });
-      }
-
-      // Fetch Max Pages
-      try {
-        const pagesRes = await axios.get('/api/config/auto_scrape_max_pages');
-        form.setFieldsValue({ auto_scrape_max_pages: pagesRes.data.value });
-      } catch (e) {
-        form.setFieldsValue({ auto_scrape_max_pages: 50 });
-      }
-
-      // Fetch Page Size
+      // All settings in one request
+      let config = null;
       try {
-        const pageSizeRes = await axios.get('/api/config/table_page_size');
-        form.setFieldsValue({ table_page_size: pageSizeRes.data.value });
+        const res = await axios.get('/api/config', { params: { keys: CONFIG_KEYS.join(',') } });
+        config = res.data;
       } catch (e) {
-        form.setFieldsValue({ table_page_size: 50 });
+        console.error(e);
       }
 
-      // Fetch Check Validity On Click
-      try {
-        const checkRes = await axios.get('/api/config/check_validity_on_click');
-        form.setFieldsValue({ check_validity_on_click: checkRes.data.value === 'true' });
-      } catch (e) {
-        form.setFieldsValue({ check_validity_on_click: false });
+      if (config) {
+        const showImages = config.show_images !== 'false';
+        // Sync to local storage
+        localStorage.setItem('show_images', showImages ? 'true' : 'false');
+        form.setFieldsValue({
+          show_images: showImages,
+          user_cookie: config.user_cookie,
+          request_interval: config.request_interval,
+          scrape_interval_minutes: config.scrape_interval_minutes,
+          auto_scrape_max_pages: config.auto_scrape_max_pages,
+          table_page_size: config.table_page_size,
+          check_validity_on_click: config.check_validity_on_click === 'true'
+        });
+      } else {
+        // Fallback to local storage and defaults
+        const savedShowImages = localStorage.getItem('show_images');
+        form.setFieldsValue({
+          show_images: savedShowImages === 'false' ? false : true,
+          request_interval: 3,
+          scrape_interval_minutes: 60,
+          auto_scrape_max_pages: 50,
+          table_page_size: 50,
+          check_validity_on_click: false
+        });
       }
 
       // Fetch Email Config (Admin only)
@@ -101,10 +83,9 @@ const Settings = () => {
         } catch (e) {}
       }
 
-      // Fetch Filters
+      // Filters
       try {
-        const filterRes = await axios.get('/api/config/filter_settings');
-        const settings = JSON.parse(filterRes.data.value);
+        const settings = JSON.parse(config.filter_settings);
 
         // Load weights from API response
         let weights = settings.category_weights || {};
@@ -1,31 +1,64 @@
 import React, { useEffect, useState } from 'react';
-import { Popover, Badge, List, Typography, Space, Tag } from 'antd';
-import { LoadingOutlined, CheckCircleOutlined, CloseCircleOutlined, BellOutlined, SyncOutlined } from '@ant-design/icons';
-import axios from 'axios';
+import { Popover, Badge, List, Typography, Space, Tag, Progress } from 'antd';
+import { LoadingOutlined, CheckCircleOutlined, CloseCircleOutlined, StopOutlined, BellOutlined, SyncOutlined } from '@ant-design/icons';
 import { useAuth } from '../context/AuthContext';
+import { openEventStream } from '../utils/eventStream';
 
 const { Text } = Typography;
 
+const FINISHED_VISIBLE_MS = 10000; // Keep finished tasks on screen briefly for feedback
+
 const TaskMonitor = () => {
-  const { user } = useAuth();
+  const { user, token } = useAuth();
   const [tasks, setTasks] = useState([]);
   const [visible, setVisible] = useState(false);
 
-  const fetchTasks = async () => {
+  useEffect(() => {
     if (!user) return;
-    try {
-      const res = await axios.get('/api/tasks/active');
-      setTasks(res.data);
-    } catch (error) {
-      console.error("Failed to fetch tasks", error);
-    }
-  };
+    let close = null;
+    let retryTimer = null;
+    const timers = new Set();
 
-  useEffect(() => {
-    fetchTasks();
-    const interval = setInterval(fetchTasks, 2000); // Poll every 2s
-    return () => clearInterval(interval);
-  }, [user]);
+    const scheduleRemoval = (task) => {
+      const timer = setTimeout(() => {
+        timers.delete(timer);
+        setTasks(prev => prev.filter(t => t.id !== task.id || t.status === 'running'));
+      }, FINISHED_VISIBLE_MS);
+      timers.add(timer);
+    };
+
+    const handleEvent = (type, data) => {
+      if (type === 'snapshot') {
+        setTasks(data.tasks);
+        data.tasks.filter(t => t.status !== 'running').forEach(scheduleRemoval);
+      } else if (type === 'task') {
+        setTasks(prev => {
+          const index = prev.findIndex(t => t.id === data.id);
+          if (index === -1) return [...prev, data];
+          const next = [...prev];
+          next[index] = data;
+          return next;
+        });
+        if (data.status !== 'running') scheduleRemoval(data);
+      }
+    };
+
+    const connect = () => {
+      // Server pushes task updates; after a drop, reconnect and start over from a fresh snapshot
+      close = openEventStream('/api/tasks/stream', {
+        token,
+        onEvent: handleEvent,
+        onError: () => { retryTimer = setTimeout(connect, 3000); },
+      });
+    };
+    connect();
+
+    return () => {
+      close && close();
+      clearTimeout(retryTimer);
+      timers.forEach(clearTimeout);
+    };
+  }, [user, token]);
 
   const runningTasks = tasks.filter(t => t.status === 'running');
   const hasRunning = runningTasks.length > 0;
@@ -53,6 +86,10 @@ const TaskMonitor = () => {
                 statusIcon = <CheckCircleOutlined style={{ color: '#52c41a' }} />;
                 statusColor = '#52c41a';
             }
+            if (item.status === 'stopped') {
+                statusIcon = <StopOutlined style={{ color: '#faad14' }} />;
+                statusColor = '#faad14';
+            }
             if (item.status === 'failed') {
                 statusIcon = <CloseCircleOutlined style={{ color: '#f5222d' }} />;
                 statusColor = '#f5222d';
@@ -67,9 +104,14 @@ const TaskMonitor = () => {
                       <Text strong>{item.description}</Text>
                     </Space>
                     <Text type="secondary" style={{ fontSize: 12 }}>
-                      {item.status === 'running' ? '进行中...' : item.status === 'completed' ? '已完成' : '失败'}
+                      {item.status === 'running' ? '进行中...' : item.status === 'completed' ? '已完成' : item.status === 'stopped' ? '已停止' : '失败'}
                     </Text>
                   </div>
+                  {item.status === 'running' && item.total > 0 && (
+                    <div style={{ paddingLeft: 24, paddingRight: 8 }}>
+                      <Progress percent={Math.min(100, Math.round(item.progress / item.total * 100))} size="small" />
+                    </div>
+                  )}
                   {item.message && (
                     <div style={{ fontSize: 12, color: '#999', paddingLeft: 24 }}>
                       {item.message}
@@ -1,6 +1,5 @@
-import React, { createContext, useState, useEffect, useRef, useContext } from 'react';
+import React, { createContext, useState, useRef, useContext } from 'react';
 import { App } from 'antd';
-import axios from 'axios';
 
 const LogContext = createContext();
 
@@ -9,89 +8,61 @@ export const useLogContext = () => useContext(LogContext);
 export const LogProvider = ({ children }) => {
   const { notification } = App.useApp();
   const [logs, setLogs] = useState([]);
-  const [connected, setConnected] = useState(false); // Used to indicate polling status
-  const lastTimestampRef = useRef(0);
-  const intervalRef = useRef(null);
-  const isPollingRef = useRef(false);
+  const [connected, setConnected] = useState(false);
+  const sourceRef = useRef(null);
+  const lastSeqRef = useRef(null);
 
-  const fetchLogs = async () => {
-    if (isPollingRef.current) return;
-    isPollingRef.current = true;
+  const handleLog = (event) => {
+    const log = JSON.parse(event.data);
+    lastSeqRef.current = log.seq;
 
-    try {
-      const res = await axios.get('/api/logs', {
-        params: { since: lastTimestampRef.current }
-      });
-
-      setConnected(true);
-      const newLogs = res.data;
-
-      if (newLogs.length > 0) {
-        // Update timestamp to the latest log's timestamp
-        lastTimestampRef.current = newLogs[newLogs.length - 1].timestamp;
-
-        setLogs((prevLogs) => {
-          // Merge and keep last 1000
-          const merged = [...prevLogs, ...newLogs];
-          return merged.slice(-1000);
-        });
+    setLogs((prevLogs) => {
+      // Merge and keep last 1000
+      const merged = [...prevLogs, log];
+      return merged.slice(-1000);
+    });
 
-        // Check for specific alerts in new logs
-        newLogs.forEach(log => {
-             if (log.message && log.message.includes("RATE_LIMIT_EXCEEDED")) {
-               notification.warning({
-                  message: '请求过于频繁',
-                  description: '检测到 429 错误，已自动增加请求间隔 1 秒。',
-                  duration: 5,
-               });
-            }
-        });
-      }
-    } catch (error) {
-      console.error("Poll logs error:", error);
-      setConnected(false);
-    } finally {
-      isPollingRef.current = false;
+    // Check for specific alerts in new logs
+    if (log.message && log.message.includes("RATE_LIMIT_EXCEEDED")) {
+      notification.warning({
+        message: '请求过于频繁',
+        description: '检测到 429 错误，已自动增加请求间隔 1 秒。',
+        duration: 5,
+      });
     }
   };
 
-  const startPolling = () => {
-    stopPolling();
-    // Initial fetch
-    fetchLogs();
-    // Poll every 3 seconds (reduced from 1s to reduce request spam)
-    intervalRef.current = setInterval(fetchLogs, 3000);
+  const startStream = () => {
+    stopStream();
+    // Server pushes each log record as it happens. On reconnect EventSource sends
+    // Last-Event-ID itself; after a manual restart we resume from the last seq we saw.
+    const url = lastSeqRef.current !== null ? `/api/logs/stream?last_id=${lastSeqRef.current}` : '/api/logs/stream';
+    const source = new EventSource(url);
+    source.addEventListener('log', handleLog);
+    source.onopen = () => setConnected(true);
+    source.onerror = () => setConnected(false); // EventSource retries automatically
+    sourceRef.current = source;
   };
 
-  const stopPolling = () => {
-    if (intervalRef.current) {
-      clearInterval(intervalRef.current);
-      intervalRef.current = null;
+  const stopStream = () => {
+    if (sourceRef.current) {
+      sourceRef.current.close();
+      sourceRef.current = null;
     }
+    setConnected(false);
   };
 
-  // Removed auto-start in useEffect to allow components to control it
-  // useEffect(() => {
-  //   startPolling();
-  //   return () => stopPolling();
-  // }, []);
-
   const reconnect = () => {
-    // Reset timestamp to re-fetch recent logs or just continue?
-    // Let's just restart polling
-    setConnected(false);
-    startPolling();
+    startStream();
   };
 
   const clearLogs = () => {
+    // Only clears the UI; the stream keeps delivering new records from where it is
     setLogs([]);
-    // Optional: Reset timestamp to now? Or keep fetching new ones?
-    // If we clear UI logs, we probably still want to fetch *new* logs from now on.
-    // But if we don't reset timestamp, we won't get old logs again (which is correct).
   };
 
   return (
-    <LogContext.Provider value={{ logs, connected, clearLogs, reconnect, startPolling, stopPolling }}>
+    <LogContext.Provider value={{ logs, connected, clearLogs, reconnect, startStream, stopStream }}>
       {children}
     </LogContext.Provider>
   );
@@ -0,0 +1,43 @@
+// Minimal Server-Sent Events reader over fetch.
+// EventSource cannot send an Authorization header, so authenticated streams are read this way.
+export const openEventStream = (url, { token, onEvent, onOpen, onError }) => {
+  const controller = new AbortController();
+
+  const run = async () => {
+    const res = await fetch(url, {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+      signal: controller.signal,
+    });
+    if (!res.ok) throw new Error(`Stream request failed: ${res.status}`);
+    onOpen && onOpen();
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        let type = 'message';
+        const data = [];
+        for (const line of block.split('\n')) {
+          if (line.startsWith('event:')) type = line.slice(6).trim();
+          else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+        }
+        if (data.length) onEvent(type, JSON.parse(data.join('\n')));
+      }
+    }
+    throw new Error('Stream closed');
+  };
+
+  run().catch((error) => {
+    if (!controller.signal.aborted) onError && onError(error);
+  });
+
+  return () => controller.abort();
+};
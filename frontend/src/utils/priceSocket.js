@@ -0,0 +1,30 @@
+// Live price updates from /ws/prices.
+// Subscribes to the given goods (and optionally the user's favorites) and reconnects after drops.
+export const openPriceSocket = ({ token, goodsIds = [], favorites = false, onEvent }) => {
+  let socket = null;
+  let retryTimer = null;
+  let closed = false;
+
+  const connect = () => {
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    socket = new WebSocket(`${protocol}://${window.location.host}/ws/prices?token=${encodeURIComponent(token)}`);
+    socket.onopen = () => {
+      socket.send(JSON.stringify({ action: 'subscribe', goods_ids: goodsIds, favorites }));
+    };
+    socket.onmessage = (message) => {
+      const event = JSON.parse(message.data);
+      if (event.type !== 'subscribed' && event.type !== 'error') onEvent(event);
+    };
+    socket.onclose = (e) => {
+      // 1008: credentials rejected, retrying will not help
+      if (!closed && e.code !== 1008) retryTimer = setTimeout(connect, 3000);
+    };
+  };
+  connect();
+
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    if (socket) socket.close();
+  };
+};